@@ -2,11 +2,17 @@ import os
 import glob
 import re
 import json
+import copy
 import base64
-import requests
+import http_client
 import time
 import logging
 import config  # 引入配置文件
+from workspace import atomic_write_json
+from report_archive import standard_asset_name
+import llm_output
+import llm_hedge
+from job_journal import JobJournal, prompt_hash
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -23,6 +29,7 @@ class AIPromptRunner:
         self.CLIENT_SECRET = config.CLIENT_SECRET
         self.model_name = config.AI_MODEL_NAME
         self.metadata = config.API_METADATA
+        self.language = "en" if language == "en" else "cn"
         if language == "en":
             self.prompt = config.AI_INSTRUCTION_PROMPT_en
             self.AI_system_prompt = config.AI_SYSTEM_PROMPT_en
@@ -33,18 +40,39 @@ class AIPromptRunner:
         
         # 运行时状态
         self.context_text = ""
+        self.only_assets = None  # 增量模式下只生成这些资产 (中文标准名)
+        self.cancel_event = None  # threading.Event，流水线取消时停止轮询
+        self.last_model = None    # 最近一次请求实际采用的模型 (对冲时可能是备用模型)
+        self.latency_stats = llm_hedge.shared_stats()
+        self.journal = JobJournal()
+        self.journal_jobs = []    # 本次运行用到的任务 (报告保存后标记为已使用)
 
     # ================= 1. 数据准备 =================
    
-    def load_files(self, folder_path=None):
-        """读取文件夹下的所有 JSON 文件并合并"""
+    def load_files(self, folder_path=None, only_assets=None):
+        """
+        读取文件夹下的所有 JSON 文件并合并
+        :param only_assets: 只读取这些资产类别的文章 (文件名格式：类别_日期.json)
+        """
         target_dir = folder_path if folder_path else self.input_dir
         
         if not os.path.exists(target_dir):
             logging.error(f"文件夹不存在: {target_dir}")
             return False
 
-        files = glob.glob(os.path.join(target_dir, "*.json"))
+        # 有清单时只加载清单中的文件，避免混入旧文章
+        manifest_path = os.path.join(target_dir, config.CLEAN_MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                listed = sorted(json.load(f).get("files", {}))
+            files = [os.path.join(target_dir, name) for name in listed
+                     if os.path.exists(os.path.join(target_dir, name))]
+        else:
+            files = glob.glob(os.path.join(target_dir, "*.json"))
+        if only_assets:
+            # 有变化的资产都没有新文章时 (例如文章被撤下)，仍提供全部文档作为背景
+            files = [fp for fp in files
+                     if standard_asset_name(os.path.basename(fp).rsplit("_", 1)[0]) in only_assets] or files
         logging.info(f"在 '{target_dir}' 下找到 {len(files)} 个文件")
 
         if not files:
@@ -82,14 +110,26 @@ class AIPromptRunner:
 
     # ================= 2. 任务提交 =================
 
-    def _prepare_payload(self):
-        """构建 LLM 调用 Payload（不使用附件）"""
+    def _prepare_payload(self, extra_prompt=None):
+        """
+        构建 LLM 调用 Payload（不使用附件）
+        :param extra_prompt: 追加在末尾的指令 (针对性重新请求时使用)
+        """
         if not self.context_text:
             return None
 
         # 1. 拼接 System Prompt 和 Context
         full_prompt = f"{self.AI_system_prompt}\n\n{self.context_text}"
-        
+
+        # 增量模式：只让 AI 生成有新文章的资产
+        if self.only_assets:
+            names = config.ASSET_PROMPT_NAMES[self.language]
+            sep = ", " if self.language == "en" else "、"
+            assets = sep.join(names.get(a, a) for a in self.only_assets)
+            partial_prompt = config.AI_PARTIAL_PROMPT_en if self.language == "en" else config.AI_PARTIAL_PROMPT_cn
+            full_prompt += "\n\n" + partial_prompt.format(assets=assets)
+        if extra_prompt:
+            full_prompt += "\n\n" + extra_prompt
         
         # 2. 组装 Payload
         payload = {
@@ -106,22 +146,22 @@ class AIPromptRunner:
         }
         return payload
 
-    def submit_job(self):
-        """提交 AI 任务"""
+    def submit_job(self, payload=None):
+        """提交 AI 任务 (payload 默认由 _prepare_payload 生成)"""
         url = f"{self.api_base}/job"
         headers = {
             'Authorization': f'Bearer {self.token}',
             'Content-Type': 'application/json'
         }
         
-        payload = self._prepare_payload()
+        payload = payload or self._prepare_payload()
         if not payload:
             return None
 
         logging.info(f"正在提交任务... (文本长度: {len(self.context_text)})")
         
         try:
-            resp = requests.post(url, headers=headers, json=payload)
+            resp = http_client.post(url, headers=headers, json=payload)
             if resp.status_code != 200:
                 logging.error(f"提交失败: {resp.status_code} - {resp.text}")
                 return None
@@ -137,18 +177,26 @@ class AIPromptRunner:
 
     # ================= 3. 结果轮询与清洗 =================
 
-    def poll_job(self, job_id, max_retries=60):
-        """轮询任务状态"""
+    def poll_job(self, job_id, max_retries=None, cancel_event=None):
+        """
+        轮询任务状态
+        :param cancel_event: 本次任务的取消信号 (对冲请求中输掉的任务)，默认使用流水线的 self.cancel_event
+        """
         url = f"{self.api_base}/job/JOB_ID/{job_id}"
+        cancel_event = cancel_event or self.cancel_event
+        max_retries = max_retries or config.LLM_POLL_MAX_RETRIES
         
         logging.info(f"开始轮询结果: {url}")
         
         for i in range(max_retries):
+            if cancel_event is not None and cancel_event.is_set():
+                logging.warning("轮询已取消")
+                return None
             # 【重要修改】：将 headers 移入循环内部，确保每次使用最新的 self.token
             headers = {'Authorization': f'Bearer {self.token}'}
             
             try:
-                resp = requests.get(url, headers=headers)
+                resp = http_client.get(url, headers=headers)
                 
                 if resp.status_code == 200:
                     data = resp.json()
@@ -180,18 +228,19 @@ class AIPromptRunner:
             except Exception as e:
                 logging.warning(f"轮询异常: {e}")
             
-            # 如果状态是 200 且仍在 PENDING 等待中，或者遇到了网络抖动异常，则休眠 10 秒
-            time.sleep(10)
+            # 如果状态是 200 且仍在 PENDING 等待中，或者遇到了网络抖动异常，则休眠一个轮询间隔 (取消时立即醒来)
+            if cancel_event is not None:
+                cancel_event.wait(config.LLM_POLL_INTERVAL)
+            else:
+                time.sleep(config.LLM_POLL_INTERVAL)
         
         logging.error("等待超时")
         return None
 
 
-    def _extract_json_content(self, api_response):
-        """从 API 响应中提取并清洗 JSON"""
+    def _extract_raw_content(self, api_response):
+        """从 API 响应中找到 LLM 输出的文本 (兼容 List 和 Dict 返回)"""
         raw_content = None
-
-        # 1. 寻找内容字段 (兼容 List 和 Dict 返回)
         if isinstance(api_response, list):
             for event in api_response:
                 if event.get("type") == "JOB_ENDED":
@@ -205,35 +254,163 @@ class AIPromptRunner:
                 raw_content = out.get("text") or out.get("content")
             else:
                 raw_content = out
+        return raw_content
+
+    def _expected_assets(self):
+        return self.only_assets or config.ASSET_CLASSES
 
+    def _extract_json_content(self, api_response, sections=None, expected_assets=None):
+        """
+        从 API 响应中提取、修复并校验 JSON
+        :param sections: 只校验这些顶层部分 (针对性重新请求的结果)
+        :param expected_assets: 必须覆盖的资产，默认为本次生成的全部资产
+        :return: llm_output.ParseResult，没有输出内容时返回 None
+        """
+        raw_content = self._extract_raw_content(api_response)
         if not raw_content:
             logging.error("未找到有效的输出内容")
             return None
+        result = llm_output.parse_report(raw_content, expected_assets or self._expected_assets(), sections)
+        if result.problems:
+            logging.warning(f"LLM 输出校验未通过: {result.problems}")
+        return result
 
-        # 2. 清洗 Markdown
-        text = str(raw_content)
-        text = re.sub(r'```json\s*', '', text)
-        text = re.sub(r'```\s*', '', text)
-        
-        # 3. 截取 JSON 部分
-        start = text.find('{')
-        end = text.rfind('}')
-        if start != -1 and end != -1:
-            text = text[start : end + 1]
+    @staticmethod
+    def _repair_assets(result):
+        """只有 content_slides 中的部分资产无效时，返回这些资产 (只重写它们)；否则 None"""
+        if result.invalid_sections == ["content_slides"] and result.invalid_assets \
+                and all(p.asset for p in result.problems):
+            return result.invalid_assets
+        return None
 
-        # 4. 解析
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            logging.error("JSON 解析失败，返回原始内容")
-            logging.debug(text[:500])
+    def _repair_prompt(self, result):
+        """只针对无效部分的重新请求指令"""
+        sections = result.invalid_sections
+        errors = "\n".join(f"- {p}" for p in result.problems[:20])
+        assets_line = ""
+        repair_assets = self._repair_assets(result)
+        if repair_assets:
+            names = config.ASSET_PROMPT_NAMES[self.language]
+            sep = ", " if self.language == "en" else "、"
+            assets = sep.join(names.get(a, a) for a in repair_assets)
+            template = config.AI_REPAIR_ASSETS_en if self.language == "en" else config.AI_REPAIR_ASSETS_cn
+            assets_line = template.format(assets=assets)
+        prompt = config.AI_REPAIR_PROMPT_en if self.language == "en" else config.AI_REPAIR_PROMPT_cn
+        return prompt.format(sections=", ".join(sections), errors=errors, assets_line=assets_line)
+
+    def _models(self):
+        """本次请求使用的模型：[主模型] 或 [主模型, 备用模型] (对冲)"""
+        backup = config.AI_BACKUP_MODEL_NAME
+        if config.LLM_HEDGE_ENABLED and backup and backup != self.model_name:
+            return [self.model_name, backup]
+        return [self.model_name]
+
+    @staticmethod
+    def _is_acceptable(result):
+        """通过 JSON/Schema 校验：能解析，且只有可接受的问题 (缺少个别资产，后续修复环节处理)"""
+        return result.data is not None and all(p.soft for p in result.problems)
+
+    def _request_and_parse(self, payload=None, sections=None, expected_assets=None, use_journal=True):
+        """
+        提交任务并等待结果：返回 ParseResult，失败返回 None
+        配置了备用模型时对冲请求 (llm_hedge.run_hedged)，第一份通过校验的结果胜出
+        :param use_journal: 是否使用任务日志中同一 Prompt 的已有任务；重试时为 False (已有的结果正是要重试的那份)
+        """
+        payload = payload or self._prepare_payload()
+        if not payload:
             return None
 
+        payload_hash = prompt_hash(self.api_base, payload)
+        untimed = set()   # 结果来自任务日志或重新接上的任务：耗时不完整，不计入对冲延迟的样本
+
+        def attempt(model, cancel_event):
+            job_id, result_raw = self._resume_or_submit(payload, payload_hash, model, cancel_event, use_journal, untimed)
+            if not result_raw:
+                return None
+            result = self._extract_json_content(result_raw, sections, expected_assets)
+            if result is None or not result.ok:
+                # 无效的结果不再从任务日志中重用 (否则之后的每次点击都拿到同一份)
+                self.journal.record_invalid(job_id)
+            return result
+
+        models = self._models()
+        result, self.last_model = llm_hedge.run_hedged(
+            attempt, models, self.latency_stats.hedge_delay(models[0]), self._is_acceptable,
+            cancel_event=self.cancel_event, stats=self.latency_stats, untimed=untimed,
+        )
+        return result
+
+    def _resume_or_submit(self, payload, payload_hash, model, cancel_event=None, use_journal=True, untimed=None):
+        """
+        取得某个模型对该 Prompt 的原始响应：
+        任务日志中已有结果的直接使用，已提交未完成的接着轮询 (会话重跑/进程重启后)，否则重新提交
+        :param use_journal: False 时总是重新提交
+        :param untimed: 使用了任务日志中的任务时，把模型加入该 set
+        :return: (job_id, 原始响应)，失败时原始响应为 None
+        """
+        entry = self.journal.find(payload_hash, model) if use_journal else None
+        if entry and untimed is not None:
+            untimed.add(model)
+        if entry and entry["stage"] == "completed" and entry.get("response"):
+            logging.info(f"[任务日志] 使用已完成任务 {entry['job_id']} ({model}) 的结果")
+            self.journal_jobs.append(entry["job_id"])
+            return entry["job_id"], entry["response"]
+
+        if entry:
+            job_id = entry["job_id"]
+            waited = time.time() - entry.get("submitted_at", time.time())
+            logging.info(f"[任务日志] 重新接上任务 {job_id} ({model}，已提交 {waited:.0f} 秒)")
+        else:
+            model_payload = copy.deepcopy(payload)
+            model_payload["input"]["parameter"]["model_name"] = model
+            job_id = self.submit_job(model_payload)
+            if not job_id:
+                return None, None
+            self.journal.record_submitted(job_id, model, payload_hash)
+        self.journal_jobs.append(job_id)
+
+        result_raw = self.poll_job(job_id, cancel_event=cancel_event)
+        if result_raw:
+            self.journal.record_completed(job_id, result_raw)
+        elif not any(e is not None and e.is_set() for e in (cancel_event, self.cancel_event)):
+            # 取消 (对冲输掉/流水线取消) 的任务保持 submitted，下次同样的 Prompt 还能接上
+            self.journal.record_failed(job_id)
+        return job_id, result_raw
+
+    def _repair(self, result):
+        """
+        针对无效部分重新请求并合并，最多 config.LLM_REPAIR_MAX_ROUNDS 轮
+        整份都无法解析时重新请求完整报告
+        """
+        for round_no in range(1, config.LLM_REPAIR_MAX_ROUNDS + 1):
+            if result.ok:
+                break
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                break
+            if result.data is None:
+                logging.warning(f"[修复 {round_no}] 输出完全无法解析，重新请求完整报告")
+                retry = self._request_and_parse(use_journal=False)
+                result = retry or result
+                continue
+
+            sections = result.invalid_sections
+            repair_assets = self._repair_assets(result)
+            logging.warning(f"[修复 {round_no}] 只重新请求: {sections} {repair_assets or ''}")
+            payload = self._prepare_payload(extra_prompt=self._repair_prompt(result))
+            patch = self._request_and_parse(payload, sections=sections, expected_assets=repair_assets,
+                                            use_journal=False)
+            if not patch or patch.data is None:
+                continue
+            merged = llm_output.merge_patch(result.data, patch.data, result, repair_assets)
+            result = llm_output.ParseResult(
+                merged, llm_output.validate_report(merged, self._expected_assets()), repaired=True
+            )
+        return result
+
     def save_report(self, json_data, output_file="final_investment_report.json"):
         """保存最终结果"""
         try:
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(json_data, f, ensure_ascii=False, indent=4)
+            atomic_write_json(output_file, json_data)
             logging.info(f"报告已保存: {output_file}")
             return True
         except Exception as e:
@@ -247,7 +424,7 @@ class AIPromptRunner:
             'client_secret': self.CLIENT_SECRET
         }
         try:
-            resp = requests.post(self.AUTH_URL, data=payload)
+            resp = http_client.post(self.AUTH_URL, data=payload, retry=http_client.RetryPolicy(retry_unsafe=True))
             resp.raise_for_status()
             return resp.json().get('access_token')
         except Exception as e:
@@ -255,10 +432,17 @@ class AIPromptRunner:
             return None
     # ================= 4. 主流程入口 =================
 
-    def run(self, specific_folder=None):
-        """执行全流程"""
+    def run(self, specific_folder=None, report_path=None, only_assets=None):
+        """
+        执行全流程
+        :param specific_folder: 清洗后的文章目录
+        :param report_path: 报告保存路径，默认写入当前目录 (多用户时传入工作目录下的路径)
+        :param only_assets: 增量模式下只生成这些资产 (中文标准名)，返回的报告也只包含这些资产
+        """
+        self.only_assets = list(only_assets) if only_assets else None
+        self.journal_jobs = []
         # 1. 读取文件
-        if not self.load_files(specific_folder):
+        if not self.load_files(specific_folder, only_assets=self.only_assets):
             logging.error("文件加载失败，流程终止")
             return None
         logging.info("正在获取初始 Token...")
@@ -266,22 +450,27 @@ class AIPromptRunner:
         if not self.token:
             logging.error("无法获取初始 Token，流程终止")
             return None
-        # 2. 提交任务
-        job_id = self.submit_job()
-        if not job_id:
+        # 2-3. 提交任务并轮询结果，4. 提取、修复并校验
+        result = self._request_and_parse()
+        if result is None:
             return None
         
-        # 3. 轮询结果
-        result_raw = self.poll_job(job_id)
-        if not result_raw:
-            return None
-        
-        # 4. 提取清洗
-        final_json = self._extract_json_content(result_raw)
+        # 校验未通过时只针对无效的部分重新请求，不必整份重跑
+        if not result.ok:
+            result = self._repair(result)
+        if result.problems:
+            logging.warning(f"重新请求后仍有问题: {result.problems}")
+        logging.info(self.latency_stats.summary())
+        final_json = result.data if result.complete else None
         
         # 5. 保存
         if final_json:
-            self.save_report(final_json)
+            if report_path:
+                saved = self.save_report(final_json, report_path)
+            else:
+                saved = self.save_report(final_json)
+            if saved:
+                self.journal.mark_consumed(self.journal_jobs)
             return final_json
         return None
 
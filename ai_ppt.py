@@ -1,16 +1,18 @@
 import streamlit as st
 import os
-import json
-import requests
 import time
 import logging
-import re
+from datetime import date, timedelta
 
 # --- 引入自定义模块 ---
-# 确保 construct_json, ai_prompt, ppt_ready 都在同一目录下
-from construct_json import json_main
-from AI_prompt_ready import AIPromptRunner
-from ppt_ready import PPTGenerator
+# 这里只引入轻量模块 (只依赖标准库和 config)，登录页和主界面不必等待 python-pptx / bs4 / requests 等加载。
+# 生成流水线用到的模块 (construct_json, AI_prompt_ready, ppt_ready, pipeline, http_client) 在各阶段内才导入
+from run_bundle import replay_bundle, list_bundles, read_bundle_settings
+from workspace import RunWorkspace, cleanup_workspaces
+from report_archive import ReportArchive
+from job_journal import JobJournal
+from report_pipeline import get_language, build_report_pipeline, record_run
+from pregenerate import PregenCache
 # --- 引入配置文件 ---
 import config
 
@@ -18,168 +20,19 @@ import config
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # ================= 1. 后端逻辑函数 =================
-
-def get_news_platform_token():
-    """获取 News Platform Token (使用 config.py 配置)"""
-    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-    data = {
-        'client_id': config.NEWS_CLIENT_ID,
-        'client_secret': config.NEWS_CLIENT_SECRET,
-        'grant_type': 'client_credentials'
-    }
-    try:
-        response = requests.post(config.NEWS_AUTH_URL, headers=headers, data=data, timeout=10)
-        response.raise_for_status()
-        return response.json().get('access_token')
-    except Exception as e:
-        logging.error(f"获取 News Token 失败: {e}")
-        return None
-
-def fetch_articles(token):
-    """抓取文章列表"""
-    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
-    try:
-        response = requests.get(config.NEWS_ARTICLE_URL, headers=headers, timeout=30)
-        if response.status_code == 200:
-            return response.json()
-        elif response.status_code == 401:
-            return "EXPIRED"
-        return None
-    except Exception as e:
-        logging.error(f"文章抓取失败: {e}")
-        return None
-
-def save_temp_json(data, filename='articles.json'):
-    """保存临时 JSON 数据"""
-    try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        return True
-    except Exception as e:
-        logging.error(f"保存 {filename} 失败: {e}")
-        return False
-
-def choose_template(location_name, language="cn"):
-    """根据地点和语言选择模板"""
-    # 获取地点对应的模板映射
-    location_templates = config.TEMPLATE_MAP.get(location_name, config.TEMPLATE_MAP["香港/Hong Kong"])
-    
-    # 根据语言选择模板
-    template_path = location_templates.get(language, location_templates["cn"])
-    
-    # 检查文件是否存在，如果不存在则使用默认语言
-    if not os.path.exists(template_path):
-        template_path = location_templates["cn"]
-    
-    return template_path
-
-def get_language(language):
-    """根据 config 映射获取模板路径"""
-    # 默认为香港模板
-    rel_language = config.LANGUAGE_MAP.get(language, config.LANGUAGE_MAP["中文/Chinese"])
-    # Streamlit 中直接使用相对路径通常没问题
-    return rel_language
-import re
-
-def clean_html_content(html_content):
-    """
-    清洗 HTML 文本：去除 img、VML图表乱码（Base64）和资料来源段落
-    """
-    if not isinstance(html_content, str):
-        return html_content
-
-    # === 1. 强力清除包含巨长 Base64 编码的 VML 标签（解决你的乱码核心问题！） ===
-    # 匹配类似 <v:rect ... o:gfxdata="UEsDB..."> 的标签
-    vml_pattern = re.compile(r'<v:[^>]*o:gfxdata=[^>]*>', re.IGNORECASE | re.DOTALL)
-    
-    # 匹配成对的 <v:...> ... </v:...> 隐藏图表标签
-    vml_pair_pattern = re.compile(r'<v:[^>]*>.*?</v:[^>]*>', re.IGNORECASE | re.DOTALL)
-
-    # 匹配可能裸露在外的超长 Base64 字符串（连续超过500个字符的乱码）
-    base64_pattern = re.compile(r'[A-Za-z0-9+/=]{500,}')
-
-    # === 2. 你原有的清洗规则 ===
-    # 匹配 < img ...> 标签 
-    img_pattern = re.compile(r'<img[^>]+>', re.IGNORECASE | re.DOTALL)
-    
-    # 匹配包含 "资料来源" 的 <p> 段落
-    source_pattern = re.compile(r'<p[^>]*>.*?资料来源.*?</p\s*>', re.IGNORECASE | re.DOTALL)
-
-    # === 3. 执行替换 ===
-    content = vml_pattern.sub('', html_content)         # 删带有 gfxdata 的乱码标签
-    content = vml_pair_pattern.sub('', content)         # 删 VML 图表对
-    content = base64_pattern.sub('', content)           # 删裸露的超长乱码
-    content = img_pattern.sub('', content)              # 删普通图片
-    content = source_pattern.sub('', content)           # 删资料来源
-    
-    # 选做：如果你希望传给 AI 的内容更干净，甚至可以把剩下的所有普通 HTML 标签也顺手干掉
-    # content = re.sub(r'<.*?>', '', content)
-
-    # 4. 清理多余的空白符和换行
-    content = re.sub(r'\n\s*\n', '\n\n', content)
-    content = content.replace('&nbsp;', ' ')
-
-    return content.strip()
-
-def process_single_file(file_path, save_path):
-    """
-    读取单个文件，清洗数据，并保存
-    """
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        # 构建清洗后的字典结构，只保留需要的字段
-        cleaned_data = {
-            "titles": data.get("titles", {}),
-            "summaries": data.get("summaries", {}),
-            "contents": {} # 稍后填充
-        }
-
-        # 处理 contents
-        raw_contents = data.get("contents", {})
-        if raw_contents:
-            for lang, html_text in raw_contents.items():
-                cleaned_data["contents"][lang] = clean_html_content(html_text)
-
-        # 保存到输出文件夹
-        with open(save_path, 'w', encoding='utf-8') as f:
-            json.dump(cleaned_data, f, ensure_ascii=False, indent=2)
-            
-        print(f"[成功] 已清洗: {os.path.basename(file_path)}")
-
-    except json.JSONDecodeError:
-        print(f"[跳过] 文件格式错误 (非标准JSON): {os.path.basename(file_path)}")
-    except Exception as e:
-        print(f"[错误] 处理 {os.path.basename(file_path)} 时出错: {str(e)}")
-
-def batch_process(INPUT_FOLDER, OUTPUT_FOLDER):
-    # 1. 检查输入文件夹是否存在
-    if not os.path.exists(INPUT_FOLDER):
-        print(f"错误：找不到输入文件夹 '{INPUT_FOLDER}'，请先创建并放入 JSON 文件。")
-        return
-
-    # 2. 如果输出文件夹不存在，自动创建
-    if not os.path.exists(OUTPUT_FOLDER):
-        os.makedirs(OUTPUT_FOLDER)
-        print(f"已创建输出文件夹: {OUTPUT_FOLDER}")
-
-    # 3. 获取所有 JSON 文件
-    files = [f for f in os.listdir(INPUT_FOLDER) if f.lower().endswith('.json')]
-    
-    if not files:
-        print(f"在 '{INPUT_FOLDER}' 中没有找到 .json 文件。")
-        return
-
-    print(f"开始处理，共发现 {len(files)} 个文件...\n")
-
-    # 4. 循环处理
-    for filename in files:
-        input_path = os.path.join(INPUT_FOLDER, filename)
-        output_path = os.path.join(OUTPUT_FOLDER, filename)
-        process_single_file(input_path, output_path)
-
-    print(f"\n全部完成！清洗后的文件在 '{OUTPUT_FOLDER}' 文件夹中。")
+# 抓取、模板选择和流水线组装在 report_pipeline.py (与 HTTP 服务共用)
+
+# 各阶段完成时进度条增加的百分比
+STAGE_PROGRESS = {"fetch": 15, "template": 5, "select": 10, "images": 10, "clean": 10, "llm": 35, "render": 15}
+STAGE_LABELS = {
+    "fetch": "获取文章 (Fetching)",
+    "template": "预加载模板 (Template)",
+    "select": "整理素材 (Selecting)",
+    "images": "下载图片 (Images)",
+    "clean": "清洗文章 (Cleaning)",
+    "llm": "AI 撰写 (AI Writing)",
+    "render": "渲染 PPT (Rendering)",
+}
 # ================= 2. 密码验证逻辑 =================
 
 def check_password():
@@ -256,101 +109,205 @@ def main_app():
                 horizontal=True
             )
 
+        incremental = st.checkbox(
+            "♻️ 增量生成：只重写有新文章的资产 / Incremental (reuse unchanged assets)",
+            value=False
+        )
+
+        translate_en = False
+        if language == "英文/English" and not incremental:
+            translate_en = st.checkbox(
+                "🌐 由中文报告翻译：同一批文章已有中文版时直接翻译，无需等待英文 AI 撰写 / Translate from the Chinese report",
+                value=config.EN_TRANSLATE_FROM_CN
+            )
+
     st.markdown("---")
 
     # 3. 执行区
     st.subheader("2. 执行 / Execute")
+
+    # 会话重跑/进程重启前仍在等待的 AI 任务：再次生成相同内容时自动接上
+    pending_jobs = JobJournal().pending()
+    if pending_jobs:
+        st.info(f"⏳ 有 {len(pending_jobs)} 个未完成的 AI 任务，再次生成相同内容时会直接接上，无需重新等待")
     
+    # 调度器 (pregenerate.py) 已按最新文章生成好的 PPT：点击后直接下载，不再跑流水线
+    pregen = None
+    if config.PREGEN_ENABLED and not incremental:
+        pregen = PregenCache().lookup(location_name, get_language(language))
+        if pregen:
+            generated_at = time.strftime("%H:%M", time.localtime(pregen["generated_at"]))
+            st.caption(f"⚡ 已按最新文章预生成 (生成于 {generated_at})，点击后直接下载")
+
     # 一个醒目的大按钮
     start_btn = st.button("🚀 开始生成 PPT / Start Generation", type="primary", use_container_width=True)
     
-    if start_btn:
+    if start_btn and pregen:
+        with open(pregen["deck_path"], "rb") as file:
+            deck_bytes = file.read()
+        st.success("✅ PPT 已预生成 (Served from cache)")
+        st.download_button(
+            label=f"📥 点击下载: {pregen['filename']}",
+            data=deck_bytes,
+            file_name=pregen["filename"],
+            mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+            use_container_width=True,
+            type="primary"
+        )
+    elif start_btn:
+        import http_client
+        from pipeline import PipelineError, StageError
         # --- 这里改回了你想要的简单进度条模式 ---
         status_text = st.empty()
         progress_bar = st.progress(0)
+
+        # 每次运行使用独立的工作目录，多个会话可以同时生成
+        workspace = RunWorkspace().create()
+        cleanup_workspaces(keep={workspace.run_id})
         
         try:
-            # === Step 1 ===
-            status_text.markdown("**Step 1/4:** 正在连接 News Platform 获取数据... (Connecting...)")
-            progress_bar.progress(10)
-            
-            token = get_news_platform_token()
-            if not token:
-                st.error("❌ 无法获取 News Token")
-                return
-
-            articles = fetch_articles(token)
-            if not articles or articles == "EXPIRED":
-                st.error("❌ 文章列表为空或 Token 失效")
-                return
-            
-            save_temp_json(articles, 'articles.json')
-            progress_bar.progress(30)
-
-            # === Step 2 ===
-            status_text.markdown("**Step 2/4:** 正在下载图片并整理素材... (Downloading images...)")
-            # json_main logic...
-            articles_dir, images_dir = json_main("articles.json")
-            
-            if not articles_dir or not os.path.exists(articles_dir):
-                st.error("❌ 文件处理失败")
-                return
-            progress_bar.progress(50)
-
-            # === Step 3 ===
-            status_text.markdown("**Step 3/4:** AI 正在撰写报告，请稍候... (AI Writing...)")
-            
             language_code = get_language(language)
             print(f"Init AIPromptRunner with language={language_code}")
-            articles_dir_cleaned = "cleaned_articles"
-            os.makedirs(articles_dir_cleaned, exist_ok=True)
-            batch_process(articles_dir, config.CLEANED_DIR)
-            runner = AIPromptRunner(language=language_code)
-            final_json_data = runner.run(specific_folder=config.CLEANED_DIR)
-            
-            if not final_json_data:
-                st.error("❌ AI 生成失败")
+            status_text.markdown(f"**正在生成 {location_name} 版报告...** 抓取、图片下载、AI 撰写和模板加载并行执行")
+
+            done_stages = []
+            def on_stage_done(stage):
+                # 在事件循环线程 (即脚本线程) 中回调，可以直接更新界面
+                done_stages.append(STAGE_LABELS.get(stage.name, stage.name))
+                progress_bar.progress(min(100, sum(STAGE_PROGRESS.get(n, 0) for n in pipeline.results)))
+                status_text.markdown(f"**已完成:** {' → '.join(done_stages)}")
+
+            def on_stage_progress(stage):
+                # 阶段内进度 (清洗文章：已完成文件数 / 总数)，按比例计入该阶段的进度
+                done, total = stage.progress
+                finished = sum(STAGE_PROGRESS.get(n, 0) for n in pipeline.results)
+                partial = STAGE_PROGRESS.get(stage.name, 0) * done / max(total, 1)
+                progress_bar.progress(min(100, int(finished + partial)))
+                label = STAGE_LABELS.get(stage.name, stage.name)
+                status_text.markdown(f"**已完成:** {' → '.join(done_stages) or '-'}  \n**{label}:** {done}/{total}")
+
+            pipeline = build_report_pipeline(workspace, location_name, language_code, incremental, on_stage_done,
+                                             translate_en=translate_en, on_stage_progress=on_stage_progress)
+            try:
+                results = pipeline.run()
+            except PipelineError as e:
+                message = str(e.cause) if isinstance(e.cause, StageError) else str(e)
+                st.error(f"❌ {message}")
                 return
+            finally:
+                with st.expander("⏱️ 流水线耗时 / Stage timings"):
+                    st.code(pipeline.report())
+
+            _, plan = results["llm"]
+            if plan and plan.unchanged:
+                st.info(f"♻️ 沿用上一期观点: {'、'.join(plan.unchanged)}；重新生成: {'、'.join(plan.changed) or '无'}")
+            deck_buffer = results["render"]
             
-            progress_bar.progress(80)
-
-            # === Step 4 ===
-            status_text.markdown(f"**Step 4/4:** 正在渲染 {location_name} 版 PPT... (Rendering PPT...)")
-            
-            template_path = choose_template(location_name, language_code)
-            output_filename = f"AI_PPT_generated_{location_name}_{language_code}.pptx"
-            final_output_path = os.path.join(config.OUTPUT_DIR, output_filename)
-            
-            os.makedirs(config.OUTPUT_DIR, exist_ok=True)
-            
-            generator = PPTGenerator(final_json_data, template_path, images_dir, location_name, language=language_code)
-            success = generator.run(final_output_path)
-            
-            if success:
+            if deck_buffer:
                 progress_bar.progress(100)
                 status_text.success("✅ PPT 生成完成！(Generation Complete)")
+
+                # 录制运行包、归档报告和 PPT (之后可离线回放，或在「历史报告」面板直接取回)
+                deck_bytes, output_filename = record_run(workspace, results, location_name, language_code,
+                                                         pipeline.template_path)
                 
                 # 生成成功后的下载按钮
-                real_file_path = os.path.join(config.OUTPUT_DIR, output_filename)
-                
-                if os.path.exists(real_file_path):
-                    with open(real_file_path, "rb") as file:
-                        st.download_button(
-                            label=f"📥 点击下载: {output_filename}",
-                            data=file,
-                            file_name=output_filename,
-                            mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-                            use_container_width=True,
-                            type="primary"
-                        )
-                else:
-                    st.error("❌ 文件生成路径异常")
+                st.download_button(
+                    label=f"📥 点击下载: {output_filename}",
+                    data=deck_bytes,
+                    file_name=output_filename,
+                    mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+                    use_container_width=True,
+                    type="primary"
+                )
             else:
                 st.error("❌ PPT 生成过程中发生错误")
 
         except Exception as e:
             st.error(f"❌ 发生异常: {str(e)}")
             logging.exception("运行出错")
+        finally:
+            for host, s in http_client.metrics_summary().items():
+                logging.info(f"HTTP {host}: {s['requests']} 次请求, 重试 {s['retries']} 次, 失败 {s['errors']} 次, "
+                             f"平均 {s['avg_seconds']:.2f}s, 最长 {s['max_seconds']:.2f}s")
+            http_client.reset_metrics()
+
+    st.markdown("---")
+    history_panel()
+    replay_panel()
+
+def history_panel():
+    """历史报告：按日期、资产、关键词检索已归档的观点，并直接下载当时的 PPT"""
+    with st.expander("历史报告 / Report Archive"):
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            date_range = st.date_input(
+                "📅 日期 / Dates:",
+                (date.today() - timedelta(days=7), date.today())
+            )
+        with c2:
+            asset = st.selectbox("📈 资产 / Asset:", ["全部/All"] + config.ASSET_CLASSES)
+        with c3:
+            keyword = st.text_input("🔍 关键词 / Keyword:")
+
+        start_date = end_date = None
+        if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
+            start_date, end_date = (d.strftime("%Y-%m-%d") for d in date_range)
+
+        views = ReportArchive().query_views(
+            start_date=start_date,
+            end_date=end_date,
+            asset=None if asset == "全部/All" else asset,
+            keyword=keyword.strip() or None,
+        )
+        if not views:
+            st.info("没有找到匹配的历史观点")
+            return
+
+        for i, view in enumerate(views):
+            st.markdown(f"**{view['report_date']}** · {view['location']} · {view['language']} — **{view['title']}**")
+            for bullet in view["bullets"]:
+                st.markdown(f"- {bullet}")
+            deck_path = view.get("deck_path")
+            if deck_path and os.path.exists(deck_path):
+                with open(deck_path, "rb") as file:
+                    st.download_button(
+                        label=f"📥 下载当时的 PPT ({view['run_id']})",
+                        data=file,
+                        file_name=f"AI_PPT_{view['report_date']}_{view['language']}.pptx",
+                        mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+                        key=f"archive_{view['report_id']}_{i}"
+                    )
+
+def replay_panel():
+    """离线回放：只用 PPTGenerator 重新渲染已录制的运行包"""
+    with st.expander("3. 离线回放 / Replay Recorded Runs"):
+        bundles = list_bundles()
+        if not bundles:
+            st.info("暂无已录制的运行包")
+            return
+
+        bundle_path = st.selectbox(
+            "📦 运行包 / Bundle:",
+            bundles,
+            format_func=lambda p: f"{os.path.basename(p)}  {read_bundle_settings(p).get('location', '')}"
+        )
+
+        if st.button("🔁 重新渲染 / Replay", use_container_width=True):
+            with st.spinner("正在回放渲染..."):
+                ok, out_path, elapsed = replay_bundle(bundle_path)
+            if ok and os.path.exists(out_path):
+                st.success(f"✅ 回放完成 (渲染耗时 {elapsed:.2f}s)")
+                with open(out_path, "rb") as file:
+                    st.download_button(
+                        label=f"📥 点击下载: {os.path.basename(out_path)}",
+                        data=file,
+                        file_name=os.path.basename(out_path),
+                        mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+                        use_container_width=True
+                    )
+            else:
+                st.error("❌ 回放渲染失败")
 
 # 入口保持不变
 if __name__ == "__main__":
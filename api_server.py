@@ -0,0 +1,404 @@
+import os
+import hmac
+import json
+import time
+import uuid
+import queue
+import logging
+import argparse
+import threading
+from datetime import date
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, quote
+
+# 引入配置文件
+import config
+from workspace import RunWorkspace, cleanup_workspaces, atomic_write_bytes
+from report_pipeline import build_report_pipeline, record_run
+from pipeline import PipelineError, StageError
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+报告生成 HTTP 服务 (供下游系统自动请求 PPT，不经过 Streamlit 界面)
+
+与 ai_ppt.py 使用同一条流水线 (report_pipeline.build_report_pipeline)，只依赖标准库：
+
+    POST /api/decks              提交任务 {"location": "香港/Hong Kong", "language": "cn", "incremental": false, "force": false}
+                                 202 已排队 / 200 命中缓存 / 429 队列已满 (Retry-After) / 400 参数错误
+    GET  /api/jobs/<id>          任务状态：queued / running / done / failed，含各阶段耗时
+    GET  /api/jobs/<id>/deck     下载 PPT (任务未完成时 409)
+    GET  /api/health             队列长度、运行中任务数、并发上限和计数
+
+- 任务进入有界队列 (config.API_QUEUE_SIZE)，由 config.API_WORKERS 个线程执行；队列满时直接返回 429，不在服务内堆积
+- LLM 和渲染阶段各有并发上限 (config.API_MAX_CONCURRENT_LLM / API_MAX_CONCURRENT_RENDER)，
+  抓取、清洗等其他阶段不受限制；等待名额的时间计入该阶段的超时
+- 同一天相同 (地点, 语言, 增量) 的成功结果在 config.API_RESULT_TTL 秒内直接返回；
+  相同参数的任务正在排队或执行时，新请求合并到该任务 (force 只跳过缓存)
+- 设置了 config.API_KEY (环境变量 DECK_API_KEY) 时，请求需带 X-API-Key 请求头
+
+用法：
+    python api_server.py [--host 127.0.0.1] [--port 8600] [--workers 4]
+"""
+
+
+class QueueFull(Exception):
+    """任务队列已满 (返回 429)"""
+
+
+# ================= 1. 任务 =================
+
+class DeckJob:
+    def __init__(self, location_name, language_code, incremental=False):
+        self.id = uuid.uuid4().hex[:12]
+        self.location_name = location_name
+        self.language_code = language_code
+        self.incremental = incremental
+        self.key = (location_name, language_code, incremental, date.today().isoformat())
+        self.status = "queued"      # queued / running / done / failed
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.run_id = None
+        self.deck_path = None
+        self.filename = None
+        self.stages = {}            # 阶段名 -> 耗时秒数
+        self.waits = {}             # 阶段名 -> 等待并发名额的秒数
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "location": self.location_name,
+            "language": self.language_code,
+            "incremental": self.incremental,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "run_id": self.run_id,
+            "filename": self.filename,
+            "stages": self.stages,
+            "waits": self.waits,
+        }
+
+
+# ================= 2. 任务调度 =================
+
+class DeckService:
+    def __init__(self, workers=None, queue_size=None, llm_limit=None, render_limit=None,
+                 result_ttl=None, max_jobs=None):
+        self.workers = workers or config.API_WORKERS
+        self.queue = queue.Queue(maxsize=queue_size or config.API_QUEUE_SIZE)
+        self.llm_limit = llm_limit or config.API_MAX_CONCURRENT_LLM
+        self.render_limit = render_limit or config.API_MAX_CONCURRENT_RENDER
+        self.llm_slots = threading.BoundedSemaphore(self.llm_limit)
+        self.render_slots = threading.BoundedSemaphore(self.render_limit)
+        self.result_ttl = config.API_RESULT_TTL if result_ttl is None else result_ttl
+        self.max_jobs = max_jobs or config.API_MAX_JOBS
+
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()   # id -> DeckJob (最近的在后)
+        self.active = {}            # key -> 排队或执行中的 DeckJob
+        self.results = {}           # key -> 最近一次成功的 DeckJob
+        self.counts = {"submitted": 0, "cache_hits": 0, "coalesced": 0, "rejected": 0, "done": 0, "failed": 0}
+        self.threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"deck-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logging.info(f"[API] 已启动 {self.workers} 个任务线程，队列上限 {self.queue.maxsize}，"
+                     f"LLM 并发 {self.llm_limit}，渲染并发 {self.render_limit}")
+        return self
+
+    def stop(self, timeout=None):
+        """不再接收新任务：排队中的任务标记为失败，等待执行中的任务结束"""
+        while True:
+            try:
+                job = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                self._finish(job, error="服务已停止")
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def submit(self, location_name, language_code, incremental=False, force=False):
+        """
+        提交生成任务
+        :param force: 跳过缓存重新生成 (相同参数的任务正在执行时仍合并到该任务)
+        :return: (DeckJob, 来源) 来源为 "cached" / "coalesced" / "queued"
+        :raises QueueFull: 队列已满
+        """
+        job = DeckJob(location_name, language_code, incremental)
+        with self.lock:
+            cached = None if force else self._cached(job.key)
+            if cached is not None:
+                self.counts["cache_hits"] += 1
+                return cached, "cached"
+            active = self.active.get(job.key)
+            if active is not None:
+                self.counts["coalesced"] += 1
+                return active, "coalesced"
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                self.counts["rejected"] += 1
+                raise QueueFull(f"队列已满 ({self.queue.maxsize})")
+            self.counts["submitted"] += 1
+            self.active[job.key] = job
+            self.jobs[job.id] = job
+            self._prune_jobs()
+        return job, "queued"
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def health(self):
+        with self.lock:
+            running = sum(1 for job in self.active.values() if job.status == "running")
+            return {
+                "status": "ok",
+                "queued": self.queue.qsize(),
+                "queue_size": self.queue.maxsize,
+                "running": running,
+                "workers": self.workers,
+                "llm_limit": self.llm_limit,
+                "render_limit": self.render_limit,
+                "cached_results": len(self.results),
+                "counts": dict(self.counts),
+            }
+
+    def _cached(self, key):
+        """未过期且 PPT 文件仍在的结果 (工作目录可能已被清理)"""
+        job = self.results.get(key)
+        if job is None:
+            return None
+        if time.time() - job.finished_at > self.result_ttl or not os.path.exists(job.deck_path):
+            del self.results[key]
+            return None
+        return job
+
+    def _prune_jobs(self):
+        """只保留最近的 config.API_MAX_JOBS 条记录 (排队/执行中和缓存中的任务除外)"""
+        keep = {job.id for job in self.active.values()} | {job.id for job in self.results.values()}
+        for job_id in list(self.jobs):
+            if len(self.jobs) <= self.max_jobs:
+                break
+            if job_id not in keep:
+                del self.jobs[job_id]
+
+    # ================= 3. 执行 =================
+
+    def _worker_loop(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            try:
+                self._run(job)
+            except Exception as e:
+                logging.exception(f"[API] 任务 {job.id} 异常")
+                self._finish(job, error=str(e))
+
+    def _limited(self, fn, slots, job, name):
+        """阶段函数外包一层并发名额：等待期间检查取消信号 (超时或其他阶段失败时退出)"""
+        def limited(ctx):
+            start = time.perf_counter()
+            while not slots.acquire(timeout=0.5):
+                if ctx.cancelled:
+                    raise StageError(f"等待 {name} 并发名额时被取消")
+            job.waits[name] = round(time.perf_counter() - start, 3)
+            try:
+                return fn(ctx)
+            finally:
+                slots.release()
+        return limited
+
+    def _run(self, job):
+        job.status = "running"
+        job.started_at = time.time()
+        workspace = RunWorkspace().create()
+        job.run_id = workspace.run_id
+        with self.lock:
+            keep = {j.run_id for j in self.active.values()} | {j.run_id for j in self.results.values()}
+        cleanup_workspaces(keep=keep)
+
+        pipeline = build_report_pipeline(workspace, job.location_name, job.language_code, job.incremental)
+        for name, slots in (("llm", self.llm_slots), ("render", self.render_slots)):
+            stage = pipeline.stages[name]
+            stage.fn = self._limited(stage.fn, slots, job, name)
+
+        try:
+            results = pipeline.run()
+        except PipelineError as e:
+            self._finish(job, pipeline, error=str(e.cause) if isinstance(e.cause, StageError) else str(e))
+            return
+
+        deck_bytes, filename = record_run(workspace, results, job.location_name, job.language_code,
+                                          pipeline.template_path)
+        deck_path = os.path.join(workspace.output_dir, filename)
+        atomic_write_bytes(deck_path, deck_bytes)
+        job.deck_path, job.filename = deck_path, filename
+        self._finish(job, pipeline)
+
+    def _finish(self, job, pipeline=None, error=None):
+        if pipeline is not None:
+            job.stages = {name: round(stage.duration, 3) for name, stage in pipeline.stages.items()}
+        job.error = error
+        job.finished_at = time.time()
+        job.status = "failed" if error else "done"
+        with self.lock:
+            if self.active.get(job.key) is job:
+                del self.active[job.key]
+            if not error:
+                self.results[job.key] = job
+            self.counts[job.status] += 1
+        took = job.finished_at - (job.started_at or job.created_at)
+        if error:
+            logging.error(f"[API] 任务 {job.id} 失败 ({took:.1f}s): {error}")
+        else:
+            logging.info(f"[API] 任务 {job.id} 完成 ({took:.1f}s): {job.filename}")
+
+
+# ================= 4. HTTP 接口 =================
+
+def parse_request(body):
+    """
+    校验提交参数
+    :return: (地点, 语言代码, 增量, 强制)
+    :raises ValueError: 参数无效 (返回 400)
+    """
+    location_name = body.get("location")
+    if location_name not in config.TEMPLATE_MAP:
+        raise ValueError(f"location 须为 {list(config.TEMPLATE_MAP)} 之一")
+    language = body.get("language", "cn")
+    # 语言代码 (cn / en) 和界面上的选项 (中文/Chinese) 都可以
+    language_code = config.LANGUAGE_MAP.get(language, language)
+    if language_code not in config.LANGUAGE_MAP.values():
+        raise ValueError(f"language 须为 {list(config.LANGUAGE_MAP.values())} 之一")
+    return location_name, language_code, bool(body.get("incremental", False)), bool(body.get("force", False))
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, body, headers=None):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _authorized(self):
+            if not config.API_KEY:
+                return True
+            if hmac.compare_digest(self.headers.get("X-API-Key", ""), config.API_KEY):
+                return True
+            self._send(401, {"error": "X-API-Key 无效"})
+            return False
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            if urlparse(self.path).path.rstrip("/") != "/api/decks":
+                return self._send(404, {"error": "not found"})
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(body, dict):
+                    raise ValueError("请求体须为 JSON 对象")
+                location_name, language_code, incremental, force = parse_request(body)
+            except ValueError as e:
+                return self._send(400, {"error": str(e)})
+            try:
+                job, source = service.submit(location_name, language_code, incremental, force)
+            except QueueFull as e:
+                return self._send(429, {"error": str(e)}, {"Retry-After": str(config.API_RETRY_AFTER)})
+            code = 200 if job.status == "done" else 202
+            self._send(code, dict(job.to_dict(), source=source), {"Location": f"/api/jobs/{job.id}"})
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            parts = urlparse(self.path).path.strip("/").split("/")
+            if parts == ["api", "health"]:
+                return self._send(200, service.health())
+            if len(parts) not in (3, 4) or parts[:2] != ["api", "jobs"] or parts[3:] not in ([], ["deck"]):
+                return self._send(404, {"error": "not found"})
+            job = service.get(parts[2])
+            if job is None:
+                return self._send(404, {"error": "job not found"})
+            if len(parts) == 3:
+                return self._send(200, job.to_dict())
+            if job.status != "done":
+                return self._send(409, {"error": f"任务状态为 {job.status}", "job": job.to_dict()})
+            from ppt_ready import iter_deck_chunks
+            try:
+                f = open(job.deck_path, "rb")
+            except OSError:
+                return self._send(410, {"error": "PPT 已被清理，请重新提交"})
+            # 按块发送，不把整份 PPT 读入内存
+            with f:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/vnd.openxmlformats-officedocument.presentationml.presentation")
+                self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+                self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(job.filename)}")
+                self.end_headers()
+                for chunk in iter_deck_chunks(f):
+                    self.wfile.write(chunk)
+
+        def log_message(self, format, *args):
+            logging.debug(f"[API] {self.address_string()} {format % args}")
+
+    return Handler
+
+
+class DeckHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 默认的监听队列只有 5：多个客户端同时连接时，超出的连接要等 1 秒的 SYN 重传
+    request_queue_size = 64
+
+
+def make_server(service, host=None, port=None):
+    """创建 HTTP 服务 (port=0 时随机端口)，调用方负责 serve_forever"""
+    return DeckHTTPServer((host or config.API_HOST, config.API_PORT if port is None else port),
+                          make_handler(service))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="报告生成 HTTP 服务")
+    parser.add_argument("--host", default=config.API_HOST)
+    parser.add_argument("--port", type=int, default=config.API_PORT)
+    parser.add_argument("--workers", type=int, default=config.API_WORKERS)
+    args = parser.parse_args()
+
+    import render_worker
+    service = DeckService(workers=args.workers).start()
+    render_worker.warm_up()
+    httpd = make_server(service, args.host, args.port)
+    logging.info(f"[API] 监听 http://{args.host}:{httpd.server_address[1]}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.stop(timeout=5)
+        render_worker.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,247 @@
+import os
+import re
+import json
+import logging
+
+from embedded_images import decode_embedded
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+文章多图表提取
+
+以前每篇文章只取第一个 <img> 和第一个 "图表N：" 标题，其余图表丢失，要在生成后手工补。
+这里按文档顺序找出文章中的每一张图表，并为每张图表配对各自的标题和资料来源：
+
+    <p>图表1：美债收益率走势</p>  <img ...>  <p>资料来源：彭博</p>
+    <p>图表2：美元指数</p>        <v:shape o:gfxdata="..."/>  <![if !vml]><img ...><![endif]>  <p>资料来源：路透</p>
+
+- 图片：o:gfxdata / data: URI 在本地解码，远程 <img> 只记录地址 (由下载阶段并发下载)
+- Word 导出的 VML 图形后面常跟着 <![if !vml]> 中的同一张图，作为该图表的远程备选，不算新图表
+- 标题/来源在图片前还是后由文章本身决定：第一个标题出现在第一张图之前，就按 "标题在上" 配对，否则按 "标题在下"
+- 图片目录中的清单 (config.IMAGE_MANIFEST_NAME) 按文章记录图表顺序，PPTGenerator 据此取得有序的图表集合
+"""
+
+CHART_TITLE_RE = re.compile(r'图表\s*[0-9一二三四五六七八九十]+\s*[：:]\s*([^<>\n]+)')
+SOURCE_PARA_RE = re.compile(r'<p[^>]*>((?:(?!</p\s*>).)*?资料来源(?:(?!</p\s*>).)*)</p\s*>', re.IGNORECASE | re.DOTALL)
+GFXDATA_RE = re.compile(r'''o:gfxdata\s*=\s*(["'])(?P<value>.*?)\1''', re.IGNORECASE | re.DOTALL)
+IMG_RE = re.compile(r'''<img\b[^>]*?\bsrc\s*=\s*(["'])(?P<src>.*?)\1[^>]*>''', re.IGNORECASE | re.DOTALL)
+# Word 导出 HTML 中给不支持 VML 的浏览器准备的备选内容
+VML_FALLBACK_RE = re.compile(r'<!(?:--)?\[if !vml\](?:--)?>', re.IGNORECASE)
+
+MANIFEST_VERSION = 1
+
+
+# ================= 1. 文本清洗 =================
+
+def remove_unpaired_brackets(text):
+    """去掉未配对的括号 (中英文)"""
+    stack = []
+    indices_to_remove = set()
+    for i, char in enumerate(text):
+        if char in "(（":
+            stack.append(i)
+        elif char in ")）":
+            if stack:
+                stack.pop()
+            else:
+                indices_to_remove.add(i)
+    indices_to_remove.update(stack)
+    return ''.join(char for i, char in enumerate(text) if i not in indices_to_remove)
+
+
+def clean_chart_title(raw):
+    """图表标题：去掉残留的 HTML 和未配对括号"""
+    title = re.sub(r'<[^>]+>', '', raw).strip()
+    return remove_unpaired_brackets(title).strip()
+
+
+def clean_data_source(paragraph_text):
+    """
+    从包含 "资料来源" 的段落文字中取出来源名
+    :return: 来源 (如 "彭博")，切分结果不像来源 (过长) 时返回 None
+    """
+    parts = paragraph_text.split('资料来源')
+    if len(parts) < 2:
+        return None
+    # 取最后一部分，清理冒号 (中文和英文) 和前后空白，只取第一行
+    source = parts[-1].replace('：', '').replace(':', '').strip()
+    if '\n' in source:
+        source = source.split('\n')[0].strip()
+    # 真正的资料来源通常很短 (例如 "Bloomberg")
+    if source and len(source) < 50:
+        return source
+    return None
+
+
+def _strip_tags(fragment):
+    return re.sub(r'<[^>]+>', '', fragment).replace('&nbsp;', ' ')
+
+
+# ================= 2. 提取 =================
+
+def _scan(html_content):
+    """按文档位置排序的事件：('image', 位置, {kind, value}) / ('title', 位置, 文字) / ('source', 位置, 文字)"""
+    events = []
+    for m in GFXDATA_RE.finditer(html_content):
+        events.append(("image", m.start(), {"kind": "gfxdata", "value": m.group("value")}))
+    for m in IMG_RE.finditer(html_content):
+        src = m.group("src").strip()
+        if not src:
+            continue
+        kind = "data-uri" if src.lower().startswith("data:") else "url"
+        events.append(("image", m.start(), {"kind": kind, "value": src}))
+    for m in CHART_TITLE_RE.finditer(html_content):
+        title = clean_chart_title(m.group(1))
+        if title:
+            events.append(("title", m.start(), title))
+    for m in SOURCE_PARA_RE.finditer(html_content):
+        source = clean_data_source(_strip_tags(m.group(1)))
+        if source:
+            events.append(("source", m.start(), source))
+    events.sort(key=lambda e: e[1])
+    return events
+
+
+def _group_slots(html_content, events):
+    """
+    把图片事件归并成图表槽位，并记录每个槽位前后的标题/来源
+    :return: [{"payloads": [...], "before": [事件], "after": [事件]}]
+    """
+    fallback_marks = [m.start() for m in VML_FALLBACK_RE.finditer(html_content)]
+    slots = []
+    gap = []          # 上一个槽位之后累积的标题/来源
+    last_image_pos = -1
+    for kind, pos, value in events:
+        if kind != "image":
+            gap.append((kind, value))
+            continue
+        # 紧跟在 VML 图形之后 <![if !vml]> 中的图片：同一张图表的备选
+        is_fallback = (
+            slots and value["kind"] == "url" and not gap
+            and any(last_image_pos < mark < pos for mark in fallback_marks)
+        )
+        if is_fallback:
+            slots[-1]["payloads"].append(value)
+        else:
+            if slots:
+                slots[-1]["after"] = gap
+            slots.append({"payloads": [value], "before": gap, "after": []})
+            gap = []
+        last_image_pos = pos
+    if slots:
+        slots[-1]["after"] = gap
+    return slots
+
+
+def _pick(events, kind, last=False):
+    values = [value for k, value in events if k == kind]
+    if not values:
+        return None
+    return values[-1] if last else values[0]
+
+
+def _caption_convention(events, kind):
+    """某类说明文字 (标题/来源) 在图片之前还是之后：看第一个出现在第一张图之前还是之后"""
+    for k, _, _ in events:
+        if k == "image":
+            return "after"
+        if k == kind:
+            return "before"
+    return "after"
+
+
+def extract_charts(html_content, max_charts=None):
+    """
+    按文档顺序提取文章中的所有图表
+    :param max_charts: 最多提取的图表数，默认 config.MAX_CHARTS_PER_ARTICLE
+    :return: [{"index", "title", "source", "embedded": (字节, 扩展名, 类型) 或 None, "img_url": 远程地址或 None}]
+             每张图表至少有 embedded 或 img_url 之一；内嵌图片优先，远程地址作为备选
+    """
+    if not html_content:
+        return []
+    if max_charts is None:
+        import config
+        max_charts = config.MAX_CHARTS_PER_ARTICLE
+
+    events = _scan(html_content)
+    slots = _group_slots(html_content, events)
+    title_side = _caption_convention(events, "title")
+    source_side = _caption_convention(events, "source")
+    # 图表旁没有资料来源时使用文章中的第一个 (与原来每篇文章取第一个来源一致)
+    article_source = _pick([(k, v) for k, _, v in events], "source")
+
+    charts = []
+    for slot in slots:
+        embedded, img_url = None, None
+        for payload in slot["payloads"]:
+            if payload["kind"] == "url":
+                img_url = img_url or payload["value"]
+            elif embedded is None:
+                decoded = decode_embedded(payload["kind"], payload["value"])
+                if decoded:
+                    embedded = (decoded[0], decoded[1], payload["kind"])
+        if embedded is None and img_url is None:
+            continue    # 纯矢量图表 / SVG 等无法使用的内容
+
+        # 只在约定的一侧找：另一侧的说明文字属于相邻的图表
+        if title_side == "before":
+            title = _pick(slot["before"], "title", last=True)
+        else:
+            title = _pick(slot["after"], "title")
+        if source_side == "after":
+            source = _pick(slot["after"], "source")
+        else:
+            source = _pick(slot["before"], "source", last=True)
+
+        charts.append({
+            "index": len(charts) + 1,
+            "title": title,
+            "source": source or article_source,
+            "embedded": embedded,
+            "img_url": img_url if embedded is None else None,
+        })
+        if len(charts) >= max_charts:
+            break
+    return charts
+
+
+# ================= 3. 图片清单 =================
+
+def write_manifest(images_dir, entries):
+    """
+    写入图片清单 (原子替换)
+    :param entries: [{"group", "article_file", "index", "file", "title", "source", "origin"}]，file 为图片目录中的文件名
+    """
+    import config
+    from workspace import atomic_write_json
+    entries = sorted(entries, key=lambda e: (e["article_file"], e["index"]))
+    atomic_write_json(os.path.join(images_dir, config.IMAGE_MANIFEST_NAME),
+                      {"version": MANIFEST_VERSION, "charts": entries}, indent=2)
+
+
+def load_manifest(images_dir):
+    """
+    读取图片清单，只保留文件仍然存在的图表
+    :return: [entry]，没有清单 (旧的运行目录/运行包) 时返回 None
+    """
+    import config
+    path = os.path.join(images_dir, config.IMAGE_MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        logging.warning(f"图片清单读取失败，改为按文件名匹配: {e}")
+        return None
+    return [e for e in data.get("charts", []) if os.path.exists(os.path.join(images_dir, e.get("file", "")))]
+
+
+def group_charts(entries):
+    """清单按文章分组：[(group, [entry, ...])]，组内按图表顺序"""
+    groups = {}
+    for entry in entries:
+        groups.setdefault(entry["article_file"], []).append(entry)
+    return [(items[0]["group"], sorted(items, key=lambda e: e["index"])) for items in groups.values()]
@@ -0,0 +1,176 @@
+import heapq
+import logging
+from datetime import datetime
+
+"""
+文章选择引擎
+
+原来的流程对每篇文章用 strptime 解析 publishTime (filter_latest_articles)，
+再按分类建列表并整体排序取第一篇 (process_article_by_category)。
+这里一次遍历完成：每篇文章只解析一次时间，每个分类只保留当前最新的 N 篇 (N=1 时就是滚动最大值)，
+同时记录整体最新发布时间。
+
+支持的选择策略 (SelectionPolicy)：
+- latest_n      每个分类保留最新的 N 篇
+- start / end   发布日期窗口 (包含两端)
+- pins          {分类: 文章id}，强制选中指定文章
+- categories    只保留这些分类
+"""
+
+PUBLISH_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+UNCATEGORIZED = "未分类"
+
+
+def parse_publish_time(value):
+    """解析 publishTime ("2026-01-16T08:30:00Z")，无法解析返回 None"""
+    if not value:
+        return None
+    try:
+        # fromisoformat 比 strptime 快一个数量级 (Python 3.11+ 支持结尾的 Z)
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except (ValueError, TypeError, AttributeError):
+        try:
+            return datetime.strptime(value, PUBLISH_TIME_FORMAT)
+        except (ValueError, TypeError):
+            return None
+
+
+def get_publish_time_str(article):
+    return article.get("metadata", {}).get("audit", {}).get("publishTime", "")
+
+
+def get_article_category(article):
+    """优先取带 'cio_category_' 的标签，否则取第一个 cio 标签"""
+    cio_tags = article.get("metadata", {}).get("classifications", {}).get("tagNames", {}).get("cio", [])
+    if not cio_tags:
+        return UNCATEGORIZED
+    for tag in cio_tags:
+        if "cio_category_" in tag:
+            return tag.replace("cio_category_", "")
+    return cio_tags[0]
+
+
+def get_article_id(article):
+    return str(article.get("id") or article.get("uuid") or "")
+
+
+class SelectionPolicy:
+    def __init__(self, latest_n=1, start=None, end=None, pins=None, categories=None):
+        self.latest_n = max(1, latest_n)
+        self.start = start.date() if isinstance(start, datetime) else start
+        self.end = end.date() if isinstance(end, datetime) else end
+        self.pins = dict(pins or {})
+        self.categories = set(categories) if categories else None
+
+    def in_window(self, dt):
+        if self.start is None and self.end is None:
+            return True
+        if dt is None:
+            return False
+        d = dt.date()
+        if self.start is not None and d < self.start:
+            return False
+        if self.end is not None and d > self.end:
+            return False
+        return True
+
+
+class ArticleSelector:
+    """
+    单次遍历选择器：add() 每篇文章 O(log N)，N 为每个分类保留的篇数
+    """
+    def __init__(self, policy=None):
+        self.policy = policy or SelectionPolicy()
+        self.latest_time = None      # 所有文章中最新的发布时间
+        self._heaps = {}             # 分类 -> 小顶堆 [(排序键, 文章条目)]
+        self._pinned = {}            # 分类 -> 被钉住的文章条目
+        self._order = []             # 分类首次出现的顺序
+        self.count = 0
+
+    def add(self, article, index=None, publish_time=None, category=None):
+        """
+        :param publish_time: 已解析的 datetime，调用方已解析时可直接传入
+        :param category: 已知的分类，调用方已计算时可直接传入
+        :return: 文章当前是否被选中 (之后仍可能被更新的文章挤掉)
+        """
+        index = self.count if index is None else index
+        self.count += 1
+
+        publish_str = get_publish_time_str(article)
+        dt = publish_time if publish_time is not None else parse_publish_time(publish_str)
+        if dt is not None and (self.latest_time is None or dt > self.latest_time):
+            self.latest_time = dt
+
+        policy = self.policy
+        category = category or get_article_category(article)
+        if policy.categories is not None and category not in policy.categories:
+            return False
+        if not policy.in_window(dt):
+            return False
+
+        if category not in self._heaps:
+            self._heaps[category] = []
+            self._order.append(category)
+
+        item = {
+            "article": article,
+            "category": category,
+            "publish_time": publish_str,
+            "original_index": index,
+        }
+
+        pin = policy.pins.get(category)
+        pinned = bool(pin) and get_article_id(article) == pin
+        if pinned:
+            self._pinned[category] = item
+
+        # 排序键：发布时间越新越大；时间相同时先出现的文章优先 (与原来的稳定排序一致)
+        # 无法解析时间的文章排在最后
+        key = (dt is not None, dt or datetime.min, -index)
+        heap = self._heaps[category]
+        if len(heap) < policy.latest_n:
+            heapq.heappush(heap, (key, index, item))
+            return True
+        if key > heap[0][0]:
+            heapq.heapreplace(heap, (key, index, item))
+            return True
+        return pinned
+
+    def add_all(self, articles):
+        for idx, article in enumerate(articles):
+            self.add(article, idx)
+        return self
+
+    def selected(self):
+        """按分类首次出现的顺序返回选中的文章，每个分类内最新的在前"""
+        result = []
+        for category in self._order:
+            pinned = self._pinned.get(category)
+            if pinned:
+                result.append(pinned)
+                continue
+            if self.policy.pins.get(category):
+                logging.warning(f"分类 '{category}' 指定的文章 {self.policy.pins[category]} 不存在，改用最新文章")
+            ranked = sorted(self._heaps[category], key=lambda x: x[0], reverse=True)
+            result.extend(item for _, _, item in ranked)
+        return result
+
+    @property
+    def latest_date(self):
+        return self.latest_time.date() if self.latest_time else None
+
+
+def select_articles(articles, policy=None):
+    """
+    一次遍历选出每个分类的文章
+    :return: (选中的条目列表, 整体最新发布时间)
+    """
+    selector = ArticleSelector(policy).add_all(articles)
+    return selector.selected(), selector.latest_time
+
+
+def latest_day_policy(latest_time, **kwargs):
+    """只保留最新发布日期当天文章的策略 (对应原来的 filter_latest_articles)"""
+    day = latest_time.date() if isinstance(latest_time, datetime) else latest_time
+    return SelectionPolicy(start=day, end=day, **kwargs)
+
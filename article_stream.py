@@ -0,0 +1,221 @@
+import re
+import io
+import json
+import logging
+
+from article_selection import ArticleSelector
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+频道导出 (articles.json) 的流式读取
+
+json.load 会把整个频道历史 (包括 HTML 正文和内嵌的 base64 图表) 一次性变成 Python 对象。
+这里逐块读取文件，用一个只识别字符串和括号的简易扫描器切出 "articles" 数组中的每个元素：
+- 每篇文章先在不解析 contents 的情况下读出元数据 (发布时间、分类)
+- 只有被 ArticleSelector 选中的文章才解析 contents
+峰值内存因此取决于选中的文章和单篇文章的大小，而不是整个导出文件。
+"""
+
+# 结构字符：字符串开头和括号
+_STRUCT_RE = re.compile(r'["{}\[\]]')
+_WS_RE = re.compile(r'\s*')
+_SCALAR_RE = re.compile(r'[^,\]}\s]*')
+
+
+def _string_end(buf, pos):
+    """
+    pos 指向开引号，返回闭引号之后的位置；字符串在缓冲区内未结束时返回 -1
+    用 str.find 跳到下一个引号 (长 base64 / HTML 字符串比正则快得多)，再数前面的反斜杠判断是否转义
+    """
+    i = pos + 1
+    while True:
+        j = buf.find('"', i)
+        if j < 0:
+            return -1
+        k = j - 1
+        while buf[k] == "\\":
+            k -= 1
+        if (j - 1 - k) % 2 == 0:
+            return j + 1
+        i = j + 1
+
+
+class _ArrayStreamer:
+    """从文本流中逐个切出顶层 "articles" 数组 (或顶层数组) 的元素"""
+
+    def __init__(self, f, array_key="articles", chunk_size=1 << 20):
+        self.f = f
+        self.array_key = array_key
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=None):
+        """在缓冲区末尾追加下一块 (位置保持有效)；已消费的部分在元素边界由 _trim 丢弃"""
+        if self.eof:
+            raise ValueError("JSON 数据不完整")
+        chunk = self.f.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.buf += chunk
+
+    def _trim(self):
+        """已消费的部分超过一块时才丢弃 (每个元素都截断会反复复制整个缓冲区)"""
+        if self.pos > self.chunk_size:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+
+    def _peek(self):
+        """跳过空白，返回下一个字符 (文件结束返回空串)"""
+        while True:
+            self.pos = _WS_RE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ""
+            self._fill()
+
+    def _read_string(self):
+        """self.pos 指向引号，返回字符串原文并移动到其后"""
+        size = self.chunk_size
+        while True:
+            end = _string_end(self.buf, self.pos)
+            if end >= 0:
+                start, self.pos = self.pos, end
+                return self.buf[start:end]
+            # 未闭合的长字符串 (如 base64 图片) 每次都要从头重新匹配，读取量翻倍避免二次方开销
+            self._fill(size)
+            size *= 2
+
+    def _skip_value(self):
+        """跳过一个完整的 JSON 值，返回其在缓冲区中的 (起始, 结束)"""
+        ch = self._peek()
+        start = self.pos
+        if ch == '"':
+            self._read_string()
+            return start, self.pos
+        if ch not in "{[":
+            # 数字 / true / false / null：读到下一个分隔符
+            while True:
+                end = _SCALAR_RE.match(self.buf, self.pos).end()
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return start, end
+                self._fill()
+
+        depth = 0
+        while True:
+            m = _STRUCT_RE.search(self.buf, self.pos)
+            if not m:
+                self.pos = len(self.buf)
+                self._fill()
+                continue
+            if m.group(0) == '"':
+                self.pos = m.start()
+                self._read_string()
+                continue
+            self.pos = m.end()
+            if m.group(0) in "{[":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return start, self.pos
+
+    def _enter_array(self):
+        """定位到目标数组的第一个元素之前"""
+        ch = self._peek()
+        if ch == "[":
+            self.pos += 1
+            return True
+        if ch != "{":
+            raise ValueError("JSON 顶层既不是对象也不是数组")
+        self.pos += 1
+        while True:
+            ch = self._peek()
+            if ch == "}" or ch == "":
+                return False
+            if ch == ",":
+                self.pos += 1
+                continue
+            key = json.loads(self._read_string())
+            if self._peek() != ":":
+                raise ValueError("JSON 格式错误：缺少冒号")
+            self.pos += 1
+            if key == self.array_key and self._peek() == "[":
+                self.pos += 1
+                return True
+            self._skip_value()
+            self._trim()
+
+    def __iter__(self):
+        if not self._enter_array():
+            return
+        while True:
+            ch = self._peek()
+            if ch == "]" or ch == "":
+                return
+            if ch == ",":
+                self.pos += 1
+                continue
+            start, end = self._skip_value()
+            text = self.buf[start:end]
+            # 元素已切出，释放缓冲区中已消费的部分
+            self._trim()
+            yield text
+
+
+def iter_article_texts(file_path, chunk_size=1 << 20):
+    """逐个返回 "articles" 数组中每篇文章的 JSON 原文"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        yield from _ArrayStreamer(f, chunk_size=chunk_size)
+
+
+def _member_span(obj_text, name):
+    """返回对象原文中顶层成员 name 的值在原文中的 (起始, 结束)，不存在返回 None"""
+    streamer = _ArrayStreamer(io.StringIO(obj_text), chunk_size=len(obj_text) + 1)
+    if streamer._peek() != "{":
+        return None
+    streamer.pos += 1
+    while True:
+        ch = streamer._peek()
+        if ch == "}" or ch == "":
+            return None
+        if ch == ",":
+            streamer.pos += 1
+            continue
+        key = json.loads(streamer._read_string())
+        if streamer._peek() != ":":
+            raise ValueError("JSON 格式错误：缺少冒号")
+        streamer.pos += 1
+        start, end = streamer._skip_value()
+        if key == name:
+            return start, end
+
+
+def load_selected_articles(file_path, policy=None, chunk_size=1 << 20):
+    """
+    流式读取并选择文章：未被选中的文章不会解析 contents
+    :return: ArticleSelector (selected() 中的文章带有完整 contents)
+    """
+    selector = ArticleSelector(policy)
+    total = 0
+    for idx, text in enumerate(iter_article_texts(file_path, chunk_size)):
+        total += 1
+        span = _member_span(text, "contents")
+        if span is None:
+            selector.add(json.loads(text), idx)
+            continue
+
+        start, end = span
+        light = json.loads(text[:start] + "null" + text[end:])
+        if selector.add(light, idx):
+            light["contents"] = json.loads(text[start:end])
+        else:
+            light.pop("contents", None)
+
+    logging.info(f"流式读取完成：共 {total} 篇文章，选中 {len(selector.selected())} 篇")
+    return selector
@@ -0,0 +1,166 @@
+"""
+HTTP 服务压测：本地模拟 News Platform 和 AI 任务服务 (fake_job_server)，
+多个客户端同时通过 api_server 请求全部 地点 × 语言 × 增量 组合，统计吞吐量、端到端耗时和 429 次数
+
+- 生成轮：每个客户端 force 提交一个组合，遇到 429 按 Retry-After 重试，轮询到完成后下载 PPT
+- 缓存轮：同样的请求不带 force，直接命中缓存
+
+用法：
+    python benchmarks/bench_api_load.py [生成轮数，默认 2] [队列上限，默认 4] [LLM 耗时秒数，默认 1.0]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+import statistics
+import threading
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # TEMPLATE_MAP 中是相对路径
+
+from fake_job_server import FakeJobServer
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def call(method, url, body=None):
+    """:return: (状态码, 响应头, 响应体字节)"""
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def request_deck(base_url, body, stats):
+    """提交 → (429 时等待重试) → 轮询 → 下载，返回端到端秒数"""
+    start = time.perf_counter()
+    while True:
+        code, headers, data = call("POST", f"{base_url}/api/decks", body)
+        if code != 429:
+            break
+        with stats["lock"]:
+            stats["rejected"] += 1
+        time.sleep(float(headers.get("Retry-After", 1)))
+    job = json.loads(data)
+    if code not in (200, 202):
+        raise RuntimeError(f"提交失败 {code}: {job}")
+    while job["status"] not in ("done", "failed"):
+        time.sleep(0.1)
+        job = json.loads(call("GET", f"{base_url}/api/jobs/{job['id']}")[2])
+    if job["status"] == "failed":
+        raise RuntimeError(f"任务失败: {job['error']}")
+    code, _, deck = call("GET", f"{base_url}/api/jobs/{job['id']}/deck")
+    if code != 200 or not deck.startswith(b"PK"):
+        raise RuntimeError(f"下载失败 {code}")
+    with stats["lock"]:
+        stats["waits"].append(job["waits"])
+    return time.perf_counter() - start
+
+
+def run_round(base_url, bodies):
+    stats = {"lock": threading.Lock(), "rejected": 0, "waits": []}
+    timings, errors = [], []
+
+    def client(body):
+        try:
+            timings.append(request_deck(base_url, body, stats))
+        except Exception as e:
+            errors.append(str(e))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(body,)) for body in bodies]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, timings, errors, stats
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    queue_size = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    llm_latency = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+
+    server = FakeJobServer(default={"latency": llm_latency}, seed=5).start()
+    # 导入配置前指向模拟服务
+    os.environ.update({
+        "AI_API_BASE_URL": server.url,
+        "AI_AUTH_URL": server.url + "/token",
+        "NEWS_AUTH_URL": server.url + "/news/token",
+        "NEWS_ARTICLE_URL": server.url + "/news/articles",
+        "CLIENT_ID": "bench", "CLIENT_SECRET": "bench", "NEWS_CLIENT_SECRET": "bench",
+    })
+    logging.disable(logging.WARNING)
+
+    import config
+    import render_worker
+    import api_server
+
+    # 所有输出写到临时目录
+    base = tempfile.mkdtemp(prefix="bench_api_")
+    config.RUNS_DIR = os.path.join(base, "runs")
+    config.BUNDLE_DIR = os.path.join(base, "bundles")
+    config.ARCHIVE_DIR = os.path.join(base, "archive")
+    config.ARCHIVE_DB = os.path.join(config.ARCHIVE_DIR, "reports.db")
+    config.ARCHIVE_DECK_DIR = os.path.join(config.ARCHIVE_DIR, "decks")
+    config.LLM_JOURNAL_DIR = os.path.join(base, "llm_jobs")
+    config.LLM_STATS_PATH = os.path.join(base, "llm_model_stats.json")
+    config.LLM_POLL_INTERVAL = 0.1
+    config.LLM_POLL_MAX_RETRIES = 600
+    config.API_RETRY_AFTER = 1
+    for d in (config.RUNS_DIR, config.BUNDLE_DIR):
+        os.makedirs(d, exist_ok=True)
+
+    render_worker.warm_up(wait=True)
+    service = api_server.DeckService(queue_size=queue_size).start()
+    httpd = api_server.make_server(service, port=0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+
+    combos = [
+        {"location": location, "language": language, "incremental": incremental}
+        for location in config.TEMPLATE_MAP
+        for language in config.LANGUAGE_MAP.values()
+        for incremental in (False, True)
+    ]
+    print("\n" + "=" * 64)
+    print(f"{len(combos)} 个组合，任务线程 {service.workers}，队列上限 {queue_size}，"
+          f"LLM 并发 {service.llm_limit}，渲染并发 {service.render_limit}，LLM 耗时 {llm_latency}s")
+    failed = False
+    for i in range(rounds + 1):
+        cached = i == rounds
+        bodies = [dict(body, force=not cached) for body in combos]
+        wall, timings, errors, stats = run_round(base_url, bodies)
+        failed |= bool(errors)
+        label = "缓存轮" if cached else f"生成轮 {i + 1}"
+        print(f"{label:<8} 总耗时 {wall:6.2f}s  吞吐 {len(timings) / wall * 60:7.1f} 份/分钟  "
+              f"p50 {statistics.median(timings) if timings else 0:6.2f}s  "
+              f"p95 {percentile(timings, 95) if timings else 0:6.2f}s  429: {stats['rejected']}  失败: {len(errors)}")
+        llm_waits = [w["llm"] for w in stats["waits"] if "llm" in w]
+        if llm_waits and not cached:
+            print(f"{'':<8} 等待 LLM 名额 平均 {statistics.mean(llm_waits):.2f}s，最长 {max(llm_waits):.2f}s")
+        for error in errors[:3]:
+            print(f"{'':<8} {error}")
+
+    print(f"服务计数: {service.health()['counts']}")
+    print(f"模拟服务: 文章请求 {server.article_requests} 次，LLM 任务 {sum(server.submitted.values())} 个")
+    httpd.shutdown()
+    service.stop(timeout=5)
+    render_worker.shutdown()
+    server.stop()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
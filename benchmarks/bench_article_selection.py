@@ -0,0 +1,105 @@
+"""
+文章选择基准：旧流程 (strptime 过滤 + 按分类建列表排序) vs ArticleSelector 单次遍历
+
+用法：
+    python benchmarks/bench_article_selection.py [文章数，逗号分隔]
+    python benchmarks/bench_article_selection.py 10000,50000,200000
+"""
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from article_selection import ArticleSelector, SelectionPolicy
+
+CATEGORIES = ["中港股市", "美股", "欧股", "日股", "债市", "黄金", "原油", "个股精选", "个债精选", "个股投资观点更新"]
+
+
+def make_dump(n, rng):
+    """模拟频道导出：n 篇文章，约两年的发布时间，少量缺失时间或分类"""
+    base = datetime(2024, 1, 1)
+    articles = []
+    for i in range(n):
+        tags = [f"cio_category_{rng.choice(CATEGORIES)}"] if rng.random() > 0.01 else []
+        publish = (base + timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60))).strftime("%Y-%m-%dT%H:%M:%SZ")
+        if rng.random() < 0.005:
+            publish = ""
+        articles.append({
+            "id": f"a{i}",
+            "metadata": {
+                "classifications": {"tagNames": {"cio": tags}},
+                "audit": {"publishTime": publish},
+            },
+        })
+    return articles
+
+
+def legacy_select(articles):
+    """原 filter_latest_articles + process_article_by_category 的选择部分"""
+    valid_articles = []
+    for article in articles:
+        publish_time = article.get("metadata", {}).get("audit", {}).get("publishTime", "")
+        if publish_time:
+            try:
+                dt = datetime.strptime(publish_time, "%Y-%m-%dT%H:%M:%SZ")
+                valid_articles.append((dt, article))
+            except (ValueError, TypeError):
+                pass
+    latest_dt = max(dt for dt, _ in valid_articles) if valid_articles else None
+
+    categories_dict = {}
+    for idx, article in enumerate(articles):
+        cio_tags = article.get("metadata", {}).get("classifications", {}).get("tagNames", {}).get("cio", [])
+        if cio_tags:
+            categories = [tag.replace("cio_category_", "") for tag in cio_tags if "cio_category_" in tag]
+            if not categories:
+                categories = cio_tags
+            category_name = categories[0] if categories else "未分类"
+        else:
+            category_name = "未分类"
+        publish_time = article.get("metadata", {}).get("audit", {}).get("publishTime", "")
+        categories_dict.setdefault(category_name, []).append({
+            "article": article, "publish_time": publish_time, "original_index": idx
+        })
+
+    selected = []
+    for category_name, articles_list in categories_dict.items():
+        articles_list.sort(key=lambda x: x["publish_time"] if x["publish_time"] else "", reverse=True)
+        selected.append((category_name, articles_list[0]["original_index"]))
+    return selected, latest_dt
+
+
+def engine_select(articles, policy=None):
+    selector = ArticleSelector(policy).add_all(articles)
+    return [(item["category"], item["original_index"]) for item in selector.selected()], selector.latest_time
+
+
+def timed(fn, *args, repeat=3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1].split(",")] if len(sys.argv) > 1 else [10000, 50000, 200000]
+    rng = random.Random(7)
+
+    print(f"{'文章数':>8} {'旧流程(ms)':>12} {'引擎(ms)':>10} {'加速比':>8} {'最新N=3(ms)':>12} {'结果一致':>8}")
+    for n in sizes:
+        dump = make_dump(n, rng)
+        t_legacy, legacy = timed(legacy_select, dump)
+        t_engine, engine = timed(engine_select, dump)
+        t_top3, _ = timed(engine_select, dump, SelectionPolicy(latest_n=3))
+        same = legacy == engine
+        print(f"{n:>8} {t_legacy * 1000:>12.1f} {t_engine * 1000:>10.1f} {t_legacy / t_engine:>8.2f} {t_top3 * 1000:>12.1f} {str(same):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+自动字号基准：一份完整 PPT (7 个正文占位符 + 摘要表格 14 个单元格) 的字号计算耗时
+
+三种情况：
+- 冷启动：字形宽度缓存为空 (进程内第一次生成)
+- 新内容：字形宽度已缓存，文字是新的 (常驻进程中生成下一份报告)
+- 重复：同一份内容再算一次 (全部命中缓存)
+
+用法：
+    python benchmarks/bench_autofit.py [预算毫秒数，默认 5] [重复次数，默认 50]
+"新内容" 的中位数超过预算时以非 0 退出
+"""
+import os
+import sys
+import time
+import random
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import text_metrics
+
+ASSETS = ["中港股市", "美股", "欧股", "日股", "债市", "黄金", "原油"]
+PHRASES = [
+    "美联储降息预期升温，风险资产情绪修复。",
+    "标普500市盈率已上升至20倍以上，高于历史均值19.2倍。",
+    "关税对通胀的影响仍待观察，企业盈利增长放缓。",
+    "We expect valuations to stay range-bound in the near term. ",
+    "10年期美债收益率维持在4.2%附近，利差收窄。",
+]
+
+# 与模板一致的文本区域 (磅，已扣除内边距)；摘要表格：表头 + 7 行 (模板行高 46 磅)，可用高度到页面底部
+BODY_BOX = (651.3, 136.8)
+CELL_WIDTHS = {1: 95.6, 2: 442.4}
+CELL_MARGINS = 7.2
+ROW_HEIGHT = 46.0
+TABLE_BUDGET = 540 - 100.9 - config.AUTOFIT_CONFIG["summary_cell"]["bottom_margin"]
+
+
+def make_jobs(rng):
+    body_cfg = config.AUTOFIT_CONFIG["content_body"]
+    jobs = []
+    for _ in ASSETS:
+        bullets = tuple("小标题：" + "".join(rng.choice(PHRASES) for _ in range(rng.randint(2, 9))) for _ in range(3))
+        jobs.append((bullets, body_cfg["font_name"], *BODY_BOX, body_cfg["cn"], body_cfg["min"], False))
+    rows = [(ROW_HEIGHT, [])]
+    for asset in ASSETS:
+        logic = "".join(rng.choice(PHRASES) for _ in range(rng.randint(1, 5)))
+        rows.append((ROW_HEIGHT, [((asset,), CELL_WIDTHS[1], CELL_MARGINS, True),
+                                  ((logic,), CELL_WIDTHS[2], CELL_MARGINS, False)]))
+    return jobs, rows
+
+
+def fit_all(jobs, rows):
+    """正文逐个计算，摘要表格整体计算 (与 PPTGenerator 一致)"""
+    cell_cfg = config.AUTOFIT_CONFIG["summary_cell"]
+    table_size = text_metrics.fit_table_font_size(rows, cell_cfg["font_name"], TABLE_BUDGET,
+                                                  cell_cfg["cn"], cell_cfg["min"])
+    return text_metrics.fit_many(jobs) + [table_size]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def clear_text_caches():
+    """清空与文字相关的缓存，保留字体和单字宽度缓存"""
+    text_metrics.fit_font_size.cache_clear()
+    text_metrics._paragraph_layout.cache_clear()
+
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rng = random.Random(7)
+
+    jobs, rows = make_jobs(rng)
+    cold_ms, sizes = timed(lambda: fit_all(jobs, rows))
+    repeat_ms = statistics.median(timed(lambda: fit_all(jobs, rows))[0] for _ in range(repeats))
+
+    fresh = []
+    for _ in range(repeats):
+        jobs, rows = make_jobs(rng)
+        clear_text_caches()
+        fresh.append(timed(lambda: fit_all(jobs, rows))[0])
+    fresh_ms = statistics.median(fresh)
+
+    font_found = text_metrics.find_font_file(config.AUTOFIT_CONFIG["content_body"]["font_name"]) is not None
+    print("\n" + "=" * 40)
+    print(f"文本区域: {len(jobs)} 个正文 + 摘要表格 {len(rows) - 1} 行，字体文件: {'已找到' if font_found else '未找到 (使用估算宽度)'}")
+    print(f"字号示例: 正文 {sizes[:7]}，摘要表格 {sizes[-1]}")
+    print(f"{'冷启动':<8} {cold_ms:>8.2f} ms")
+    print(f"{'新内容':<8} {fresh_ms:>8.2f} ms (中位数, p90 {sorted(fresh)[int(len(fresh) * 0.9)]:.2f} ms)")
+    print(f"{'重复':<8} {repeat_ms:>8.3f} ms (中位数)")
+    print(f"预算: {budget_ms:.1f} ms -> {'通过' if fresh_ms <= budget_ms else '超出'}")
+    return 0 if fresh_ms <= budget_ms else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+批量清洗基准：比较不同进程数下 batch_process 的吞吐 (文件/秒)
+
+用法：
+    python benchmarks/bench_batch_clean.py [文件数] [进程数列表，逗号分隔]
+    python benchmarks/bench_batch_clean.py 400 1,2,4,8
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from construct_json import batch_process
+
+
+def make_article(i, rng):
+    """生成一篇接近真实 CIO 文章的 HTML：正文段落、VML 图表乱码、图片和资料来源"""
+    paragraphs = []
+    for _ in range(rng.randint(20, 40)):
+        paragraphs.append(f"<p style='text-indent:2em'>第{i}篇 市场观察：" + "美联储降息预期升温，风险资产情绪修复。" * rng.randint(3, 8) + "</p>")
+    b64 = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/") for _ in range(20000))
+    paragraphs.insert(5, f'<v:rect id="chart{i}" o:gfxdata="{b64}"></v:rect>')
+    paragraphs.insert(6, f'<p><img src="https://example.com/chart_{i}.png" width="600"></p>')
+    paragraphs.insert(7, "<p>图表1：美债收益率走势</p><p>资料来源：彭博</p>")
+    html = "\n".join(paragraphs)
+    return {
+        "id": f"bench-{i}",
+        "titles": {"zh_CN": f"基准文章 {i}"},
+        "summaries": {"zh_CN": "摘要"},
+        "contents": {"zh_CN": html},
+    }
+
+
+def main():
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    worker_counts = [int(w) for w in sys.argv[2].split(",")] if len(sys.argv) > 2 else [1, 2, 4, os.cpu_count() or 1]
+
+    root = tempfile.mkdtemp(prefix="bench_clean_")
+    try:
+        src = os.path.join(root, "src")
+        os.makedirs(src)
+        rng = random.Random(42)
+        for i in range(n_files):
+            with open(os.path.join(src, f"article_{i:05d}.json"), "w", encoding="utf-8") as f:
+                json.dump(make_article(i, rng), f, ensure_ascii=False)
+
+        rows = []
+        for workers in sorted(set(worker_counts)):
+            # 每轮使用全新的输出和缓存目录，确保所有文件都真正清洗一遍
+            out = os.path.join(root, f"out_{workers}")
+            cache = os.path.join(root, f"cache_{workers}")
+            stats = batch_process(src, out, cache_dir=cache, workers=workers)
+            rows.append((workers, stats["seconds"], stats["files_per_sec"]))
+
+        print("\n" + "=" * 40)
+        print(f"文件数: {n_files}")
+        print(f"{'进程数':>6} {'耗时(s)':>10} {'文件/秒':>10} {'加速比':>8}")
+        base = rows[0][1]
+        for workers, seconds, fps in rows:
+            print(f"{workers:>6} {seconds:>10.2f} {fps:>10.1f} {base / seconds:>8.2f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
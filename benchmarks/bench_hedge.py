@@ -0,0 +1,94 @@
+"""
+对冲请求基准：在本地模拟任务服务 (fake_job_server) 上比较单模型和对冲模式的请求耗时
+
+模拟场景 (时间按比例缩小)：主模型通常 1 秒返回，但有 tail_rate 比例的请求排队到 8 秒；
+备用模型稳定 2 秒。先用单模型请求积累主模型的耗时样本，再开启对冲。
+慢尾部比例应低于 100 - config.LLM_HEDGE_PERCENTILE (%)，否则对冲延迟会落在慢尾部上。
+
+用法：
+    python benchmarks/bench_hedge.py [请求数，默认 20] [慢尾部比例，默认 0.05]
+"""
+import os
+import sys
+import time
+import uuid
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_job_server import FakeJobServer
+
+PRIMARY = "primary-model"
+BACKUP = "backup-model"
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_requests(runner, n):
+    timings, ok = [], 0
+    for _ in range(n):
+        # 每次请求的 Prompt 不同，不会命中任务日志中已完成的任务
+        runner.context_text = f"模拟文章内容 {uuid.uuid4().hex}"
+        start = time.perf_counter()
+        result = runner._request_and_parse()
+        timings.append(time.perf_counter() - start)
+        ok += result is not None and result.ok
+    return timings, ok
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    tail_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+
+    server = FakeJobServer(models={
+        PRIMARY: {"latency": 1.0, "tail": 8.0, "tail_rate": tail_rate},
+        BACKUP: {"latency": 2.0},
+    }, seed=3).start()
+    # 导入配置前指向模拟服务
+    os.environ["AI_API_BASE_URL"] = server.url
+    os.environ["AI_AUTH_URL"] = server.url + "/token"
+
+    import config
+    import llm_hedge
+    from job_journal import JobJournal
+    from AI_prompt_ready import AIPromptRunner
+
+    config.AI_MODEL_NAME = PRIMARY
+    config.AI_BACKUP_MODEL_NAME = BACKUP
+    config.LLM_POLL_INTERVAL = 0.1
+    config.LLM_POLL_MAX_RETRIES = 600
+    config.LLM_HEDGE_MIN_DELAY = 0.5
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        runner = AIPromptRunner()
+        runner.latency_stats = llm_hedge.LatencyStats(os.path.join(tmp, "stats.json"))
+        runner.journal = JobJournal(os.path.join(tmp, "llm_jobs"))
+        runner.token = runner.get_access_token_b()
+
+        for hedged in (False, True):
+            config.LLM_HEDGE_ENABLED = hedged
+            before = dict(server.submitted)
+            timings, ok = run_requests(runner, n)
+            extra = server.submitted.get(BACKUP, 0) - before.get(BACKUP, 0)
+            delay = runner.latency_stats.hedge_delay(PRIMARY)
+            rows.append(("对冲" if hedged else "单模型", timings, ok, extra, delay if hedged else None))
+        summary = runner.latency_stats.summary()
+    server.stop()
+
+    print("\n" + "=" * 60)
+    print(f"请求数: {n}，主模型慢尾部比例: {tail_rate:.0%}")
+    print(f"{'模式':<8} {'p50':>8} {'p90':>8} {'最大':>8} {'成功':>6} {'备用请求':>8}  对冲延迟")
+    for name, timings, ok, extra, delay in rows:
+        print(f"{name:<8} {statistics.median(timings):>7.2f}s {percentile(timings, 90):>7.2f}s "
+              f"{max(timings):>7.2f}s {ok:>6} {extra:>8}  {f'{delay:.2f}s' if delay else '-'}")
+    print(summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+启动耗时基准：用 python -X importtime 测量各入口模块的导入耗时，并检查不该在导入时加载的重依赖
+
+- ai_ppt：每次 Streamlit 重跑都会执行，登录页渲染前只应加载 streamlit 和轻量模块
+- config：清洗子进程、命令行工具都会导入，不能加载 streamlit / python-pptx，也不能发网络请求
+- construct_json：清洗子进程导入，不能加载 streamlit
+
+每个模块在新的解释器中导入多次，取最小值 (排除磁盘缓存的影响)。
+
+用法：
+    python benchmarks/bench_import_time.py [ai_ppt 预算毫秒数，默认 800] [重复次数，默认 5]
+超出预算或加载了禁止的模块时以非 0 退出
+"""
+import os
+import re
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PIPELINE_MODULES = ("construct_json", "AI_prompt_ready", "ppt_ready", "pipeline", "http_client")
+HEAVY_MODULES = ("pptx", "PIL", "bs4", "deep_translator", "jsonschema", "requests")
+
+# 模块 -> (预算毫秒数，导入时不应加载的模块)；ai_ppt 的预算可由命令行指定
+TARGETS = {
+    "ai_ppt": (800, HEAVY_MODULES + PIPELINE_MODULES),
+    "config": (50, ("streamlit", "pptx", "requests", "http_client")),
+    "construct_json": (600, ("streamlit", "pptx")),
+}
+
+_LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+
+
+def measure(module):
+    """
+    在新的解释器中导入一次
+    :return: (总耗时毫秒, {模块名: 累计耗时毫秒}, [(累计耗时毫秒, 顶层依赖)])
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr[-2000:]}")
+    loaded, children, pending = {}, [], []
+    for line in proc.stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if not m:
+            continue
+        cumulative_ms = int(m.group(2)) / 1000
+        name, depth = m.group(4), len(m.group(3)) // 2
+        loaded[name] = cumulative_ms
+        # 子模块先于父模块输出：遇到顶层模块时，之前累积的一级模块就是它的直接依赖
+        if depth == 1:
+            pending.append((cumulative_ms, name))
+        elif depth == 0:
+            if name == module:
+                children = pending
+            pending = []
+    return loaded.get(module, 0.0), loaded, sorted(children, reverse=True)
+
+
+def main():
+    if len(sys.argv) > 1:
+        TARGETS["ai_ppt"] = (float(sys.argv[1]), TARGETS["ai_ppt"][1])
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    failed = False
+    print("\n" + "=" * 60)
+    for module, (budget_ms, forbidden) in TARGETS.items():
+        runs = [measure(module) for _ in range(repeats)]
+        total_ms, loaded, children = min(runs, key=lambda r: r[0])
+        bad = [name for name in forbidden if name in loaded]
+        ok = total_ms <= budget_ms and not bad
+        failed |= not ok
+        print(f"{module:<16} {total_ms:>8.1f} ms (预算 {budget_ms:.0f} ms) -> {'通过' if ok else '未通过'}")
+        for child_ms, name in children[:5]:
+            print(f"    {name:<32} {child_ms:>8.1f} ms")
+        if bad:
+            print(f"    导入时加载了: {', '.join(bad)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
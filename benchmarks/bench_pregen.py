@@ -0,0 +1,99 @@
+"""
+预生成基准：本地模拟 News Platform 和 AI 任务服务 (fake_job_server)，比较
+- 按需生成：用户点击后跑完整条流水线 (每个组合一次)
+- 预生成：调度器一轮生成全部组合的耗时 (同语言共用 LLM)，以及之后用户点击时从缓存取 PPT 的耗时
+
+依次执行：dry-run → 预生成一轮 → 再检查一轮 (文章未变，应跳过) → 缓存读取 → 按需生成一个组合
+
+用法：
+    python benchmarks/bench_pregen.py [LLM 耗时秒数，默认 2.0]
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # TEMPLATE_MAP 中是相对路径
+
+from fake_job_server import FakeJobServer
+
+
+def main():
+    llm_latency = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+
+    server = FakeJobServer(default={"latency": llm_latency}, seed=11).start()
+    # 导入配置前指向模拟服务
+    os.environ.update({
+        "AI_API_BASE_URL": server.url,
+        "AI_AUTH_URL": server.url + "/token",
+        "NEWS_AUTH_URL": server.url + "/news/token",
+        "NEWS_ARTICLE_URL": server.url + "/news/articles",
+        "CLIENT_ID": "bench", "CLIENT_SECRET": "bench", "NEWS_CLIENT_SECRET": "bench",
+    })
+    logging.disable(logging.WARNING)
+
+    import config
+    import render_worker
+    from workspace import RunWorkspace
+    from report_pipeline import build_report_pipeline
+    from pregenerate import Pregenerator, PregenCache, format_report
+
+    # 所有输出写到临时目录
+    base = tempfile.mkdtemp(prefix="bench_pregen_")
+    config.RUNS_DIR = os.path.join(base, "runs")
+    config.BUNDLE_DIR = os.path.join(base, "bundles")
+    config.ARCHIVE_DIR = os.path.join(base, "archive")
+    config.ARCHIVE_DB = os.path.join(config.ARCHIVE_DIR, "reports.db")
+    config.ARCHIVE_DECK_DIR = os.path.join(config.ARCHIVE_DIR, "decks")
+    config.LLM_JOURNAL_DIR = os.path.join(base, "llm_jobs")
+    config.LLM_STATS_PATH = os.path.join(base, "llm_model_stats.json")
+    config.LLM_POLL_INTERVAL = 0.1
+    config.LLM_POLL_MAX_RETRIES = 600
+    for d in (config.RUNS_DIR, config.BUNDLE_DIR):
+        os.makedirs(d, exist_ok=True)
+
+    render_worker.warm_up(wait=True)
+    cache = PregenCache(os.path.join(base, "pregen"))
+    pregenerator = Pregenerator(cache=cache)
+
+    reports = [pregenerator.run_once(dry_run=True)]
+    llm_jobs_before = sum(server.submitted.values())
+    reports.append(pregenerator.run_once())
+    llm_jobs = sum(server.submitted.values()) - llm_jobs_before
+    reports.append(pregenerator.run_once())
+
+    lookups = []
+    for location_name, language_code in pregenerator.combos:
+        start = time.perf_counter()
+        entry = cache.lookup(location_name, language_code)
+        with open(entry["deck_path"], "rb") as f:
+            f.read()
+        lookups.append((time.perf_counter() - start) * 1000)
+
+    location_name, language_code = pregenerator.combos[0]
+    pipeline = build_report_pipeline(RunWorkspace().create(), location_name, language_code)
+    start = time.perf_counter()
+    pipeline.run()
+    on_demand = time.perf_counter() - start
+    render_worker.shutdown()
+    server.stop()
+
+    print("\n" + "=" * 64)
+    for report in reports:
+        print(format_report(report))
+        print("-" * 64)
+    generated = reports[1]
+    print(f"预生成 {len(generated['combos'])} 个组合: {generated['total_seconds']:.2f}s，"
+          f"LLM 任务 {llm_jobs} 个 (按需生成需要 {len(generated['combos'])} 个)")
+    print(f"按需生成一个组合 ({location_name} / {language_code}): {on_demand:.2f}s")
+    print(f"从缓存取 PPT: 中位数 {statistics.median(lookups):.2f} ms，最长 {max(lookups):.2f} ms")
+    ok = reports[2]["status"] == "unchanged" and all(e["status"] == "done" for e in generated["combos"])
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
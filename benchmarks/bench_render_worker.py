@@ -0,0 +1,85 @@
+"""
+常驻渲染进程基准：同一份报告分别在当前进程 (冷启动 / 已导入) 和常驻渲染进程中渲染
+
+- 冷启动：当前进程第一次渲染 (导入 python-pptx、解析模板、片段缓存未加载)
+- 进程内：之后在当前进程渲染 (每次重新解析模板)
+- 渲染进程：render_worker.render_deck (模板预先解析，含进程间传输 PPT 字节)
+
+用法：
+    python benchmarks/bench_render_worker.py [重复次数，默认 5] [地点，默认 香港/Hong Kong] [语言，默认 cn]
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # TEMPLATE_MAP 中是相对路径
+
+import config
+import render_worker
+
+ASSETS = ["中港股市", "美股", "欧股", "日股", "债市", "黄金", "原油"]
+
+
+def make_report():
+    return {
+        "document": {"title": "环球市场投资观点", "author": "CIO Office", "date": "2026-01-16"},
+        "executive_summary": {
+            "columns": ["资产类别", "投资逻辑"],
+            "rows": [{"资产类别": a, "投资逻辑": "美联储降息预期升温，风险资产情绪修复。" * 3} for a in ASSETS],
+        },
+        "content_slides": [
+            {"title": f"{a}：观点摘要", "bullets": ["小标题：" + "估值处于历史均值附近，盈利增长放缓。" * 6] * 3}
+            for a in ASSETS
+        ],
+    }
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    location = sys.argv[2] if len(sys.argv) > 2 else "香港/Hong Kong"
+    language = sys.argv[3] if len(sys.argv) > 3 else "cn"
+    logging.disable(logging.INFO)
+
+    template_path = config.TEMPLATE_MAP[location][language]
+    report = make_report()
+    images_dir = tempfile.mkdtemp()
+
+    def in_process():
+        from ppt_ready import PPTGenerator
+        return PPTGenerator(report, template_path, images_dir, location, language).render_to_buffer()
+
+    cold_ms, buffer = timed(in_process)
+    size_kb = buffer.getbuffer().nbytes / 1024
+    local_ms = statistics.median(timed(in_process)[0] for _ in range(repeats))
+
+    config.RENDER_WORKERS = max(1, config.RENDER_WORKERS)
+    startup_ms, _ = timed(lambda: render_worker.warm_up(wait=True))
+    worker = []
+    for _ in range(repeats):
+        ms, buffer = timed(lambda: render_worker.render_deck(report, template_path, images_dir, location, language))
+        worker.append(ms)
+        time.sleep(0.2)  # 留出进程空闲时预解析下一份模板的时间 (与实际使用中两次生成的间隔相符)
+    render_worker.shutdown()
+
+    print("\n" + "=" * 48)
+    print(f"模板: {template_path} ({location} / {language})，PPT {size_kb:.0f} KB")
+    print(f"{'冷启动 (当前进程)':<14} {cold_ms:>8.1f} ms")
+    print(f"{'进程内':<14} {local_ms:>8.1f} ms (中位数)")
+    print(f"{'渲染进程':<14} {statistics.median(worker):>8.1f} ms (中位数，最大 {max(worker):.1f} ms)")
+    print(f"{'渲染进程启动':<14} {startup_ms:>8.1f} ms (与抓取/LLM 并行，不计入渲染)")
+    return 0 if buffer else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+频道导出读取基准：json.load 全量读取 + ArticleSelector vs article_stream 流式读取
+比较耗时和 Python 堆峰值 (tracemalloc)
+
+用法：
+    python benchmarks/bench_stream_load.py [文章数] [每篇正文KB]
+    python benchmarks/bench_stream_load.py 5000 40
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from article_selection import ArticleSelector
+from article_stream import load_selected_articles
+from bench_article_selection import make_dump
+
+
+def write_dump(path, n, body_kb, rng):
+    """生成带 HTML 正文 (模拟内嵌 base64 图表) 的导出文件"""
+    articles = make_dump(n, rng)
+    body = "<p>" + "A" * (body_kb * 1024) + "</p>"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"articles": [')
+        for i, article in enumerate(articles):
+            article["contents"] = [{"type": "html", "value": body}]
+            if i:
+                f.write(",")
+            f.write(json.dumps(article, ensure_ascii=False))
+        f.write("]}")
+
+
+def full_load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        articles = json.load(f).get("articles", [])
+    return ArticleSelector().add_all(articles)
+
+
+def measure(fn, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    selector = fn(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, [(i["category"], i["original_index"]) for i in selector.selected()]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    body_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    path = os.path.join(tempfile.gettempdir(), f"bench_stream_{n}_{body_kb}.json")
+    write_dump(path, n, body_kb, random.Random(7))
+    size_mb = os.path.getsize(path) / 1024 / 1024
+
+    try:
+        t_full, peak_full, sel_full = measure(full_load, path)
+        t_stream, peak_stream, sel_stream = measure(load_selected_articles, path)
+    finally:
+        os.remove(path)
+
+    print(f"导出文件: {n} 篇, {size_mb:.1f} MB")
+    print(f"{'方式':<10} {'耗时(s)':>8} {'峰值(MB)':>10}")
+    print(f"{'json.load':<10} {t_full:>8.2f} {peak_full / 1024 / 1024:>10.1f}")
+    print(f"{'流式':<10} {t_stream:>8.2f} {peak_stream / 1024 / 1024:>10.1f}")
+    print(f"结果一致: {sel_full == sel_stream}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+英文版基准：第二次 LLM 任务 (AI_SYSTEM_PROMPT_en) vs 由中文报告批量翻译 (report_translation)
+
+- LLM：本地模拟任务服务 (fake_job_server)，每个任务耗时 [LLM 耗时] 秒，含提交、轮询和解析
+- 翻译：默认使用模拟翻译 (每次请求耗时 [翻译请求耗时] 秒，原样返回)，--live 时调用 Google 翻译 (需要网络)
+
+两条路径的输出都用 llm_output.validate_report 校验；翻译结果还检查结构 (页数、条数、行数) 与中文报告一致、
+每页标题的资产前缀与英文 Prompt 的资产名称一致
+
+用法：
+    python benchmarks/bench_translate.py [LLM 耗时秒数，默认 5.0] [翻译请求耗时秒数，默认 0.8] [--live]
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_job_server import FakeJobServer
+
+ASSETS = ["中港股市", "美股", "欧股", "日股", "债市", "黄金", "原油"]
+
+
+def make_report():
+    """与 AI_SYSTEM_PROMPT_cn 格式一致的中文报告"""
+    return {
+        "document": {"title": "环球市场投资观点", "author": "CIO Office", "date": "2026-01-16"},
+        "executive_summary": {
+            "columns": ["资产类别", "投资逻辑"],
+            "rows": [{"资产类别": a, "投资逻辑": f"美联储降息预期升温，{a}情绪修复，估值处于历史均值附近。"} for a in ASSETS],
+        },
+        "content_slides": [
+            {"title": f"{a}：盈利改善支撑，维持超配", "bullets": [
+                f"政策面：美联储降息预期升温，流动性环境改善，{a}风险偏好回升。",
+                f"基本面：{a}相关企业盈利增长放缓但仍具韧性，估值处于历史均值附近。",
+                f"策略：建议{a}逢低分批布局，关注高股息与行业龙头。",
+            ]}
+            for a in ASSETS
+        ],
+    }
+
+
+def check(report, reference=None):
+    """
+    :param reference: 中文报告，给出时还检查结构与其一致、标题前缀为英文标准资产名
+    :return: 问题列表 (空表示符合要求)
+    """
+    import config
+    from llm_output import validate_report
+    from report_archive import standard_asset_name
+    from report_translation import split_title
+
+    problems = [str(p) for p in validate_report(report, expected_assets=config.ASSET_CLASSES) if not p.soft]
+    if reference is None:
+        return problems
+    slides, ref_slides = report["content_slides"], reference["content_slides"]
+    if [len(s["bullets"]) for s in slides] != [len(s["bullets"]) for s in ref_slides]:
+        problems.append("观点页或 bullet 数量与中文报告不一致")
+    if len(report["executive_summary"]["rows"]) != len(reference["executive_summary"]["rows"]):
+        problems.append("执行摘要行数与中文报告不一致")
+    names_en = set(config.ASSET_PROMPT_NAMES["en"].values())
+    for slide, ref in zip(slides, ref_slides):
+        prefix = split_title(slide["title"])[0].strip()
+        if prefix not in names_en:
+            problems.append(f"标题前缀不是标准资产名: {slide['title']}")
+        elif standard_asset_name(slide["title"]) != standard_asset_name(ref["title"]):
+            problems.append(f"资产不对应: {ref['title']} -> {slide['title']}")
+    return problems
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    live = "--live" in sys.argv
+    llm_latency = float(args[0]) if args else 5.0
+    translate_latency = float(args[1]) if len(args) > 1 else 0.8
+
+    server = FakeJobServer(default={"latency": llm_latency}, seed=1).start()
+    # 导入配置前指向模拟服务
+    os.environ.update({"AI_API_BASE_URL": server.url, "AI_AUTH_URL": server.url + "/token",
+                       "CLIENT_ID": "bench", "CLIENT_SECRET": "bench"})
+    logging.disable(logging.WARNING)
+
+    import config
+    import llm_hedge
+    from job_journal import JobJournal
+    from AI_prompt_ready import AIPromptRunner
+    from report_translation import ReportTranslator, google_translate
+
+    config.LLM_POLL_INTERVAL = 0.1
+    config.LLM_POLL_MAX_RETRIES = 6000
+    chinese = make_report()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runner = AIPromptRunner(language="en")
+        runner.latency_stats = llm_hedge.LatencyStats(os.path.join(tmp, "stats.json"))
+        runner.journal = JobJournal(os.path.join(tmp, "llm_jobs"))
+        runner.token = runner.get_access_token_b()
+        runner.context_text = "模拟文章内容"
+        start = time.perf_counter()
+        result = runner._request_and_parse()
+        llm_seconds = time.perf_counter() - start
+        llm_report = result.data if result else None
+    server.stop()
+
+    requests = []
+
+    def stand_in(text):
+        requests.append(len(text))
+        time.sleep(translate_latency)
+        return text
+
+    translator = ReportTranslator(google_translate if live else stand_in)
+    start = time.perf_counter()
+    translated = translator.translate_report(chinese)
+    translate_seconds = time.perf_counter() - start
+
+    print("\n" + "=" * 64)
+    print(f"{'第二次 LLM 任务':<14} {llm_seconds:>7.2f}s  (模拟任务耗时 {llm_latency}s)")
+    source = "Google 翻译" if live else f"模拟翻译，每次请求 {translate_latency}s"
+    print(f"{'批量翻译':<14} {translate_seconds:>7.2f}s  ({source}，{translator.requests} 次请求，"
+          f"{sum(requests) if requests else '-'} 字符)")
+    for name, report in (("LLM", llm_report), ("翻译", translated)):
+        if report is None:
+            print(f"{name}: 没有得到报告")
+            continue
+        # 模拟任务服务不区分语言，LLM 输出只做结构校验
+        problems = check(report, chinese) if name == "翻译" else check(report)
+        print(f"{name} 输出检查: {'通过' if not problems else '; '.join(problems[:3])}")
+    print("翻译示例:")
+    for slide in translated["content_slides"][:2]:
+        print(f"  {slide['title']}")
+        print(f"    - {slide['bullets'][0]}")
+    print(f"  {translated['executive_summary']['columns']} {translated['executive_summary']['rows'][0]}")
+    return 0 if translated and not check(translated, chinese) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+本地模拟 AI 任务服务 (只依赖标准库)，用于联调 AIPromptRunner 和对冲请求
+
+实现与真实服务相同的接口：
+- POST <任意路径>/token            认证，返回 access_token
+- POST /job                         提交任务，返回 {"id": ...}
+- GET  /job/JOB_ID/<id>             查询任务：PENDING / COMPLETED (output.text 为报告 JSON) / FAILED
+
+以及 News Platform 的替身 (压测 HTTP 服务时使用)：
+- GET  <任意路径>/articles          文章列表 (每个资产一篇，正文内含一张图表)
+- GET  /images/<文件名>             图表图片 (项目根目录的 logo.png)
+
+每个模型的行为可单独配置：基础耗时、慢尾部 (按比例出现的长耗时)、无效输出比例、失败比例。
+未配置的模型使用 default。
+
+用法：
+    python benchmarks/fake_job_server.py --port 8765 \\
+        --model gemini-3-pro-preview:latency=20,tail=300,tail_rate=0.2 \\
+        --model gemini-2.5-pro:latency=40,invalid=0.1
+    # 另一个终端
+    AI_API_BASE_URL=http://127.0.0.1:8765 AI_AUTH_URL=http://127.0.0.1:8765/token streamlit run ai_ppt.py
+    # 文章也从本地获取
+    NEWS_AUTH_URL=http://127.0.0.1:8765/news/token NEWS_ARTICLE_URL=http://127.0.0.1:8765/news/articles ...
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ASSETS = ["中港股市", "美股", "欧股", "日股", "债券", "黄金", "原油"]
+DEFAULT_BEHAVIOR = {"latency": 1.0, "tail": 0.0, "tail_rate": 0.0, "invalid": 0.0, "fail": 0.0}
+CHART_IMAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logo.png")
+
+
+def make_report(model):
+    """一份能通过 llm_output 校验的报告"""
+    return {
+        "document": {"title": f"环球投资观点 ({model})", "author": "CIO Office", "date": time.strftime("%Y-%m-%d")},
+        "executive_summary": {
+            "columns": ["资产类别", "观点"],
+            "rows": [{"资产类别": asset, "观点": f"{asset}维持中性配置。"} for asset in ASSETS],
+        },
+        "content_slides": [
+            {"title": f"{asset}：观点摘要", "bullets": [f"{asset}：估值处于历史均值附近，维持中性。"]}
+            for asset in ASSETS
+        ],
+    }
+
+
+def make_articles(base_url, publish):
+    """频道文章列表：每个资产一篇文章 (发布时间为 publish)，正文内含一张远程图表"""
+    articles = []
+    for i, asset in enumerate(ASSETS):
+        html = (f"<p>{asset}：美联储降息预期升温，风险资产情绪修复。</p>" * 5
+                + f'<p>图：{asset}走势</p><img src="{base_url}/images/chart_{i}.png">'
+                + "<p>资料来源：彭博</p>")
+        articles.append({
+            "id": f"fake-{i}",
+            "titles": {"zh_CN": f"{asset}周报"},
+            "contents": {"zh_CN": html},
+            "metadata": {
+                "classifications": {"tagNames": {"cio": [f"cio_category_{asset}"]}},
+                "audit": {"publishTime": publish},
+            },
+        })
+    return {"articles": articles}
+
+
+def parse_model_spec(spec):
+    """'名称:latency=20,tail=300,tail_rate=0.2' -> (名称, 行为)"""
+    name, _, options = spec.partition(":")
+    behavior = dict(DEFAULT_BEHAVIOR)
+    for item in filter(None, options.split(",")):
+        key, _, value = item.partition("=")
+        if key not in behavior:
+            raise ValueError(f"未知的模型参数: {key}")
+        behavior[key] = float(value)
+    return name, behavior
+
+
+class FakeJobServer:
+    """
+    :param models: {模型名: 行为}，行为字段见 DEFAULT_BEHAVIOR (耗时单位为秒，比例为 0~1)
+    """
+
+    def __init__(self, port=0, models=None, default=None, seed=None):
+        self.models = {name: dict(DEFAULT_BEHAVIOR, **behavior) for name, behavior in (models or {}).items()}
+        self.default = dict(DEFAULT_BEHAVIOR, **(default or {}))
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.submitted = {}     # 模型名 -> 提交次数
+        self.polls = 0
+        self.article_requests = 0
+        # 文章发布时间固定为服务启动时，重复抓取得到相同的文章
+        self.publish_time = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def create_job(self, model):
+        behavior = self.models.get(model, self.default)
+        with self.lock:
+            job_id = len(self.jobs) + 1
+            roll = self.rng.random
+            slow = roll() < behavior["tail_rate"]
+            if roll() < behavior["fail"]:
+                outcome = "fail"
+            elif roll() < behavior["invalid"]:
+                outcome = "invalid"
+            else:
+                outcome = "ok"
+            delay = behavior["tail"] if slow else behavior["latency"]
+            self.jobs[job_id] = {"model": model, "ready_at": time.monotonic() + delay, "outcome": outcome}
+            self.submitted[model] = self.submitted.get(model, 0) + 1
+        return job_id
+
+    def job_status(self, job_id):
+        with self.lock:
+            self.polls += 1
+            job = self.jobs.get(job_id)
+        if job is None:
+            return 404, {"error": "job not found"}
+        if time.monotonic() < job["ready_at"]:
+            return 200, {"id": job_id, "status": "PENDING"}
+        if job["outcome"] == "fail":
+            return 200, {"id": job_id, "status": "FAILED", "error": "model overloaded"}
+        if job["outcome"] == "invalid":
+            text = "抱歉，我无法按要求的格式输出。"
+        else:
+            text = json.dumps(make_report(job["model"]), ensure_ascii=False)
+        return 200, {"id": job_id, "status": "COMPLETED", "output": {"text": text}}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send_bytes(self, data, content_type):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send(self, code, body):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                if self.path.rstrip("/").endswith("/token"):
+                    return self._send(200, {"access_token": "fake-token", "expires_in": 3600})
+                if self.path.rstrip("/").endswith("/job"):
+                    try:
+                        model = json.loads(body)["input"]["parameter"]["model_name"]
+                    except (ValueError, KeyError, TypeError):
+                        return self._send(400, {"error": "invalid payload"})
+                    return self._send(200, {"id": server.create_job(model)})
+                self._send(404, {"error": "not found"})
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/articles"):
+                    with server.lock:
+                        server.article_requests += 1
+                    data = json.dumps(make_articles(server.url, server.publish_time), ensure_ascii=False).encode("utf-8")
+                    return self._send_bytes(data, "application/json; charset=utf-8")
+                if self.path.startswith("/images/"):
+                    with open(CHART_IMAGE, "rb") as f:
+                        return self._send_bytes(f.read(), "image/png")
+                _, sep, job_id = self.path.rpartition("/job/JOB_ID/")
+                if not sep or not job_id.isdigit():
+                    return self._send(404, {"error": "not found"})
+                self._send(*server.job_status(int(job_id)))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 AI 任务服务")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--model", action="append", default=[], help="名称:latency=秒,tail=秒,tail_rate=比例,invalid=比例,fail=比例")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    models = dict(parse_model_spec(spec) for spec in args.model)
+    server = FakeJobServer(args.port, models, seed=args.seed)
+    print(f"模拟任务服务: {server.url} (模型: {models or '全部使用默认行为'})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
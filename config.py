@@ -1,32 +1,45 @@
 # config.py
-from pptx.dml.color import RGBColor
-import requests
+# 导入 config 没有副作用：不加载 streamlit / python-pptx，不发网络请求 (凭据在第一次访问时读取，见文件末尾 __getattr__)
 import os
-import streamlit as st
-from pptx.util import Pt
 # ==============================================================================
 # Web 界面访问密码
 # APP_PASSWORD = "123456"
 # 0. News Platform 配置 (用于抓取文章)
 # ==============================================================================
-NEWS_AUTH_URL = "https://auth.easyview.xyz/realms/Easyview-News-Platform-Realm/protocol/openid-connect/token"
-NEWS_ARTICLE_URL = "https://news-platform.easyview.xyz/api/v1/channel/cio/articles"
+# 可用环境变量覆盖 (例如指向本地的 benchmarks/fake_job_server.py 做压测)
+NEWS_AUTH_URL = os.environ.get("NEWS_AUTH_URL", "https://auth.easyview.xyz/realms/Easyview-News-Platform-Realm/protocol/openid-connect/token")
+NEWS_ARTICLE_URL = os.environ.get("NEWS_ARTICLE_URL", "https://news-platform.easyview.xyz/api/v1/channel/cio/articles")
 NEWS_CLIENT_ID = "cio-backend"
 # NEWS_CLIENT_SECRET = "4cbb1527-bcc4-42ae-a7ec-691359f3e119"
-NEWS_CLIENT_SECRET = st.secrets["NEWS_CLIENT_SECRET"]
+# NEWS_CLIENT_SECRET: 见 SECRET_NAMES
 # 1. AI API 与 认证配置
 # ==============================================================================
 
-AUTH_URL = "https://auth-v2.easyview.xyz/realms/evhk/protocol/openid-connect/token"
-API_BASE_URL = "https://api-v2.easyview.xyz/v3/ai"
+# 可用环境变量覆盖 (例如指向本地的 benchmarks/fake_job_server.py 做联调)
+AUTH_URL = os.environ.get("AI_AUTH_URL", "https://auth-v2.easyview.xyz/realms/evhk/protocol/openid-connect/token")
+API_BASE_URL = os.environ.get("AI_API_BASE_URL", "https://api-v2.easyview.xyz/v3/ai")
 # AI 服务的专用凭据
 # CLIENT_ID = "cioinsight-api-client"
 # CLIENT_SECRET = "b02fe9e7-36e6-4c81-a389-9399184eda9b"
-CLIENT_ID = st.secrets["CLIENT_ID"]
-CLIENT_SECRET = st.secrets["CLIENT_SECRET"]
-APP_PASSWORD = st.secrets["APP_PASSWORD"]
+# CLIENT_ID / CLIENT_SECRET / APP_PASSWORD: 见 SECRET_NAMES
+# 凭据：优先读取同名环境变量，其次 Streamlit secrets (.streamlit/secrets.toml)，第一次访问 config.XXX 时才读取
+SECRET_NAMES = ("NEWS_CLIENT_SECRET", "CLIENT_ID", "CLIENT_SECRET", "APP_PASSWORD")
 # AI 模型名称
 AI_MODEL_NAME = "gemini-3-pro-preview"
+# 对冲请求 (llm_hedge.py)：主模型超过对冲延迟仍没有结果 (或失败/输出无效) 时，同时向备用模型提交，第一份通过校验的结果胜出
+# 备用模型为空或与主模型相同时不对冲
+AI_BACKUP_MODEL_NAME = "gemini-2.5-pro"
+LLM_HEDGE_ENABLED = True
+# 对冲延迟 = 主模型历史耗时的该百分位 (秒)，样本少于 LLM_HEDGE_MIN_SAMPLES 时用默认值
+LLM_HEDGE_PERCENTILE = 90
+LLM_HEDGE_MIN_SAMPLES = 5
+LLM_HEDGE_DEFAULT_DELAY = 240
+LLM_HEDGE_MIN_DELAY = 30
+# 每个模型保留的最近耗时样本数
+LLM_STATS_MAX_SAMPLES = 100
+# 任务轮询间隔 (秒) 和最多轮询次数 (默认最多等待 10 分钟)
+LLM_POLL_INTERVAL = 10
+LLM_POLL_MAX_RETRIES = 60
 
 # 请求元数据 (Metadata)
 API_METADATA = {
@@ -36,6 +49,13 @@ API_METADATA = {
     "priority": 1,
     "custom": {}
 }
+# 对外 HTTP 请求 (http_client)：连接/读取超时 (秒)、每个 host 的连接池大小、重试次数与退避
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 60
+HTTP_POOL_MAXSIZE = 10
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.5
+HTTP_BACKOFF_MAX = 30
 # 获取访问令牌的函数
 def get_access_token_b(CLIENT_ID, CLIENT_SECRET):
     payload = {
@@ -43,14 +63,16 @@ def get_access_token_b(CLIENT_ID, CLIENT_SECRET):
         'client_id': CLIENT_ID,
         'client_secret': CLIENT_SECRET
     }
+    import http_client
     try:
-        resp = requests.post(AUTH_URL, data=payload)
+        # client_credentials 换取令牌可以安全重试
+        resp = http_client.post(AUTH_URL, data=payload, retry=http_client.RetryPolicy(retry_unsafe=True))
         resp.raise_for_status()
         return resp.json().get('access_token')
     except Exception as e:
         print(f" 认证失败: {e}")
         return None
-API_TOKEN = get_access_token_b(CLIENT_ID, CLIENT_SECRET)
+# 令牌在需要时获取 (AIPromptRunner.run)，导入 config 时不再请求认证服务
 # ==============================================================================
 # 2. AI 提示词 (Prompt) 配置 - 决定报告质量的核心
 # ==============================================================================
@@ -118,6 +140,32 @@ AI_SYSTEM_PROMPT_en = """
         After generating each bullet point, check if the character count meets the requirements.
         Check that each title in content_slides starts with one of the asset class names, without any alterations.
         """
+# 增量生成指令：只有部分资产有新文章时追加在 Prompt 末尾
+AI_PARTIAL_PROMPT_cn = """
+本次只需要生成以下资产类别的投资观点：{assets}。
+其他资产类别沿用上一期的观点，不要输出。executive_summary.rows 和 content_slides 中只包含上述资产，JSON 结构保持不变。
+"""
+AI_PARTIAL_PROMPT_en = """
+This time, only generate investment views for the following asset classes: {assets}.
+The other asset classes reuse the previous views; do not output them. executive_summary.rows and content_slides must contain only the asset classes above, with the same JSON structure.
+"""
+# LLM 输出校验失败时，针对无效部分重新请求的最多轮数 (0 表示不重新请求)
+LLM_REPAIR_MAX_ROUNDS = 2
+# 针对性重新请求：{sections} 为无效的顶层部分，{errors} 为校验问题，{assets_line} 为需要重写的资产
+AI_REPAIR_PROMPT_cn = """
+上一次输出的 JSON 中以下部分无效或缺失：{sections}
+问题：
+{errors}
+请只重新生成这些部分，输出一个只包含这些键的纯 JSON 对象 (例如 {{"content_slides": [...]}})，结构和写作要求与上面一致。{assets_line}
+"""
+AI_REPAIR_ASSETS_cn = "content_slides 只需包含以下资产：{assets}。"
+AI_REPAIR_PROMPT_en = """
+The following parts of your previous JSON output were invalid or missing: {sections}
+Problems:
+{errors}
+Regenerate ONLY these parts. Output a pure JSON object containing only these keys (e.g. {{"content_slides": [...]}}), following the same structure and writing requirements as above.{assets_line}
+"""
+AI_REPAIR_ASSETS_en = " content_slides must contain only these asset classes: {assets}."
 # 指引指令 (Instruction Prompt)：放在 Parameter 中，指引 AI 去读取附件
 AI_INSTRUCTION_PROMPT_cn = "请详细阅读附带的文件资源（resource），文件中包含了身份设定、具体指令以及需要分析的金融文档内容。请严格按照文件中的 JSON 格式要求输出结果。"
 AI_INSTRUCTION_PROMPT_en = "Please carefully read the attached file resources (resource), which contain identity settings, specific instructions, and the content of financial documents to be analyzed. Please strictly follow the JSON format requirements in the file to output the results."
@@ -128,14 +176,145 @@ AI_INSTRUCTION_PROMPT_en = "Please carefully read the attached file resources (r
 BASE_DIR = "/tmp" 
 OUTPUT_DIR = os.path.join(BASE_DIR, "output")
 TEMP_JSON = os.path.join(BASE_DIR, "articles.json")
+# 清洗缓存：以源文件 sha256 命名 (<sha256>.json)，跨运行复用，超过天数未命中则删除
 CLEANED_DIR = os.path.join(BASE_DIR, "cleaned_files")
+CLEAN_CACHE_MAX_AGE_DAYS = 14
+# 清洗目录中的清单文件名，记录当前输入文件及其内容哈希
+CLEAN_MANIFEST_NAME = "_manifest.json"
 IMAGES_DIR = os.path.join(BASE_DIR, "images")
+# 文章内嵌图片 (o:gfxdata / data: URI) 解码后的大小上限 (字节)，超过时改用远程下载
+EMBEDDED_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+# 远程图片下载的大小上限 (字节)，超过时中止下载
+IMAGE_DOWNLOAD_MAX_BYTES = 15 * 1024 * 1024
+# 每篇文章最多提取的图表数，远程图片的并发下载数
+MAX_CHARTS_PER_ARTICLE = 6
+IMAGE_DOWNLOAD_WORKERS = 4
+# 图片目录中的清单文件：按文章记录图表顺序、标题和资料来源
+IMAGE_MANIFEST_NAME = "_images.json"
+# 运行包目录 (录制每次生成的文章、图片、LLM JSON，用于离线回放)
+BUNDLE_DIR = os.path.join(BASE_DIR, "bundles")
+# 历史报告归档 (SQLite 索引 + 按 run_id 保存的 PPT)
+ARCHIVE_DIR = os.path.join(BASE_DIR, "archive")
+ARCHIVE_DB = os.path.join(ARCHIVE_DIR, "reports.db")
+ARCHIVE_DECK_DIR = os.path.join(ARCHIVE_DIR, "decks")
+# 归档在后台线程中写入，不阻塞下载按钮
+ARCHIVE_WRITE_BEHIND = True
+# 静态页 (联系页/免责页) 片段缓存；CONTACT_ADDRESSES / DISCLAIMER_TEXTS 等配置已计入缓存键，
+# 只有修改 ppt_ready 中这些页面的样式代码后才需要递增版本号
+FRAGMENT_CACHE_ENABLED = True
+FRAGMENT_CACHE_DIR = os.path.join(BASE_DIR, "fragment_cache")
+FRAGMENT_CACHE_VERSION = 1
+# 每次运行独立的工作目录 (支持多用户并发)，以及旧目录的清理阈值
+RUNS_DIR = os.path.join(BASE_DIR, "runs")
+RUN_MAX_AGE_HOURS = 24
+RUNS_MAX_TOTAL_MB = 2048
+# llm 阶段超时由 LLM 设置推算：每轮请求中每个模型最多轮询 LLM_POLL_MAX_RETRIES * LLM_POLL_INTERVAL 秒，
+# 对冲时备用模型最晚在对冲延迟后提交 (对冲延迟取历史耗时百分位，不超过轮询上限)，所以一轮最多两倍轮询时间；
+# 首轮之外还有最多 LLM_REPAIR_MAX_ROUNDS 轮修复请求，另留 60 秒给提交、解析和校验
+LLM_ROUND_TIMEOUT = LLM_POLL_MAX_RETRIES * LLM_POLL_INTERVAL * (2 if LLM_HEDGE_ENABLED and AI_BACKUP_MODEL_NAME else 1)
+LLM_STAGE_TIMEOUT = LLM_ROUND_TIMEOUT * (1 + LLM_REPAIR_MAX_ROUNDS) + 60
+# 生成流水线各阶段的超时 (秒)，None 表示不限制
+PIPELINE_STAGE_TIMEOUTS = {
+    "fetch": 120,
+    "template": 120,
+    "select": 300,
+    "images": 600,
+    "clean": 600,
+    "llm": LLM_STAGE_TIMEOUT,
+    "render": 300,
+}
+# 常驻渲染进程数 (render_worker.py)：0 表示在 Streamlit 进程内渲染
+RENDER_WORKERS = 1
+# 渲染进程启动时预先解析 TEMPLATE_MAP 中的全部模板并预热静态页片段
+RENDER_WORKER_PRELOAD = True
+# HTTP 服务 (api_server.py)：并发执行的生成任务数、排队上限 (满了返回 429)、LLM / 渲染阶段的并发上限
+API_HOST = "127.0.0.1"
+API_PORT = 8600
+API_WORKERS = 4
+API_QUEUE_SIZE = 8
+API_MAX_CONCURRENT_LLM = 2
+API_MAX_CONCURRENT_RENDER = 1
+# 相同 (地点, 语言, 增量) 的成功结果在该秒数内直接返回，不重新生成；保留的任务记录数
+API_RESULT_TTL = 1800
+API_MAX_JOBS = 200
+# 队列已满时建议调用方等待的秒数 (429 响应的 Retry-After)
+API_RETRY_AFTER = 30
+# 调用方需在 X-API-Key 请求头中提供的密钥 (环境变量 DECK_API_KEY)，未设置时不校验 (只监听本机)
+API_KEY = os.environ.get("DECK_API_KEY")
+# 预生成 (pregenerate.py)：按固定间隔检查新文章，提前为各 地点 × 语言 生成 PPT，界面点击时直接下载
+PREGEN_ENABLED = True
+PREGEN_DIR = os.path.join(BASE_DIR, "pregen")
+PREGEN_INTERVAL_MINUTES = 10
+# 只在这些小时内检查 (本地时间，含开始不含结束)，例如 (6, 10) 表示开盘前；None 表示全天
+PREGEN_ACTIVE_HOURS = None
+# 需要预生成的 (地点, 语言代码)，None 表示 TEMPLATE_MAP × LANGUAGE_MAP 的全部组合
+PREGEN_COMBOS = None
+# 调度器超过该分钟数没有确认文章仍是最新 (例如调度器已停止) 时，界面不再使用预生成结果
+PREGEN_MAX_AGE_MINUTES = 60
+# 各 LLM 模型的耗时/结果统计 (用于计算对冲延迟)
+LLM_STATS_PATH = os.path.join(BASE_DIR, "llm_model_stats.json")
+# 已提交 LLM 任务的日志 (会话重跑/进程重启后接上未完成的任务)，超过该小时数的记录不再使用
+LLM_JOURNAL_DIR = os.path.join(BASE_DIR, "llm_jobs")
+LLM_JOURNAL_MAX_AGE_HOURS = 6
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(CLEANED_DIR, exist_ok=True)
 os.makedirs(IMAGES_DIR, exist_ok=True)
+os.makedirs(BUNDLE_DIR, exist_ok=True)
+os.makedirs(RUNS_DIR, exist_ok=True)
 os.makedirs(BASE_DIR, exist_ok=True)
 
 
+# 资产类别关键词 -> 中文标准名 (用于图片匹配和报告归档)
+ASSET_KEYWORD_MAP = {
+    "US Equities": "美股",
+    "HK/China Equities": "中港股市",
+    "European Equities": "欧股",
+    "Japan Equities": "日股",
+    "Fixed Income": "债券",
+    "Gold": "黄金",
+    "Crude Oil": "原油",
+    "Fund flow": "资金流",
+    "Top Picks - Bonds": "个债精选",
+    "Top Picks - Equities": "个股精选",
+    "债市": "债券"
+}
+# 报告中的 7 类资产 (中文标准名)
+ASSET_CLASSES = ["中港股市", "美股", "欧股", "日股", "债券", "黄金", "原油"]
+# 提示词中使用的资产名称 (与 AI_SYSTEM_PROMPT_cn / AI_SYSTEM_PROMPT_en 一致)
+ASSET_PROMPT_NAMES = {
+    "cn": {"债券": "债市"},
+    "en": {
+        "中港股市": "HK/China Equities",
+        "美股": "US Equities",
+        "欧股": "European Equities",
+        "日股": "Japan Equities",
+        "债券": "Fixed Income",
+        "黄金": "Gold",
+        "原油": "Crude Oil"
+    }
+}
+
+# 英文版由中文报告翻译得到 (report_translation.py)，不再单独提交英文 LLM 任务；界面上可按次切换
+EN_TRANSLATE_FROM_CN = False
+# 单次翻译请求的最大字符数 (Google 翻译单次上限 5000)
+TRANSLATION_MAX_CHARS = 4500
+# 术语表：翻译前先替换为固定译法 (资产名称已由 ASSET_PROMPT_NAMES["en"] 提供)
+TRANSLATION_GLOSSARY = {
+    "美联储": "the Fed",
+    "欧洲央行": "the ECB",
+    "日本央行": "the BoJ",
+    "中国人民银行": "the PBoC",
+    "人民银行": "the PBoC",
+    "恒生指数": "Hang Seng Index",
+    "恒生科技指数": "Hang Seng Tech Index",
+    "标普500": "S&P 500",
+    "纳斯达克": "Nasdaq",
+    "日经225": "Nikkei 225",
+    "美债": "US Treasuries",
+    "布伦特": "Brent",
+    "欧佩克": "OPEC",
+}
+
 # PPT 模板路径映射 (根据用户选择的地点，自动匹配模板文件)
 TEMPLATE_MAP = {
     "香港/Hong Kong": {
@@ -160,11 +339,11 @@ LANGUAGE_MAP = {
 # 4. PPT 视觉样式配置 (颜色、字体、布局)
 # ==============================================================================
 
-# 常用颜色定义
-COLOR_DARK_BLUE = RGBColor(0, 32, 96)
-COLOR_BLACK = RGBColor(0, 0, 0)
-COLOR_GRAY = RGBColor(100, 100, 100)
-COLOR_LIGHT_BLUE = RGBColor(60, 109, 148)
+# 常用颜色定义 (R, G, B)，ppt_ready 转换为 RGBColor
+COLOR_DARK_BLUE = (0, 32, 96)
+COLOR_BLACK = (0, 0, 0)
+COLOR_GRAY = (100, 100, 100)
+COLOR_LIGHT_BLUE = (60, 109, 148)
 # 幻灯片布局索引 (Slide Layout Index)
 # 注意：这些索引对应你 PPT 母版中的位置，如果母版改了，这里要改
 LAYOUT_IDX = {
@@ -174,9 +353,50 @@ LAYOUT_IDX = {
     'content': 9,       # 正文页
     'image_only': 10    # 纯图页 (如资金流)
 }
+# 内容页最多并排放置的图表数 (一篇文章有多张图表时)，以及图表之间的间距 (EMU)
+MAX_CHARTS_PER_SLIDE = 2
+MULTI_CHART_GAP = 152400
 
 # 图片注释坐标 (单位: EMU)
 # 用于在图片周围添加"标题"和"资料来源"
+# 文字测量 (text_metrics) 使用的字体文件：字体名 -> 候选文件名，(字体名, "bold") 为粗体文件
+FONT_FILES = {
+    "华文细黑": ["STXIHEI.TTF", "华文细黑.ttf", "STHeiti Light.ttc"],
+    "Microsoft YaHei": ["msyh.ttc", "msyh.ttf", "Microsoft YaHei.ttf"],
+    ("Microsoft YaHei", "bold"): ["msyhbd.ttc", "msyhbd.ttf"],
+    "Arial Narrow": ["ARIALN.TTF", "Arial Narrow.ttf"],
+    ("Arial Narrow", "bold"): ["ARIALNB.TTF", "Arial Narrow Bold.ttf"],
+}
+# 按顺序查找字体文件的目录 (项目内 fonts/ 优先)
+FONT_DIRS = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts"),
+    "C:/Windows/Fonts",
+    "/Library/Fonts",
+    "/System/Library/Fonts",
+    "~/Library/Fonts",
+    "/usr/share/fonts",
+    "~/.fonts",
+]
+
+# 自动字号 (text_metrics.fit_font_size)：从原来的固定字号开始，放不下时按 0.5 磅逐步缩小到 min
+FIT_LINE_SPACING = 1.2   # 行高 / 字号
+AUTOFIT_CONFIG = {
+    'content_body': {
+        'font_name': 'Microsoft YaHei',   # 正文占位符继承主题东亚字体
+        'cn': 14,
+        'en': 12,
+        'min': 9
+    },
+    'summary_cell': {
+        'font_name': 'Microsoft YaHei',
+        'cn': 10,
+        'en': 10,
+        'min': 7,
+        # 表格可以向下撑高到距页面底部该磅数处
+        'bottom_margin': 20
+    }
+}
+
 ANNOTATION_CONFIG = {
     'title_cn': {
         'top': 3016459,
@@ -184,7 +404,9 @@ ANNOTATION_CONFIG = {
         'width': 1616075,
         'height': 226581,
         'font_name': '华文细黑',
-        'size': 14
+        'size': 14,
+        # 标题以 left_base + width/2 为中心 (比框窄时居中，比框宽时向两侧展开)
+        'align': 'center'
     },
     'title_en': {
         'top': 3016459,
@@ -192,7 +414,8 @@ ANNOTATION_CONFIG = {
         'width': 1616075,
         'height': 226581,
         'font_name': '华文细黑',
-        'size': 12
+        'size': 12,
+        'align': 'center'
     },
     'source': {
         'top': 6316663,
@@ -200,7 +423,10 @@ ANNOTATION_CONFIG = {
         'width': 1285875,
         'height': 266700,
         'font_name': 'Microsoft YaHei',
-        'size': 9
+        'size': 9,
+        # 资料来源右对齐到 right_edge (EMU)
+        'align': 'right',
+        'right_edge': 7860000
     },
     'contact_info': {
         'left': 381600,
@@ -293,3 +519,19 @@ DISCLAIMER_TEXTS = {
         ]
     }
 }
+
+
+# ==============================================================================
+# 凭据延迟读取
+# ==============================================================================
+
+def __getattr__(name):
+    """config.CLIENT_ID 等凭据：第一次访问时读取并缓存 (清洗子进程、命令行工具导入 config 不需要 streamlit)"""
+    if name not in SECRET_NAMES:
+        raise AttributeError(f"module 'config' has no attribute '{name}'")
+    value = os.environ.get(name)
+    if value is None:
+        import streamlit as st
+        value = st.secrets[name]
+    globals()[name] = value
+    return value
@@ -2,14 +2,18 @@ import json
 import os
 import re
 from bs4 import BeautifulSoup
-import requests
+import http_client
 import shutil
-from datetime import datetime
 from urllib.parse import urlparse
 import time
-import sys
-print(f"Python 版本: {sys.version}")
-print(f"Python 路径: {sys.executable}")
+import hashlib
+import tempfile
+from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
+from article_selection import ArticleSelector, parse_publish_time, get_publish_time_str
+from article_stream import load_selected_articles
+from embedded_images import sniff_image_type
+from article_charts import CHART_TITLE_RE, clean_chart_title, clean_data_source, extract_charts, write_manifest
 """
 This script processes JSON articles to filter and download only the latest dated articles along with their first images.
 
@@ -22,6 +26,7 @@ saves them in dated subfolders under 'input_articles', and downloads the first i
 
 Functions:
 - load_articles(file_path): Loads and returns articles from the specified JSON file.
+  (json_main streams the file via article_stream.load_selected_articles instead.)
 - filter_latest_articles(articles): Filters the list to include only articles from the latest publish date.
 - extract_first_image_url(html_content): Extracts the first image URL from HTML content using regex.
 - download_image(img_url, save_path): Downloads an image from the URL and saves it to the specified path.
@@ -31,6 +36,7 @@ Functions:
 
 函数：
 - load_articles(file_path): 从指定的JSON文件加载并返回文章。
+  (json_main 改用 article_stream.load_selected_articles 流式读取)
 - filter_latest_articles(articles): 筛选列表以仅包含最新发布日期的文章。
 - extract_first_image_url(html_content): 使用正则表达式从HTML内容中提取第一个图片URL。
 - download_image(img_url, save_path): 从URL下载图片并保存到指定路径。
@@ -45,23 +51,13 @@ def load_articles(file_path):
     return data.get("articles", [])
 
 def filter_latest_articles(articles):
-    """过滤出最新的日期的文章"""
-    valid_articles = []
-    for article in articles:
-        publish_time = article.get("metadata", {}).get("audit", {}).get("publishTime", "")
-        if publish_time:
-            try:
-                dt = datetime.strptime(publish_time, "%Y-%m-%dT%H:%M:%SZ")
-                valid_articles.append((dt, article))
-            except (ValueError, TypeError):
-                pass
-
-    if valid_articles:
-        latest_dt = max(dt for dt, _ in valid_articles)
-        latest_articles = [article for dt, article in valid_articles if dt.date() == latest_dt.date()]
-    else:
-        latest_articles = []
-    return latest_articles
+    """过滤出最新的日期的文章 (每篇文章只解析一次时间)"""
+    parsed = [(parse_publish_time(get_publish_time_str(article)), article) for article in articles]
+    valid = [(dt, article) for dt, article in parsed if dt is not None]
+    if not valid:
+        return []
+    latest_date = max(dt for dt, _ in valid).date()
+    return [article for dt, article in valid if dt.date() == latest_date]
 
 
 def extract_first_image_url(html_content):
@@ -70,17 +66,17 @@ def extract_first_image_url(html_content):
         from bs4 import BeautifulSoup
         soup = BeautifulSoup(html_content, 'html.parser')
         
-        # 查找第一个img标签
-        img_tag = soup.find('img')
-        if img_tag and img_tag.get('src'):
-            return img_tag.get('src')
+        # 查找第一个远程图片 (data: 内联图片由 embedded_images 在本地解码)
+        for img_tag in soup.find_all('img'):
+            src = (img_tag.get('src') or '').strip()
+            if src and not src.lower().startswith('data:'):
+                return src
         
         # 如果没有找到img标签，尝试查找其他可能的图片标签
         # 例如，有些文章可能使用div的背景图片
         div_with_bg = soup.find(style=re.compile(r'background.*?url'))
         if div_with_bg:
             # 提取url
-            import re
             match = re.search(r'url\(["\']?(.*?)["\']?\)', div_with_bg.get('style', ''))
             if match:
                 return match.group(1)
@@ -89,24 +85,79 @@ def extract_first_image_url(html_content):
     except Exception as e:
         print(f"提取图片URL时出错: {e}")
         return None
-def download_image(img_url, save_path):
-    """下载图片并保存到指定路径"""
+# 流式下载图片时每次读取的块大小 (字节)
+IMAGE_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# 识别格式需要的文件头长度
+IMAGE_MAGIC_LEN = 16
+
+def download_image(img_url, save_path, max_bytes=None):
+    """
+    流式下载图片并保存
+    - 分块写入同目录的临时文件，内存占用与图片大小无关；超过大小上限立即中止
+    - 按文件头识别真实格式 (不信任 URL 后缀)，HTML 错误页等非图片内容直接拒绝
+    - 只读文件头确认 Pillow 能识别 (格式、尺寸)，坏图片在渲染前就被排除
+    :param save_path: 目标路径，扩展名按真实格式修正
+    :param max_bytes: 大小上限，默认 config.IMAGE_DOWNLOAD_MAX_BYTES
+    :return: 实际保存的路径，失败返回 None
+    """
+    import config
+    
+    max_bytes = max_bytes or config.IMAGE_DOWNLOAD_MAX_BYTES
+    tmp_path = None
     try:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
         
-        response = requests.get(img_url, headers=headers, timeout=10)
-        response.raise_for_status()
+        with http_client.get(img_url, headers=headers, timeout=(5, 10), stream=True) as response:
+            response.raise_for_status()
+            length = response.headers.get('Content-Length', '')
+            if length.isdigit() and int(length) > max_bytes:
+                raise ValueError(f"图片过大 ({int(length) / 1024 / 1024:.1f} MB，上限 {max_bytes / 1024 / 1024:.0f} MB)")
+            
+            fd, tmp_path = tempfile.mkstemp(prefix='.download_', dir=os.path.dirname(save_path) or '.')
+            size = 0
+            head = b''
+            img_ext = None
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=IMAGE_DOWNLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"图片超过大小上限 {max_bytes / 1024 / 1024:.0f} MB，已中止")
+                    # 收到足够的文件头后立即识别格式，不是图片就不再继续下载
+                    if img_ext is None and len(head) < IMAGE_MAGIC_LEN:
+                        head += chunk[:IMAGE_MAGIC_LEN - len(head)]
+                        if len(head) >= IMAGE_MAGIC_LEN:
+                            img_ext = _sniff_or_raise(head, response)
+                    f.write(chunk)
+            if img_ext is None:
+                img_ext = _sniff_or_raise(head, response)
         
-        with open(save_path, 'wb') as f:
-            f.write(response.content)
+        # 只解析文件头：确认格式可识别、尺寸有效 (超大像素会触发 Pillow 的解压炸弹保护)
+        with Image.open(tmp_path) as img:
+            width, height = img.size
+        if not width or not height:
+            raise ValueError("图片尺寸无效")
         
-        print(f"    图片下载成功: {save_path}")
-        return True
+        final_path = os.path.splitext(save_path)[0] + img_ext
+        os.replace(tmp_path, final_path)
+        tmp_path = None
+        print(f"    图片下载成功: {final_path} ({size / 1024:.0f} KB, {width}x{height})")
+        return final_path
     except Exception as e:
         print(f"    图片下载失败: {e}")
-        return False
+        return None
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _sniff_or_raise(head, response):
+    """按文件头识别格式，不是支持的图片时抛出 ValueError"""
+    img_ext = sniff_image_type(head)
+    if img_ext is None:
+        content_type = response.headers.get('Content-Type', '未知')
+        raise ValueError(f"内容不是支持的图片格式 (Content-Type: {content_type})")
+    return img_ext
 
 def get_file_extension(url):
     """从URL获取文件扩展名"""
@@ -125,130 +176,96 @@ def extract_first_data_source(html_content):
         for p in soup.find_all('p'):
             text = p.get_text() # 不先 strip，保留内部结构
             if '资料来源' in text:
-                # 核心修复：使用 split 切割字符串
-                # parts[-1] 表示取“资料来源”后面的那一部分
-                parts = text.split('资料来源')
-                
-                if len(parts) > 1:
-                    # 取最后一部分（即冒号和来源名）
-                    target_part = parts[-1]
-                    
-                    # 清理冒号（中文和英文）以及前后的空白
-                    source = target_part.replace('：', '').replace(':', '').strip()
-                    
-                    # 二次清洗：如果来源后面紧接着还有换行符（虽然HTML里通常在末尾），只取第一行
-                    # 这一步是为了防止“资料来源”出现在段落中间的情况
-                    if '\n' in source:
-                        source = source.split('\n')[0].strip()
-                    
-                    # 验证长度：真正的资料来源通常很短（例如 "Bloomberg"），如果提取出太长的文字说明切分错了
-                    if source and len(source) < 50:
-                        return source
+                source = clean_data_source(text)
+                if source:
+                    return source
         return None
     except Exception as e:
         print(f"提取出错: {e}")
         return None
-def remove_unpaired_brackets(text):
-    stack = []
-    indices_to_remove = set()
-
-    # 第一遍，标记未配对的括号
-    for i, char in enumerate(text):
-        if char == '('or char == '（':
-            stack.append(i)
-        elif char == ')'or char == '）':
-            if stack:
-                stack.pop()
-            else:
-                indices_to_remove.add(i)
-    # 栈中剩余的左括号也是未配对的
-    indices_to_remove.update(stack)
-
-    # 构建新的字符串，跳过要删除的索引
-    new_text = ''.join([char for i, char in enumerate(text) if i not in indices_to_remove])
-    return new_text
 def extract_chart_title(html_content):
-    """提取图表标题 (仅提取冒号后面的内容)"""
+    """提取第一个图表标题 (仅提取冒号后面的内容)"""
     try:
-        import re
-        # 1. 前面的 '图表...[：:]' 不放在括号里，作为匹配条件但不提取。
-        # 2. \s* 允许冒号后面可能有空格。
-        # 3. ([^<>\n]+) 是唯一的捕获组，只提取冒号后面的文字。
-        pattern = r'图表\s*[0-9一二三四五六七八九十]+\s*[：:]\s*([^<>\n]+)'
-        
-        match = re.search(pattern, html_content)
+        match = CHART_TITLE_RE.search(html_content)
         if match:
-            # match.group(1) 只对应上面的 ([^<>\n]+) 部分
-            title = match.group(1).strip()
-            
-            # 再次清洗，防止包含多余的 HTML 符号或空格
-            title = re.sub(r'<[^>]+>', '', title)
-            title = remove_unpaired_brackets(title)
-            return title.strip()
-            
+            return clean_chart_title(match.group(1))
     except Exception as e:
         print(f"提取图表标题出错: {e}")
     return None
 
-def process_article_by_category(articles, output_dir, articles_dir, images_dir):
-    """按分类处理文章：每个分类只保存最新的文章"""
-    
-    # 1. 按分类分组文章
-    categories_dict = {}
+def process_article_by_category(articles, output_dir, articles_dir, images_dir, policy=None, selected_articles=None):
+    """
+    按分类处理文章：每个分类只保存最新的文章
+    :param policy: SelectionPolicy (每类最新 N 篇 / 日期窗口 / 指定文章)，默认每个分类最新一篇
+    :param selected_articles: 已经选好的条目 (json_main 已完成选择时传入)，传入时跳过选择
+    """
     
-    for idx, article in enumerate(articles):
-        # 获取文章分类
-        cio_tags = article.get("metadata", {}).get("classifications", {}).get("tagNames", {}).get("cio", [])
-        
-        if cio_tags:
-            # 优先取带 'cio_category_' 的标签
-            categories = [tag.replace("cio_category_", "") for tag in cio_tags if "cio_category_" in tag]
-            if not categories:
-                categories = cio_tags
-            category_name = categories[0] if categories else "未分类"
-        else:
-            category_name = "未分类"
-        
-        # 获取发布时间
-        publish_time = article.get("metadata", {}).get("audit", {}).get("publishTime", "")
-        
-        # 按分类分组
-        if category_name not in categories_dict:
-            categories_dict[category_name] = []
-        
-        categories_dict[category_name].append({
-            "article": article,
-            "publish_time": publish_time,
-            "original_index": idx
-        })
+    # 1-2. 一次遍历按分类选出最新的文章
+    if selected_articles is None:
+        selected_articles = ArticleSelector(policy).add_all(articles).selected()
     
-    print(f"共发现 {len(categories_dict)} 个分类")
+    # 3. 保存每篇选中的文章，再下载图片
+    image_tasks = save_selected_articles(selected_articles, articles_dir, images_dir, output_dir)
+    download_article_images(image_tasks, output_dir)
     
-    # 2. 每个分类选择最新的一篇文章
-    selected_articles = []
+    return selected_articles
+
+def _image_file_name(safe_category, chart, img_ext):
+    """
+    按分类、图表标题和资料来源生成图片文件名
+    同一篇文章的第 2 张起在分类后加序号 (美股-2_标题_来源.png)，标题/来源仍可按 '_' 切分
+    """
+    suffix = "" if chart["index"] == 1 else f"-{chart['index']}"
     
-    for category_name, articles_list in categories_dict.items():
-        # 按发布时间排序（最新的在前）
-        articles_list.sort(
-            key=lambda x: x["publish_time"] if x["publish_time"] else "", 
-            reverse=True
-        )
+    # 1. 清洗标题
+    raw_title = chart["title"]
+    if raw_title:
+        # 清洗标题中的非法字符 (Windows文件名不支持 \ / : * ? " < > |)
+        safe_title = re.sub(r'[<>:"/\\|?*_]', '_', raw_title).replace('_', ' ').strip()
+        print(f"  图表 {chart['index']} 标题: {safe_title}")
+    else:
+        safe_title = "无标题" # 给一个默认值，防止 NoneType 报错
         
-        # 取最新的文章
-        if articles_list:
-            selected_article = articles_list[0]
-            selected_articles.append({
-                "article": selected_article["article"],
-                "category": category_name,
-                "publish_time": selected_article["publish_time"],
-                "original_index": selected_article["original_index"]
-            })
-            print(f"分类 '{category_name}': 选择了第 {selected_article['original_index']+1} 篇文章（最新）")
+    # 2. 资料来源
+    data_source = chart["source"]
+    print(f"  资料来源: {data_source}" if data_source else "  未找到资料来源")
+
+    # 3. 生成文件名逻辑
+    # 情况 A: 特殊分类 - 个股投资观点更新 (强制来源 bloomberg，标题 NONE)
+    if safe_category == "个股投资观点更新":
+        return f"资金流{suffix}_NONE_彭博{img_ext}"
+
+    # 情况 B: 特殊分类 - 精选类 (只保留分类名)
+    if safe_category in ["个股精选", "个债精选"]:
+        return f"{safe_category}{suffix}{img_ext}"
+
+    # 情况 C: 普通分类 (包含 标题 和 来源)
+    if data_source:
+        # 清洗来源中的非法字符
+        safe_data_source = re.sub(r'[<>:"/\\|?*_]', '_', data_source).replace('_', ' ').strip()
+        return f"{safe_category}{suffix}_{safe_title}_{safe_data_source}{img_ext}"
+    # 只有标题，没有来源
+    return f"{safe_category}{suffix}_{safe_title}{img_ext}"
+
+def save_selected_articles(selected_articles, articles_dir, images_dir, output_dir=None):
+    """
+    保存选中的文章 JSON，并提取每篇文章中的所有图表 (article_charts.extract_charts)
+    - 内嵌的图表 (o:gfxdata / data: URI) 直接解码写入图片目录
+    - 远程图片只确定下载地址和文件名 (由 download_article_images 并发下载)
+    :param output_dir: 文章 JSON 中图片路径的相对基准，默认 articles_dir 的上级目录
+    :return: 图表任务列表 [{"img_url", "img_file_path", "file_path", "article", "chart", "done"}]，
+             内嵌图表 img_url 为 None 且 done 为 True
+    """
+    from workspace import atomic_write_bytes
+    
+    output_dir = output_dir or os.path.dirname(articles_dir)
+    for item in selected_articles:
+        print(f"分类 '{item['category']}': 选择了第 {item['original_index']+1} 篇文章（最新）")
     
-    print(f"总共选择了 {len(selected_articles)} 篇文章（每个分类一篇）")
+    print(f"总共选择了 {len(selected_articles)} 篇文章")
     print()
     
-    # 3. 处理每篇选中的文章
+    image_tasks = []
     for idx, item in enumerate(selected_articles):
         article = item["article"]
         category_name = item["category"]
@@ -261,14 +278,8 @@ def process_article_by_category(articles, output_dir, articles_dir, images_dir):
         print(f"  分类: {category_name}")
         
         # 格式化发布时间
-        if publish_time:
-            try:
-                dt = datetime.strptime(publish_time, "%Y-%m-%dT%H:%M:%SZ")
-                formatted_time = dt.strftime("%Y%m%d")
-            except (ValueError, TypeError):
-                formatted_time = "无日期"
-        else:
-            formatted_time = "无日期"
+        dt = parse_publish_time(publish_time)
+        formatted_time = dt.strftime("%Y%m%d") if dt else "无日期"
         
         print(f"  发布时间: {formatted_time}")
         
@@ -278,131 +289,447 @@ def process_article_by_category(articles, output_dir, articles_dir, images_dir):
         # 生成文件名：类别_发布时间.json
         file_name = f"{safe_category}_{formatted_time}.json"
         file_path = os.path.join(articles_dir, file_name)
+        # 每类保留多篇 (latest_n > 1) 时同一天可能重名：类别_发布时间-2.json
+        dup = 2
+        while os.path.exists(file_path):
+            file_name = f"{safe_category}_{formatted_time}-{dup}.json"
+            file_path = os.path.join(articles_dir, file_name)
+            dup += 1
         
-        # 保存完整文章
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(article, f, ensure_ascii=False, indent=2)
-        
-        print(f"  文章已保存: {file_name}")
-        
-        # 提取并下载第一张图片
+        # 提取所有图表：内嵌的直接解码保存，远程的登记下载任务
         html_content = article.get("contents", {}).get("zh_CN", "")
-        # print(html_content)
-        if html_content:
-            img_url = extract_first_image_url(html_content)
-            
-            if img_url:
-                print(f"  发现图片: {img_url[:80]}..." if len(img_url) > 80 else f"  发现图片: {img_url}")
-                
-                # 1. 获取扩展名
+        charts = extract_charts(html_content) if html_content else []
+        local_paths = []
+        for chart in charts:
+            if chart["embedded"]:
+                data, img_ext, kind = chart["embedded"]
+                print(f"  图表 {chart['index']}: 内嵌图片 ({kind}, {len(data) / 1024:.0f} KB)，本地解码")
+            else:
+                img_url = chart["img_url"]
+                kind = "remote"
                 img_ext = get_file_extension(img_url)
-                
-                # 2. 提取并清洗标题
-                raw_title = extract_chart_title(html_content)
-                if raw_title:
-                    # 清洗标题中的非法字符 (Windows文件名不支持 \ / : * ? " < > |)
-                    safe_title = re.sub(r'[<>:"/\\|?*]', '_', raw_title)
-                    print(f"  提取到标题: {safe_title}")
-                else:
-                    safe_title = "无标题" # 给一个默认值，防止 NoneType 报错
-                    
-                # 3. 提取资料来源
-                data_source = extract_first_data_source(html_content)
-                print(f"  资料来源: {data_source}" if data_source else "  未找到资料来源")
-
-                # 4. 生成文件名逻辑
-                # 情况 A: 特殊分类 - 个股投资观点更新 (强制来源 bloomberg，标题 NONE)
-                if safe_category == "个股投资观点更新":
-                    safe_category ="资金流"
-                    safe_data_source = "彭博"
-                    final_title = "NONE"
-                    img_file_name = f"{safe_category}_{final_title}_{safe_data_source}{img_ext}"
-
-                # 情况 B: 特殊分类 - 精选类 (只保留分类名)
-                elif safe_category in ["个股精选", "个债精选"]:
-                    # 注意：后续代码有 while os.path.exists 检测，重复时会自动变为 个股精选_1.jpg
-                    img_file_name = f"{safe_category}{img_ext}"
-
-                # 情况 C: 普通分类 (包含 标题 和 来源)
-                else:
-                    # 清洗来源中的非法字符
-                    if data_source:
-                        safe_data_source = re.sub(r'[<>:"/\\|?*]', '_', data_source)
-                        img_file_name = f"{safe_category}_{safe_title}_{safe_data_source}{img_ext}"
-                    else:
-                        # 只有标题，没有来源
-                        img_file_name = f"{safe_category}_{safe_title}{img_ext}"
-
-                # 创建图片文件名（使用分类名而不是索引）
+                print(f"  图表 {chart['index']}: {img_url[:80]}..." if len(img_url) > 80 else f"  图表 {chart['index']}: {img_url}")
+            
+            img_file_path = os.path.join(images_dir, _image_file_name(safe_category, chart, img_ext))
+            if chart["embedded"]:
+                atomic_write_bytes(img_file_path, data)
+                local_paths.append(os.path.relpath(img_file_path, output_dir))
+            image_tasks.append({
+                "img_url": chart["img_url"],
+                "img_file_path": img_file_path,
+                "file_path": file_path,
+                "article": article,
+                "chart": {
+                    "group": safe_category,
+                    "article_file": file_name,
+                    "index": chart["index"],
+                    "title": chart["title"],
+                    "source": chart["source"],
+                    "origin": kind,
+                },
+                "done": bool(chart["embedded"]),
+            })
+        if not html_content:
+            print("  无HTML内容")
+        elif not charts:
+            print("  未发现图片")
         
-                img_file_path = os.path.join(images_dir, img_file_name)
-                
-                
-                # 下载图片
-                download_image(img_url, img_file_path)
-                
-                # 在JSON文件中记录图片路径
-                if os.path.exists(img_file_path):
-                    article["local_image_path"] = os.path.relpath(img_file_path, output_dir)
-                    with open(file_path, "w", encoding="utf-8") as f:
-                        json.dump(article, f, ensure_ascii=False, indent=2)
-                else:
-                    print("  未发现图片")
-            else:
-                print("  无HTML内容")
+        # 保存完整文章 (内嵌图片已记录路径；远程图片下载后再更新)
+        if local_paths:
+            article["local_image_path"] = local_paths[0]
+            article["local_image_paths"] = local_paths
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(article, f, ensure_ascii=False, indent=2)
         
+        print(f"  文章已保存: {file_name}")
+    
+    n_remote = sum(1 for task in image_tasks if task["img_url"])
+    print(f"共 {len(image_tasks)} 张图表：内嵌图片本地解码 {len(image_tasks) - n_remote} 张，需要远程下载 {n_remote} 张")
+    return image_tasks
 
-        
-        # 避免请求过快，添加短暂延迟
-        time.sleep(0.5)
+def download_article_images(image_tasks, output_dir, cancel_event=None, images_dir=None):
+    """
+    并发下载 save_selected_articles 登记的远程图片，在文章 JSON 中记录图片路径，并写入图片清单
+    文章 JSON 原子替换：流水线中清洗阶段可能同时在读取这些文件
+    :param cancel_event: threading.Event，被设置时不再开始新的下载
+    :param images_dir: 图片清单所在目录，默认取第一个任务的图片目录
+    :return: 成功下载的图片数
+    """
+    import config
+    from concurrent.futures import ThreadPoolExecutor
+    from workspace import atomic_write_json
     
-    return selected_articles
-def json_main(json_path):
-    # 1. 读取原始 JSON
-    articles = load_articles(json_path)
+    def fetch(task):
+        if cancel_event is not None and cancel_event.is_set():
+            return task, None
+        return task, download_image(task["img_url"], task["img_file_path"])
     
-    # 2. 过滤出最新的日期的文章
-    latest_articles = filter_latest_articles(articles)
+    # 下载图片 (并发数有上限，代替原来每张之间的固定延迟；扩展名可能按真实格式修正)
+    remote = [task for task in image_tasks if task["img_url"]]
+    downloaded = 0
+    if remote:
+        with ThreadPoolExecutor(max_workers=config.IMAGE_DOWNLOAD_WORKERS) as pool:
+            for task, img_file_path in pool.map(fetch, remote):
+                if img_file_path:
+                    task["img_file_path"] = img_file_path
+                    task["done"] = True
+                    downloaded += 1
+    if cancel_event is not None and cancel_event.is_set():
+        print("  图片下载已取消")
     
-    if not latest_articles:
-        print("没有找到有效的文章")
+    # 在JSON文件中记录图片路径 (每篇文章写一次)
+    by_article = {}
+    for task in image_tasks:
+        by_article.setdefault(task["file_path"], []).append(task)
+    for file_path, tasks in by_article.items():
+        if not any(task["img_url"] and task["done"] for task in tasks):
+            continue
+        tasks.sort(key=lambda t: t["chart"]["index"])
+        paths = [os.path.relpath(task["img_file_path"], output_dir) for task in tasks if task["done"]]
+        article = tasks[0]["article"]
+        article["local_image_path"] = paths[0]
+        article["local_image_paths"] = paths
+        atomic_write_json(file_path, article, indent=2)
+    
+    # 图片清单：按文章记录图表顺序
+    if image_tasks:
+        entries = [dict(task["chart"], file=os.path.basename(task["img_file_path"]))
+                   for task in image_tasks if task["done"]]
+        write_manifest(images_dir or os.path.dirname(image_tasks[0]["img_file_path"]), entries)
+    
+    return downloaded
+# ================= 文章清洗 (供 AI 读取) =================
+
+# 待清洗文件少于该数量时不启动进程池
+CLEAN_PARALLEL_MIN_FILES = 16
+
+def clean_html_content(html_content):
+    """
+    清洗 HTML 文本：去除 img、VML图表乱码（Base64）和资料来源段落
+    """
+    if not isinstance(html_content, str):
+        return html_content
+
+    # === 1. 强力清除包含巨长 Base64 编码的 VML 标签（解决你的乱码核心问题！） ===
+    # 匹配类似 <v:rect ... o:gfxdata="UEsDB..."> 的标签
+    vml_pattern = re.compile(r'<v:[^>]*o:gfxdata=[^>]*>', re.IGNORECASE | re.DOTALL)
+    
+    # 匹配成对的 <v:...> ... </v:...> 隐藏图表标签
+    vml_pair_pattern = re.compile(r'<v:[^>]*>.*?</v:[^>]*>', re.IGNORECASE | re.DOTALL)
+
+    # 匹配可能裸露在外的超长 Base64 字符串（连续超过500个字符的乱码）
+    base64_pattern = re.compile(r'[A-Za-z0-9+/=]{500,}')
+
+    # === 2. 你原有的清洗规则 ===
+    # 匹配 < img ...> 标签 
+    img_pattern = re.compile(r'<img[^>]+>', re.IGNORECASE | re.DOTALL)
+    
+    # 匹配包含 "资料来源" 的 <p> 段落
+    source_pattern = re.compile(r'<p[^>]*>.*?资料来源.*?</p\s*>', re.IGNORECASE | re.DOTALL)
+
+    # === 3. 执行替换 ===
+    content = vml_pattern.sub('', html_content)         # 删带有 gfxdata 的乱码标签
+    content = vml_pair_pattern.sub('', content)         # 删 VML 图表对
+    content = base64_pattern.sub('', content)           # 删裸露的超长乱码
+    content = img_pattern.sub('', content)              # 删普通图片
+    content = source_pattern.sub('', content)           # 删资料来源
+    
+    # 选做：如果你希望传给 AI 的内容更干净，甚至可以把剩下的所有普通 HTML 标签也顺手干掉
+    # content = re.sub(r'<.*?>', '', content)
+
+    # 4. 清理多余的空白符和换行
+    content = re.sub(r'\n\s*\n', '\n\n', content)
+    content = content.replace('&nbsp;', ' ')
+
+    return content.strip()
+
+def process_single_file(file_path, save_path):
+    """
+    读取单个文件，清洗数据，并保存
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        # 构建清洗后的字典结构，只保留需要的字段
+        cleaned_data = {
+            "titles": data.get("titles", {}),
+            "summaries": data.get("summaries", {}),
+            "contents": {} # 稍后填充
+        }
+
+        # 处理 contents
+        raw_contents = data.get("contents", {})
+        if raw_contents:
+            for lang, html_text in raw_contents.items():
+                cleaned_data["contents"][lang] = clean_html_content(html_text)
+
+        # 保存到输出文件夹
+        with open(save_path, 'w', encoding='utf-8') as f:
+            json.dump(cleaned_data, f, ensure_ascii=False, indent=2)
+            
+        print(f"[成功] 已清洗: {os.path.basename(file_path)}")
+        return True
+
+    except json.JSONDecodeError:
+        print(f"[跳过] 文件格式错误 (非标准JSON): {os.path.basename(file_path)}")
+    except Exception as e:
+        print(f"[错误] 处理 {os.path.basename(file_path)} 时出错: {str(e)}")
+    return False
+
+def _clean_worker(task):
+    """进程池工作函数：task = (源文件, 输出文件)，返回 (输出文件, 是否成功)"""
+    file_path, save_path = task
+    return save_path, process_single_file(file_path, save_path)
+
+def _resolve_workers(workers, n_files):
+    """
+    决定并行进程数
+    workers=None 时：文件少于 CLEAN_PARALLEL_MIN_FILES 走单进程 (进程池启动开销比清洗本身还大)，
+    否则使用全部 CPU 核心
+    """
+    if workers is None:
+        if n_files < CLEAN_PARALLEL_MIN_FILES:
+            return 1
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, n_files))
+
+def _file_sha256(file_path):
+    """计算源文件内容的 sha256 (按块读取)"""
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_clean_manifest(folder, manifest_name):
+    """读取清洗目录的清单 {文件名: 源文件 sha256}，不存在时返回空字典"""
+    manifest_path = os.path.join(folder, manifest_name)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("files", {})
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+def prune_clean_cache(cache_dir, max_age_days):
+    """删除长时间未被命中的清洗缓存"""
+    if not os.path.isdir(cache_dir):
+        return 0
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if not name.endswith('.json'):
+            continue
+        # 缓存目录由多个进程共享，文件可能刚被另一个进程清理
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    if removed:
+        print(f"已清理 {removed} 个过期的清洗缓存")
+    return removed
+
+def batch_process(INPUT_FOLDER, OUTPUT_FOLDER, cache_dir=None, workers=None, progress_callback=None, chunksize=None):
+    """
+    增量清洗：
+    - 以源文件内容的 sha256 为键，内容未变的文件直接跳过或从缓存复制
+    - 输出目录中不属于本次输入的旧文件会被删除
+    - 写入清单 (CLEAN_MANIFEST_NAME)，AIPromptRunner 只加载清单中的文件
+    需要真正清洗的文件按块分发到进程池并行处理 (回填几周文章时 clean_html_content 是 CPU 瓶颈)
+    :param cache_dir: 跨运行共享的清洗缓存目录 (<sha256>.json)，默认 config.CLEANED_DIR
+    :param workers: 进程数，None 为自动，1 为单进程
+    :param progress_callback: progress_callback(已完成数, 总数)，可直接驱动 Streamlit 进度条
+    :param chunksize: 每次分发给一个进程的文件数，None 时按 文件数 / (进程数*4) 计算
+    :return: 统计 dict (cleaned / cached / skipped / failed / workers / seconds / files_per_sec)
+    """
+    # 在函数内导入：spawn 模式下子进程重新导入本模块时，不触发 config 的初始化
+    import config
+    from workspace import atomic_write_bytes, atomic_write_json
+
+    cache_dir = cache_dir or config.CLEANED_DIR
+
+    # 1. 检查输入文件夹是否存在
+    if not os.path.exists(INPUT_FOLDER):
+        print(f"错误：找不到输入文件夹 '{INPUT_FOLDER}'，请先创建并放入 JSON 文件。")
         return
 
-    # 检查并删除现有的input_articles文件夹
-    if os.path.exists("input_articles"):
-        shutil.rmtree("input_articles")
-        print("已删除现有的input_articles文件夹")
+    # 2. 如果输出文件夹不存在，自动创建
+    if not os.path.exists(OUTPUT_FOLDER):
+        os.makedirs(OUTPUT_FOLDER)
+        print(f"已创建输出文件夹: {OUTPUT_FOLDER}")
+    os.makedirs(cache_dir, exist_ok=True)
 
-    # 获取最新日期
-    publish_time = latest_articles[0].get("metadata", {}).get("audit", {}).get("publishTime", "")
-    if publish_time:
+    # 3. 获取所有 JSON 文件
+    files = [f for f in os.listdir(INPUT_FOLDER) if f.lower().endswith('.json')]
+    
+    if not files:
+        print(f"在 '{INPUT_FOLDER}' 中没有找到 .json 文件。")
+        return
+
+    print(f"开始处理，共发现 {len(files)} 个文件...\n")
+    start = time.perf_counter()
+    total = len(files)
+    done = 0
+
+    def report_progress(n=1):
+        nonlocal done
+        done += n
+        if progress_callback:
+            progress_callback(done, total)
+
+    def read_cache(cache_path):
+        """读取缓存条目，不存在 (或刚被另一个进程清理) 时返回 None"""
         try:
-            dt = datetime.strptime(publish_time, "%Y-%m-%dT%H:%M:%SZ")
-            date_str = dt.strftime("%Y%m%d")
-        except (ValueError, TypeError):
-            date_str = "unknown"
+            with open(cache_path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    # 4. 按内容哈希增量处理，先处理命中的文件，剩下的放入待清洗列表
+    # 缓存目录被所有会话、HTTP 服务和预生成调度器共享：条目一律原子写入，读者不会看到写了一半的文件
+    old_manifest = load_clean_manifest(OUTPUT_FOLDER, config.CLEAN_MANIFEST_NAME)
+    new_manifest = {}
+    pending = []  # (文件名, 哈希, 源路径, 输出路径)
+    skipped = cached = cleaned = failed = 0
+
+    for filename in files:
+        input_path = os.path.join(INPUT_FOLDER, filename)
+        output_path = os.path.join(OUTPUT_FOLDER, filename)
+        digest = _file_sha256(input_path)
+        cache_path = os.path.join(cache_dir, f"{digest}.json")
+        unchanged = old_manifest.get(filename) == digest and os.path.exists(output_path)
+        cached_data = None if unchanged else read_cache(cache_path)
+
+        if unchanged:
+            skipped += 1
+        elif cached_data is not None:
+            atomic_write_bytes(output_path, cached_data)
+            try:
+                os.utime(cache_path)  # 刷新命中时间，避免被过期清理
+            except FileNotFoundError:
+                pass
+            cached += 1
+            print(f"[缓存] 内容未变: {filename}")
+        else:
+            pending.append((filename, digest, input_path, output_path))
+            continue
+        new_manifest[filename] = digest
+        report_progress()
+
+    # 5. 清洗剩下的文件 (单进程或进程池)
+    n_workers = _resolve_workers(workers, len(pending))
+    tasks = [(input_path, output_path) for _, _, input_path, output_path in pending]
+    by_output = {output_path: (filename, digest) for filename, digest, _, output_path in pending}
+
+    def collect(results):
+        nonlocal cleaned, failed
+        for output_path, ok in results:
+            filename, digest = by_output[output_path]
+            if ok:
+                with open(output_path, 'rb') as f:
+                    atomic_write_bytes(os.path.join(cache_dir, f"{digest}.json"), f.read())
+                new_manifest[filename] = digest
+                cleaned += 1
+            else:
+                failed += 1  # 清洗失败的文件不写入清单
+            report_progress()
+
+    if n_workers > 1:
+        chunksize = chunksize or max(1, len(tasks) // (n_workers * 4))
+        print(f"使用 {n_workers} 个进程并行清洗 {len(tasks)} 个文件 (chunksize={chunksize})")
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            collect(executor.map(_clean_worker, tasks, chunksize=chunksize))
     else:
-        date_str = "unknown"
+        collect(map(_clean_worker, tasks))
+
+    # 6. 删除不属于本次输入的旧文件
+    for filename in os.listdir(OUTPUT_FOLDER):
+        if filename.lower().endswith('.json') and filename != config.CLEAN_MANIFEST_NAME and filename not in new_manifest:
+            os.remove(os.path.join(OUTPUT_FOLDER, filename))
+            print(f"[移除] 过期文件: {filename}")
+
+    atomic_write_json(os.path.join(OUTPUT_FOLDER, config.CLEAN_MANIFEST_NAME), {"files": new_manifest})
+    prune_clean_cache(cache_dir, config.CLEAN_CACHE_MAX_AGE_DAYS)
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "cleaned": cleaned,
+        "cached": cached,
+        "skipped": skipped,
+        "failed": failed,
+        "workers": n_workers,
+        "seconds": elapsed,
+        "files_per_sec": total / elapsed if elapsed > 0 else 0.0,
+    }
+    print(f"\n全部完成！清洗 {cleaned} 个，缓存命中 {cached} 个，跳过 {skipped} 个，失败 {failed} 个"
+          f" ({stats['files_per_sec']:.1f} 文件/秒)。清洗后的文件在 '{OUTPUT_FOLDER}' 文件夹中。")
+    return stats
+
+def prepare_articles(json_path, output_root="input_articles", policy=None):
+    """
+    读取原始 JSON、选择文章并保存到输出目录，图片只确定下载任务不下载
+    (流水线中图片下载和清洗/LLM 可以并行)
+    :return: dict (output_dir / articles_dir / images_dir / selected / image_tasks)，没有有效文章时返回 None
+    """
+    # 1-2. 流式读取原始 JSON，一次遍历按分类选出文章，同时得到最新的发布时间
+    #      未被选中的文章不会解析 contents，内存只与选中的文章有关
+    selector = load_selected_articles(json_path, policy)
+    
+    if selector.latest_time is None:
+        print("没有找到有效的文章")
+        return None
+
+    # 检查并删除现有的输出文件夹
+    if os.path.exists(output_root):
+        shutil.rmtree(output_root)
+        print(f"已删除现有的文件夹: {output_root}")
+
+    # 获取最新日期
+    date_str = selector.latest_time.strftime("%Y%m%d")
 
     # 3. 输出目录，以日期命名
-    output_dir = os.path.join("input_articles", date_str)
+    output_dir = os.path.join(output_root, date_str)
     articles_dir = os.path.join(output_dir, f"articles_{date_str}")
     images_dir = os.path.join(output_dir, f"images_{date_str}")
     os.makedirs(articles_dir, exist_ok=True)
     os.makedirs(images_dir, exist_ok=True)
     
-    selected_articles = process_article_by_category(
-        articles, output_dir, articles_dir, images_dir
-    )
+    selected_articles = selector.selected()
+    image_tasks = save_selected_articles(selected_articles, articles_dir, images_dir, output_dir)
+    return {
+        "output_dir": output_dir,
+        "articles_dir": articles_dir,
+        "images_dir": images_dir,
+        "selected": selected_articles,
+        "image_tasks": image_tasks,
+    }
+
+def json_main(json_path, output_root="input_articles", policy=None):
+    """
+    :param json_path: 原始文章 JSON
+    :param output_root: 输出根目录，多用户运行时传入各自工作目录下的 input_articles
+    :param policy: 文章选择策略 (SelectionPolicy)，默认每个分类取全部历史中最新的一篇
+    """
+    prepared = prepare_articles(json_path, output_root, policy)
+    if not prepared:
+        return
+    download_article_images(prepared["image_tasks"], prepared["output_dir"])
+    
+    selected_articles = prepared["selected"]
     print("处理完成！")
     print(f"共处理了 {len(selected_articles)} 个分类的文章")
-    print(f"输出目录: {output_dir}")
-    print(f"文章保存目录: {articles_dir}")
-    print(f"图片保存目录: {images_dir}")
+    print(f"输出目录: {prepared['output_dir']}")
+    print(f"文章保存目录: {prepared['articles_dir']}")
+    print(f"图片保存目录: {prepared['images_dir']}")
     # 显示分类统计
     categories = [item["category"] for item in selected_articles]
     print(f"\n处理的分类列表: {', '.join(categories)}")
-    return articles_dir, images_dir
+    return prepared["articles_dir"], prepared["images_dir"]
 
 if __name__ == "__main__":
 
@@ -0,0 +1,137 @@
+import io
+import re
+import html
+import base64
+import binascii
+import logging
+import zipfile
+from urllib.parse import unquote_to_bytes
+
+from PIL import Image
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+文章内嵌图表的本地解码
+
+从 Word 粘贴的 CIO 文章常常已经带着图表本身：
+- VML 标签的 o:gfxdata 属性：base64 编码的 OOXML 包 (zip)，图片在包内的 */media/ 目录
+- <img src="data:image/png;base64,..."> 内联图片
+以前清洗时直接删掉这些内容，只按 <img src> 去远程下载。现在选文章时按文档顺序
+解码第一张内嵌图片直接写入图片目录；没有可用的内嵌图片时才回退到远程下载。
+"""
+
+# 按文件头识别图片格式 (python-pptx 可直接插入的位图格式)
+IMAGE_MAGIC = [
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+    (b"BM", ".bmp"),
+]
+
+# 按文档顺序匹配 gfxdata 属性和 data: URI (属性值可能是单引号或双引号)
+_EMBED_RE = re.compile(
+    r'''o:gfxdata\s*=\s*(["'])(?P<gfx>.*?)\1'''
+    r'''|src\s*=\s*(["'])\s*(?P<uri>data:.*?)\3''',
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def _max_bytes():
+    """内嵌图片大小上限 (调用时读取 config：清洗进程导入 construct_json 时不需要加载配置)"""
+    import config
+    return config.EMBEDDED_IMAGE_MAX_BYTES
+
+
+def sniff_image_type(data):
+    """按文件头返回扩展名 (.png/.jpg/.gif/.bmp)，不是支持的图片格式时返回 None"""
+    for magic, ext in IMAGE_MAGIC:
+        if data.startswith(magic):
+            return ext
+    return None
+
+
+def verify_image(data):
+    """
+    文件头识别 + Pillow 校验图片结构
+    :return: 扩展名，数据不是完整可用的图片时返回 None
+    """
+    ext = sniff_image_type(data)
+    if ext is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.verify()
+    except Exception as e:
+        logging.debug(f"图片校验失败: {e}")
+        return None
+    return ext
+
+
+def decode_data_uri(uri):
+    """
+    解析 data: URI
+    :return: 字节内容，格式错误时返回 None
+    """
+    header, sep, payload = html.unescape(uri).partition(",")
+    if not sep:
+        return None
+    try:
+        if header.lower().endswith(";base64"):
+            return base64.b64decode(re.sub(r"\s+", "", payload))
+        return unquote_to_bytes(payload)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def decode_gfxdata(value):
+    """
+    解码 o:gfxdata (base64 的 OOXML 包)，取 media 目录中最大的一张可用图片
+    纯矢量图表 (只有 chart XML，没有位图) 返回 None
+    :return: (字节内容, 扩展名) 或 None
+    """
+    try:
+        raw = base64.b64decode(re.sub(r"\s+", "", html.unescape(value)))
+        with zipfile.ZipFile(io.BytesIO(raw)) as package:
+            media = [info for info in package.infolist()
+                     if "/media/" in f"/{info.filename}" and 0 < info.file_size <= _max_bytes()]
+            for info in sorted(media, key=lambda i: i.file_size, reverse=True):
+                data = package.read(info)
+                ext = verify_image(data)
+                if ext:
+                    return data, ext
+    except (binascii.Error, ValueError, zipfile.BadZipFile) as e:
+        logging.debug(f"gfxdata 解码失败: {e}")
+    return None
+
+
+def decode_embedded(kind, value):
+    """
+    解码一处内嵌图片
+    :param kind: 'gfxdata' (o:gfxdata 属性值) 或 'data-uri'
+    :return: (字节内容, 扩展名) 或 None
+    """
+    if kind == "gfxdata":
+        return decode_gfxdata(value)
+    data = decode_data_uri(value)
+    if data and len(data) <= _max_bytes():
+        ext = verify_image(data)
+        if ext:
+            return data, ext
+    return None
+
+
+def iter_embedded_images(html_content):
+    """
+    按文档顺序逐个解码内嵌图片 (惰性：只解码到调用方停止为止)
+    :return: 生成 (字节内容, 扩展名, 来源类型 'gfxdata' / 'data-uri')
+    """
+    if not html_content:
+        return
+    for m in _EMBED_RE.finditer(html_content):
+        kind, value = ("gfxdata", m.group("gfx")) if m.group("gfx") is not None else ("data-uri", m.group("uri"))
+        decoded = decode_embedded(kind, value)
+        if decoded:
+            yield decoded[0], decoded[1], kind
@@ -0,0 +1,226 @@
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ConnectTimeoutError
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+共享 HTTP 客户端
+
+所有对外请求 (认证、LLM 任务提交/轮询、文章抓取、图片下载) 都经过这里：
+- 每个 host 一个 requests.Session (连接池 + keep-alive)，后续请求复用已建立的 TLS 连接
+- 默认连接/读取超时，避免没有 timeout 的请求无限挂起
+- 按状态类别重试 (指数退避 + 抖动，遵守 Retry-After)
+- 记录每次请求的耗时、状态码、重试次数，可按 host 汇总
+配置项见 config.py 的 HTTP_* (本模块被 config 导入，因此在函数内读取配置)
+"""
+
+# 重试策略 (按状态类别)
+RETRY_ON_STATUS = {429, 500, 502, 503, 504}   # 限流和网关/服务端临时错误
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+_DEFAULTS = {
+    "HTTP_CONNECT_TIMEOUT": 5,
+    "HTTP_READ_TIMEOUT": 60,
+    "HTTP_POOL_MAXSIZE": 10,
+    "HTTP_MAX_RETRIES": 3,
+    "HTTP_BACKOFF_FACTOR": 0.5,
+    "HTTP_BACKOFF_MAX": 30,
+}
+METRICS_HISTORY = 500
+
+_lock = threading.Lock()
+_sessions = {}           # (scheme, host) -> Session
+_sessions_pid = os.getpid()
+_metrics = deque(maxlen=METRICS_HISTORY)
+
+
+def _setting(name):
+    """读取 config 中的 HTTP_* 配置；config 尚在初始化或未定义时使用默认值"""
+    import config
+    return getattr(config, name, _DEFAULTS[name])
+
+
+def default_timeout():
+    return (_setting("HTTP_CONNECT_TIMEOUT"), _setting("HTTP_READ_TIMEOUT"))
+
+
+def get_session(url):
+    """返回 url 所在 host 的共享 Session (fork 出的子进程会重新建立连接池)"""
+    global _sessions_pid
+    parsed = urlparse(url)
+    key = (parsed.scheme, parsed.netloc)
+    with _lock:
+        if _sessions_pid != os.getpid():
+            # 连接不能跨进程共享
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            pool_size = _setting("HTTP_POOL_MAXSIZE")
+            # 重试由本模块处理 (需要按状态类别决定并记录每次尝试)，适配器本身不重试
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            session.mount(f"{parsed.scheme}://", adapter)
+            _sessions[key] = session
+        return session
+
+
+def close_sessions():
+    """关闭所有连接池"""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+class RetryPolicy:
+    """
+    :param max_retries: 最多重试次数 (不含第一次请求)
+    :param retry_unsafe: 非幂等请求 (POST) 遇到可重试状态码、读超时或连接中断也重试；
+                         连接阶段失败 (请求未发出) 对所有方法都会重试
+    :param status: 需要重试的状态码
+    """
+    def __init__(self, max_retries=None, backoff_factor=None, retry_unsafe=False, status=None):
+        self.max_retries = _setting("HTTP_MAX_RETRIES") if max_retries is None else max_retries
+        self.backoff_factor = _setting("HTTP_BACKOFF_FACTOR") if backoff_factor is None else backoff_factor
+        self.retry_unsafe = retry_unsafe
+        self.status = RETRY_ON_STATUS if status is None else set(status)
+
+    def backoff(self, attempt, response=None):
+        """第 attempt 次重试前的等待秒数，优先使用服务端的 Retry-After"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), _setting("HTTP_BACKOFF_MAX"))
+        delay = self.backoff_factor * (2 ** attempt)
+        return min(delay * (0.5 + random.random()), _setting("HTTP_BACKOFF_MAX"))
+
+    def should_retry_status(self, method, status_code):
+        if status_code not in self.status:
+            return False
+        return method in IDEMPOTENT_METHODS or self.retry_unsafe
+
+    def should_retry_error(self, method, error):
+        if is_connect_error(error):
+            return True
+        # 请求发出后的失败 (读超时、RemoteDisconnected、连接被重置)：服务端可能已经处理，
+        # 非幂等请求重试可能重复提交 (例如同一个 LLM 任务提交两次)
+        if isinstance(error, (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError)):
+            return method in IDEMPOTENT_METHODS or self.retry_unsafe
+        return False
+
+
+def is_connect_error(error):
+    """连接阶段的失败 (连接超时、拒绝连接、DNS 解析失败)：请求没有发出，任何方法重试都安全"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError):
+        return False
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+def _record(method, url, status, elapsed, attempts, error=None):
+    parsed = urlparse(url)
+    entry = {
+        "time": time.time(),
+        "host": parsed.netloc,
+        "method": method,
+        "path": parsed.path,
+        "status": status,
+        "elapsed": elapsed,
+        "attempts": attempts,
+        "error": error,
+    }
+    with _lock:
+        _metrics.append(entry)
+    logging.debug(f"HTTP {method} {parsed.netloc}{parsed.path} -> {status or error} "
+                  f"({elapsed * 1000:.0f} ms, 尝试 {attempts} 次)")
+
+
+def request(method, url, timeout=None, retry=None, **kwargs):
+    """
+    发送请求 (参数同 requests.request)
+    :param timeout: 秒数或 (连接, 读取)，默认 config.HTTP_CONNECT_TIMEOUT / HTTP_READ_TIMEOUT
+    :param retry: RetryPolicy，默认按方法决定 (GET 重试，POST 只在连接失败时重试)
+    :return: requests.Response；重试用尽后返回最后一次的响应，或抛出最后一次的异常
+    """
+    method = method.upper()
+    timeout = default_timeout() if timeout is None else timeout
+    retry = retry or RetryPolicy()
+    session = get_session(url)
+
+    start = time.perf_counter()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except requests.exceptions.RequestException as e:
+            if attempt <= retry.max_retries and retry.should_retry_error(method, e):
+                delay = retry.backoff(attempt - 1)
+                logging.warning(f"HTTP {method} {url} 异常: {type(e).__name__}，{delay:.1f} 秒后重试 ({attempt}/{retry.max_retries})")
+                time.sleep(delay)
+                continue
+            _record(method, url, None, time.perf_counter() - start, attempt, type(e).__name__)
+            raise
+
+        if attempt <= retry.max_retries and retry.should_retry_status(method, response.status_code):
+            delay = retry.backoff(attempt - 1, response)
+            logging.warning(f"HTTP {method} {url} 返回 {response.status_code}，{delay:.1f} 秒后重试 ({attempt}/{retry.max_retries})")
+            response.close()
+            time.sleep(delay)
+            continue
+
+        _record(method, url, response.status_code, time.perf_counter() - start, attempt)
+        return response
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+# ================= 指标 =================
+
+def get_metrics(host=None):
+    """最近的请求记录 (最多 METRICS_HISTORY 条)"""
+    with _lock:
+        items = list(_metrics)
+    return [m for m in items if host is None or m["host"] == host]
+
+
+def metrics_summary():
+    """按 host 汇总：请求数、失败数、重试次数、平均/最大耗时"""
+    summary = {}
+    for m in get_metrics():
+        s = summary.setdefault(m["host"], {"requests": 0, "errors": 0, "retries": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        s["requests"] += 1
+        s["retries"] += m["attempts"] - 1
+        if m["error"] or (m["status"] and m["status"] >= 400):
+            s["errors"] += 1
+        s["total_seconds"] += m["elapsed"]
+        s["max_seconds"] = max(s["max_seconds"], m["elapsed"])
+    for s in summary.values():
+        s["avg_seconds"] = s["total_seconds"] / s["requests"]
+    return summary
+
+
+def reset_metrics():
+    with _lock:
+        _metrics.clear()
@@ -0,0 +1,140 @@
+import copy
+import logging
+from datetime import datetime
+
+# 引入配置文件
+import config
+from report_archive import ReportArchive, read_source_articles, standard_asset_name
+from workspace import atomic_write_json
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+增量生成：只把有新文章的资产交给 LLM
+
+每个资产类别选中的文章 (按内容指纹) 与上一次归档的同语言报告比较：
+- 未变化的资产直接沿用上一期的 content_slides 条目和 executive_summary 行
+- 有变化的资产才发送给 LLM，LLM 延迟和成本与实际变化量成正比
+"""
+
+
+class IncrementalPlan:
+    def __init__(self, changed, unchanged, previous=None):
+        self.changed = changed          # 需要重新生成的资产 (中文标准名)
+        self.unchanged = unchanged      # 沿用上一期的资产
+        self.previous = previous        # ReportArchive.get_report 的结果
+
+    @property
+    def previous_report(self):
+        return self.previous["report"] if self.previous else None
+
+
+def _slides_by_asset(report):
+    return {standard_asset_name(s.get("title", "")): s for s in report.get("content_slides", [])}
+
+
+def _rows_by_asset(report):
+    summary = report.get("executive_summary", {})
+    cols = summary.get("columns", [])
+    if not cols:
+        return {}
+    return {standard_asset_name(r.get(cols[0], "")): r for r in summary.get("rows", [])}
+
+
+def plan_incremental(articles_dir, language, archive=None):
+    """
+    比较本次各资产的文章指纹与上一期归档
+    :param articles_dir: json_main 输出的文章目录
+    :return: IncrementalPlan；没有上一期报告时所有资产都视为有变化
+    """
+    archive = archive or ReportArchive()
+    previous = archive.latest_report(language=language)
+    if not previous:
+        logging.info("没有可沿用的历史报告，全部资产重新生成")
+        return IncrementalPlan(list(config.ASSET_CLASSES), [])
+
+    current_hashes = {standard_asset_name(s["category"]): s["content_hash"] for s in read_source_articles(articles_dir)}
+    previous_hashes = {standard_asset_name(s["category"]): s["content_hash"] for s in previous["sources"]}
+    previous_slides = _slides_by_asset(previous["report"])
+    previous_rows = _rows_by_asset(previous["report"])
+
+    changed, unchanged = [], []
+    for asset in config.ASSET_CLASSES:
+        same_article = current_hashes.get(asset) == previous_hashes.get(asset)
+        if same_article and asset in previous_slides and asset in previous_rows:
+            unchanged.append(asset)
+        else:
+            changed.append(asset)
+
+    logging.info(f"增量计划: 重新生成 {changed or '无'}，沿用 {unchanged or '无'} (上一期 run_id={previous['run_id']})")
+    return IncrementalPlan(changed, unchanged, previous)
+
+
+def merge_reports(previous_report, partial_report, plan):
+    """
+    按上一期报告的资产顺序合并：有变化的资产取本次结果，其余沿用上一期
+    本次结果缺少某个有变化的资产时退回上一期内容 (如果有)
+    """
+    merged = copy.deepcopy(previous_report)
+    partial_report = partial_report or {}
+
+    new_slides = _slides_by_asset(partial_report)
+    new_rows = _rows_by_asset(partial_report)
+    summary = merged.setdefault("executive_summary", {})
+    cols = summary.get("columns", [])
+
+    # 本次结果的列名可能与上一期不同 (语言一致时通常相同)，按位置对齐
+    new_cols = partial_report.get("executive_summary", {}).get("columns", [])
+
+    def realign(row):
+        if new_cols == cols:
+            return row
+        return {c: row.get(nc, "") for c, nc in zip(cols, new_cols)}
+
+    slides, rows = [], []
+    seen = set()
+    for slide in merged.get("content_slides", []):
+        asset = standard_asset_name(slide.get("title", ""))
+        seen.add(asset)
+        slides.append(new_slides.get(asset, slide) if asset in plan.changed else slide)
+    for asset, slide in new_slides.items():
+        if asset not in seen:
+            slides.append(slide)
+
+    seen = set()
+    for row in summary.get("rows", []):
+        asset = standard_asset_name(row.get(cols[0], "")) if cols else ""
+        seen.add(asset)
+        rows.append(realign(new_rows[asset]) if asset in plan.changed and asset in new_rows else row)
+    for asset, row in new_rows.items():
+        if asset not in seen:
+            rows.append(realign(row))
+
+    merged["content_slides"] = slides
+    summary["rows"] = rows
+    merged.setdefault("document", {})["date"] = datetime.now().strftime("%Y-%m-%d")
+    return merged
+
+
+def run_incremental(runner, cleaned_dir, articles_dir, report_path, archive=None):
+    """
+    增量版的 AIPromptRunner.run
+    :return: (完整报告 JSON, IncrementalPlan)，失败时报告为 None
+    """
+    plan = plan_incremental(articles_dir, runner.language, archive)
+
+    if not plan.unchanged:
+        return runner.run(specific_folder=cleaned_dir, report_path=report_path), plan
+
+    if not plan.changed:
+        logging.info("所有资产的文章都没有变化，直接沿用上一期报告，跳过 LLM")
+        final_json = merge_reports(plan.previous_report, {}, plan)
+    else:
+        partial = runner.run(specific_folder=cleaned_dir, report_path=report_path, only_assets=plan.changed)
+        if not partial:
+            return None, plan
+        final_json = merge_reports(plan.previous_report, partial, plan)
+
+    atomic_write_json(report_path, final_json)
+    return final_json, plan
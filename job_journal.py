@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import hashlib
+import logging
+
+# 引入配置文件
+import config
+from workspace import atomic_write_json
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+LLM 任务日志 (Job Journal)
+
+poll_job 等待期间 Streamlit 重跑、浏览器重连或进程重启，job_id 随之丢失，只能重新提交再等一整轮。
+这里把每个已提交的任务记录到本地 (config.LLM_JOURNAL_DIR，每个任务一个 JSON 文件，原子写入)：
+
+    {"job_id", "model", "prompt_hash", "stage", "submitted_at", "updated_at", "response"}
+
+stage:
+    submitted   已提交，等待结果
+    completed   已拿到结果 (response 为原始响应)，报告尚未保存
+    consumed    报告已保存，结果不再需要
+    failed      服务端返回失败
+    invalid     结果无法解析或校验未通过，不再使用 (重新请求需要新的任务)
+
+prompt_hash 由服务地址和完整 Prompt 计算 (不含模型名)。重新生成时同样的文章得到同样的 Prompt，
+AIPromptRunner 按 (prompt_hash, 模型) 找到未完成的任务：completed 直接使用结果，submitted 接着轮询。
+修复/重试的请求不使用日志中的任务 (要的正是一份不同的结果)。
+超过 config.LLM_JOURNAL_MAX_AGE_HOURS 的记录不再使用，并在下次写入时清理。
+"""
+
+ACTIVE_STAGES = ("submitted", "completed")
+
+
+def prompt_hash(api_base, payload):
+    """任务内容指纹：服务地址 + Prompt (模型名不计入，同一 Prompt 可在多个模型上各有一个任务)"""
+    prompt = payload.get("input", {}).get("parameter", {}).get("prompt", "")
+    digest = hashlib.sha256()
+    digest.update(api_base.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class JobJournal:
+    def __init__(self, journal_dir=None, max_age_hours=None):
+        self.dir = journal_dir or config.LLM_JOURNAL_DIR
+        self.max_age = (config.LLM_JOURNAL_MAX_AGE_HOURS if max_age_hours is None else max_age_hours) * 3600
+
+    def _path(self, job_id):
+        safe = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in str(job_id))
+        return os.path.join(self.dir, f"{safe}.json")
+
+    def _read(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return None
+
+    def _write(self, entry):
+        entry["updated_at"] = time.time()
+        try:
+            atomic_write_json(self._path(entry["job_id"]), entry, indent=None)
+        except OSError as e:
+            logging.warning(f"任务日志写入失败 ({entry['job_id']}): {e}")
+
+    def _entries(self):
+        if not os.path.isdir(self.dir):
+            return []
+        entries = []
+        for name in os.listdir(self.dir):
+            if name.endswith(".json"):
+                entry = self._read(os.path.join(self.dir, name))
+                if entry:
+                    entries.append(entry)
+        return entries
+
+    def _expired(self, entry, now=None):
+        return (now or time.time()) - entry.get("submitted_at", 0) > self.max_age
+
+    # ================= 1. 记录 =================
+
+    def record_submitted(self, job_id, model, prompt_hash):
+        self.prune()
+        now = time.time()
+        self._write({
+            "job_id": job_id, "model": model, "prompt_hash": prompt_hash,
+            "stage": "submitted", "submitted_at": now, "response": None,
+        })
+
+    def _update(self, job_id, **fields):
+        entry = self._read(self._path(job_id))
+        if entry is None:
+            return
+        entry.update(fields)
+        self._write(entry)
+
+    def record_completed(self, job_id, response):
+        """拿到结果：保存原始响应，进程在保存报告前退出时下次可以直接使用"""
+        self._update(job_id, stage="completed", response=response)
+
+    def record_failed(self, job_id):
+        self._update(job_id, stage="failed", response=None)
+
+    def record_invalid(self, job_id):
+        """结果无法使用：之后的点击和修复重试都不应再拿到这份结果"""
+        self._update(job_id, stage="invalid", response=None)
+
+    def mark_consumed(self, job_ids):
+        """报告已保存：这些任务的结果不再需要 (释放响应内容)"""
+        for job_id in job_ids:
+            self._update(job_id, stage="consumed", response=None)
+
+    # ================= 2. 恢复 =================
+
+    def find(self, prompt_hash, model):
+        """
+        同一 Prompt 在该模型上未完成的任务：优先已有结果的，其次最近提交的
+        :return: 日志记录，没有时返回 None
+        """
+        now = time.time()
+        candidates = [
+            e for e in self._entries()
+            if e.get("prompt_hash") == prompt_hash and e.get("model") == model
+            and e.get("stage") in ACTIVE_STAGES and not self._expired(e, now)
+        ]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda e: (e["stage"] == "completed", e.get("submitted_at", 0)))
+
+    def pending(self):
+        """所有未完成的任务 (界面提示用)"""
+        now = time.time()
+        return [e for e in self._entries() if e.get("stage") in ACTIVE_STAGES and not self._expired(e, now)]
+
+    def prune(self):
+        """删除过期的记录"""
+        now = time.time()
+        for entry in self._entries():
+            if self._expired(entry, now):
+                try:
+                    os.remove(self._path(entry["job_id"]))
+                except OSError:
+                    pass
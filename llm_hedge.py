@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from functools import lru_cache
+
+# 引入配置文件
+import config
+from workspace import atomic_write_json
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+LLM 对冲请求 (hedged request)
+
+只用一个预览模型时，排队慢就只能干等 (poll_job 最多 10 分钟)。对冲模式：
+1. 先向主模型提交任务
+2. 超过对冲延迟仍没有结果 (或主模型失败/输出无效) 时，向备用模型再提交一份
+3. 第一份通过 JSON/Schema 校验的结果胜出，其余任务停止轮询 (服务端任务不再理会)
+
+对冲延迟取主模型历史耗时的百分位 (config.LLM_HEDGE_PERCENTILE)：大部分请求不会触发备用模型，
+只有落在慢尾部的请求才多花一份调用。各模型的耗时和结果统计保存在 config.LLM_STATS_PATH。
+
+被对冲取消的慢请求只知道 "至少用了这么久"，记为删失样本 (censored)，百分位用 Kaplan-Meier 估计；
+直接从任务日志取结果或重新接上的任务没有完整的耗时，不计入样本。否则样本偏快，对冲延迟越来越短。
+"""
+
+
+class LatencyStats:
+    """各模型的耗时样本 (最近 config.LLM_STATS_MAX_SAMPLES 个，含删失样本) 和结果计数，跨运行持久化"""
+
+    OUTCOMES = ("ok", "invalid", "failed", "abandoned")
+
+    def __init__(self, path=None, max_samples=None):
+        self.path = path if path is not None else config.LLM_STATS_PATH
+        self.max_samples = max_samples or config.LLM_STATS_MAX_SAMPLES
+        self._lock = threading.Lock()
+        self.models = self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                models = json.load(f).get("models", {})
+        except (json.JSONDecodeError, OSError) as e:
+            logging.warning(f"LLM 耗时统计读取失败，重新开始统计: {e}")
+            return {}
+        for entry in models.values():
+            # 旧格式只有完成的耗时 latencies
+            if "samples" not in entry:
+                entry["samples"] = [[t, 0] for t in entry.pop("latencies", [])]
+        return models
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            atomic_write_json(self.path, {"models": self.models}, indent=2)
+        except OSError as e:
+            logging.warning(f"LLM 耗时统计保存失败: {e}")
+
+    def _model(self, model):
+        entry = self.models.setdefault(model, {"samples": [], "wins": 0})
+        for outcome in self.OUTCOMES:
+            entry.setdefault(outcome, 0)
+        return entry
+
+    def record(self, model, outcome, seconds=None):
+        """
+        记录一次请求
+        :param outcome: ok (通过校验) / invalid (有输出但未通过) / failed (提交或轮询失败) / abandoned (被对冲取消)
+        :param seconds: 从提交到拿到输出的耗时 (ok / invalid)，或被取消前已等待的时间 (abandoned，删失样本)；
+                        None 表示不计入样本
+        """
+        with self._lock:
+            entry = self._model(model)
+            entry[outcome] += 1
+            if seconds is not None and outcome in ("ok", "invalid", "abandoned"):
+                # [耗时, 是否删失]
+                sample = [round(seconds, 2), int(outcome == "abandoned")]
+                entry["samples"] = (entry["samples"] + [sample])[-self.max_samples:]
+            self._save()
+
+    def record_win(self, model):
+        with self._lock:
+            self._model(model)["wins"] += 1
+            self._save()
+
+    def percentile(self, model, pct):
+        """
+        耗时的第 pct 百分位 (Kaplan-Meier 估计，删失样本只说明耗时不少于该值)
+        样本不足 config.LLM_HEDGE_MIN_SAMPLES 时返回 None；
+        删失样本太多、估计不到该百分位时返回最大的样本值 (真实值只会更大)
+        """
+        with self._lock:
+            # 同一时刻完成的样本排在删失样本之前
+            samples = sorted(tuple(sample) for sample in self.models.get(model, {}).get("samples", []))
+        if len(samples) < config.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        survival, at_risk = 1.0, len(samples)
+        for seconds, censored in samples:
+            if not censored:
+                survival *= 1 - 1 / at_risk
+                if 1 - survival >= pct / 100 - 1e-9:
+                    return seconds
+            at_risk -= 1
+        return samples[-1][0]
+
+    def hedge_delay(self, model):
+        """主模型的对冲延迟 (秒)：历史耗时百分位，样本不足时使用默认值"""
+        value = self.percentile(model, config.LLM_HEDGE_PERCENTILE)
+        if value is None:
+            return config.LLM_HEDGE_DEFAULT_DELAY
+        return max(config.LLM_HEDGE_MIN_DELAY, value)
+
+    def summary(self):
+        lines = []
+        with self._lock:
+            items = sorted(self.models.items())
+        for model, entry in items:
+            samples = sorted(t for t, censored in entry.get("samples", []) if not censored)
+            n_censored = len(entry.get("samples", [])) - len(samples)
+            if samples:
+                p50 = samples[len(samples) // 2]
+                p90 = samples[min(len(samples) - 1, int(len(samples) * 0.9))]
+                timing = f"p50 {p50:.0f}s / p90 {p90:.0f}s ({len(samples)} 个样本，另有 {n_censored} 个被取消)"
+            else:
+                timing = "暂无耗时样本"
+            counts = " ".join(f"{k}={entry.get(k, 0)}" for k in self.OUTCOMES)
+            lines.append(f"  {model}: {timing}，{counts} wins={entry.get('wins', 0)}")
+        return "[LLM 模型统计]\n" + "\n".join(lines) if lines else "[LLM 模型统计] 暂无数据"
+
+
+@lru_cache(maxsize=1)
+def shared_stats():
+    """进程内共享的统计 (同时运行的多个 AIPromptRunner 写同一份数据)"""
+    return LatencyStats()
+
+
+def run_hedged(attempt, models, hedge_delay, is_valid, cancel_event=None, stats=None, untimed=None):
+    """
+    按顺序对冲调用多个模型，第一份通过校验的结果胜出
+    :param attempt: attempt(model, cancel_event) -> 结果或 None，在线程中执行；cancel_event 被设置时应尽快返回
+    :param models: [主模型, 备用模型, ...]
+    :param hedge_delay: 上一个模型超过该秒数没有结果时启动下一个
+    :param is_valid: is_valid(结果) -> 是否通过校验
+    :param cancel_event: 外部取消信号 (流水线取消)
+    :param stats: LatencyStats，记录各模型的耗时和结果
+    :param untimed: set，attempt 把结果并非本次完整等待得到的模型 (任务日志中的结果、重新接上的任务) 加入其中，
+                    这些模型只记录结果，不计入耗时样本
+    :return: (结果, 模型)；都未通过校验时返回最早拿到的输出，全部失败时返回 (None, None)
+    """
+    results = queue.Queue()
+    attempts = {}            # model -> 该次调用的取消信号
+    started = {}             # model -> 启动时间
+    untimed = untimed if untimed is not None else set()
+    finished = set()
+    next_index = 0
+
+    def launch():
+        nonlocal next_index, hedge_at
+        model = models[next_index]
+        next_index += 1
+        event = threading.Event()
+        attempts[model] = event
+        start = started[model] = time.perf_counter()
+
+        def work():
+            try:
+                result = attempt(model, event)
+            except Exception as e:
+                logging.error(f"[对冲] {model} 调用异常: {e}")
+                result = None
+            results.put((model, result, time.perf_counter() - start))
+
+        threading.Thread(target=work, name=f"llm-{model}", daemon=True).start()
+        hedge_at = time.perf_counter() + hedge_delay
+        logging.info(f"[对冲] 提交到模型 {model}")
+
+    hedge_at = None
+    launch()
+    winner, fallback = None, None
+    while len(finished) < len(attempts):
+        if cancel_event is not None and cancel_event.is_set():
+            logging.warning("[对冲] 已取消")
+            break
+        now = time.perf_counter()
+        can_hedge = next_index < len(models)
+        timeout = min(1.0, max(0.0, hedge_at - now)) if can_hedge else 1.0
+        try:
+            model, result, elapsed = results.get(timeout=timeout)
+        except queue.Empty:
+            if can_hedge and time.perf_counter() >= hedge_at:
+                logging.warning(f"[对冲] {hedge_delay:.0f} 秒内没有结果，启动备用模型 {models[next_index]}")
+                launch()
+            continue
+
+        finished.add(model)
+        valid = result is not None and is_valid(result)
+        if stats is not None:
+            outcome = "ok" if valid else ("invalid" if result is not None else "failed")
+            timed = result is not None and model not in untimed
+            stats.record(model, outcome, elapsed if timed else None)
+        logging.info(f"[对冲] {model} 返回 ({elapsed:.1f}s): {'通过校验' if valid else '无效' if result is not None else '失败'}")
+        if valid:
+            winner = (result, model)
+            break
+        if fallback is None and result is not None:
+            fallback = (result, model)
+        # 失败或无效：不必等对冲延迟，立即启动下一个模型
+        if next_index < len(models):
+            launch()
+
+    # 其余任务停止轮询；已等待的时间作为删失样本 (该模型至少需要这么久)
+    now = time.perf_counter()
+    for model, event in attempts.items():
+        event.set()
+        if model not in finished and stats is not None:
+            stats.record(model, "abandoned", None if model in untimed else now - started[model])
+    if winner and stats is not None:
+        stats.record_win(winner[1])
+        if len(attempts) > 1:
+            logging.info(f"[对冲] 胜出模型: {winner[1]}")
+    return winner or fallback or (None, None)
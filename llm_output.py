@@ -0,0 +1,317 @@
+import re
+import json
+import logging
+
+from jsonschema import Draft7Validator
+
+# 引入配置文件
+import config
+from report_archive import standard_asset_name
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+LLM 输出解析：校验 + 修复 + 定位无效部分
+
+原来的做法是去掉 Markdown 标记、截取第一个 { 到最后一个 }，json.loads 失败就整份丢弃。
+这里分三步：
+1. 修复常见错误后再解析：多余的逗号、字符串中未转义的引号、输出被截断 (补齐引号和括号)
+2. 整体仍无法解析时，逐个抢救顶层部分 (document / executive_summary / content_slides)
+3. 用 JSON Schema 和资产覆盖检查找出无效的部分，AIPromptRunner 只针对这些部分重新请求
+"""
+
+SECTIONS = ["document", "executive_summary", "content_slides"]
+
+REPORT_SCHEMA = {
+    "type": "object",
+    "required": SECTIONS,
+    "properties": {
+        "document": {
+            "type": "object",
+            "required": ["title"],
+            "properties": {
+                "title": {"type": "string"},
+                "author": {"type": "string"},
+                "date": {"type": "string"},
+            },
+        },
+        "executive_summary": {
+            "type": "object",
+            "required": ["columns", "rows"],
+            "properties": {
+                "columns": {"type": "array", "items": {"type": "string"}, "minItems": 2},
+                "rows": {"type": "array", "items": {"type": "object"}, "minItems": 1},
+            },
+        },
+        "content_slides": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["title", "bullets"],
+                "properties": {
+                    "title": {"type": "string", "minLength": 1},
+                    "bullets": {"type": "array", "items": {"type": "string"}, "minItems": 1},
+                },
+            },
+        },
+    },
+}
+
+_validator = Draft7Validator(REPORT_SCHEMA)
+_decoder = json.JSONDecoder(strict=False)  # 允许字符串中出现原始换行
+
+
+class Problem:
+    """
+    一处无效内容：section 为顶层部分，asset 为 content_slides 中的具体资产 (中文标准名)
+    soft 为 True 表示结构有效、只是缺少资产，重新请求后仍缺失也可以使用
+    """
+    def __init__(self, section, message, asset=None, soft=False):
+        self.section = section
+        self.message = message
+        self.asset = asset
+        self.soft = soft
+
+    def __repr__(self):
+        where = f"{self.section}[{self.asset}]" if self.asset else self.section
+        return f"{where}: {self.message}"
+
+
+class ParseResult:
+    def __init__(self, data, problems, repaired=False):
+        self.data = data              # 解析出的 dict (可能不完整)，完全无法解析时为 None
+        self.problems = problems      # [Problem]
+        self.repaired = repaired      # 是否经过文本修复
+
+    @property
+    def ok(self):
+        return self.data is not None and not self.problems
+
+    @property
+    def invalid_sections(self):
+        """有问题的顶层部分 (按 SECTIONS 顺序)"""
+        bad = {p.section for p in self.problems}
+        return [s for s in SECTIONS if s in bad]
+
+    @property
+    def invalid_assets(self):
+        """content_slides 中需要重新生成的资产"""
+        return sorted({p.asset for p in self.problems if p.section == "content_slides" and p.asset})
+
+    @property
+    def complete(self):
+        """三个顶层部分都存在 (重新请求用尽后仍有问题时，完整的报告照常使用，与原来的行为一致)"""
+        return isinstance(self.data, dict) and all(section in self.data for section in SECTIONS)
+
+
+# ================= 1. 文本修复 =================
+
+def strip_fences(text):
+    """去掉 Markdown 代码块标记，从第一个 { 开始截取"""
+    text = re.sub(r'```(?:json)?\s*', '', str(text))
+    start = text.find('{')
+    return text[start:] if start != -1 else text
+
+
+def repair_json_text(text):
+    """
+    按字符扫描修复常见错误：
+    - 对象/数组末尾多余的逗号
+    - 字符串中未转义的引号 (引号后面不是 , : } ] 时视为正文中的引号)
+    - 输出被截断：补齐未闭合的字符串和括号，去掉末尾悬空的逗号/键
+    """
+    out = []
+    stack = []
+    in_string = False
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if in_string:
+            if ch == "\\" and i + 1 < n:
+                out.append(text[i:i + 2])
+                i += 2
+                continue
+            if ch == '"':
+                j = i + 1
+                while j < n and text[j] in " \t\r\n":
+                    j += 1
+                if j >= n or text[j] in ",:}]":
+                    in_string = False
+                    out.append(ch)
+                else:
+                    out.append('\\"')
+                i += 1
+                continue
+            out.append(ch)
+        elif ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                break  # 顶层对象结束，忽略之后的多余内容
+        else:
+            out.append(ch)
+        i += 1
+
+    # 截断的输出：补齐字符串和括号
+    if in_string:
+        out.append('"')
+    if stack:
+        _drop_trailing_comma(out)
+        tail = "".join(out).rstrip()
+        if tail.endswith(":"):
+            out.append(" null")
+    while stack:
+        out.append(stack.pop())
+    return "".join(out)
+
+
+def _drop_trailing_comma(out):
+    k = len(out) - 1
+    while k >= 0 and out[k].isspace():
+        k -= 1
+    if k >= 0 and out[k] == ",":
+        del out[k]
+
+
+def _loads(text):
+    obj, _ = _decoder.raw_decode(text)
+    return obj
+
+
+def _salvage_sections(text):
+    """整体无法解析时，分别解析每个顶层部分"""
+    salvaged = {}
+    for section in SECTIONS:
+        m = re.search(rf'"{section}"\s*:\s*', text)
+        if not m:
+            continue
+        for candidate in (text[m.end():], repair_json_text(text[m.end():])):
+            try:
+                salvaged[section] = _loads(candidate)
+                break
+            except json.JSONDecodeError:
+                continue
+    return salvaged
+
+
+# ================= 2. 校验 =================
+
+def _row_asset(row, columns):
+    key = columns[0] if columns else None
+    value = row.get(key) if key else next(iter(row.values()), "")
+    return standard_asset_name(str(value or ""))
+
+
+def validate_report(data, expected_assets=None, sections=None):
+    """
+    :param expected_assets: 报告必须覆盖的资产 (中文标准名)，None 时不检查覆盖
+    :param sections: 只校验这些顶层部分 (针对性重新请求的结果)，默认全部
+    :return: [Problem]
+    """
+    sections = sections or SECTIONS
+    if not isinstance(data, dict):
+        return [Problem(s, "不是 JSON 对象") for s in sections]
+
+    problems = []
+    for error in _validator.iter_errors(data):
+        path = list(error.absolute_path)
+        if not path:
+            # 顶层缺少部分
+            missing = re.findall(r"'(\w+)' is a required property", error.message)
+            for section in missing:
+                if section in sections:
+                    problems.append(Problem(section, "缺失"))
+            continue
+        section = path[0]
+        if section not in sections:
+            continue
+        asset = None
+        if section == "content_slides" and len(path) > 1 and isinstance(path[1], int):
+            slide = data["content_slides"][path[1]]
+            title = slide.get("title", "") if isinstance(slide, dict) else ""
+            asset = standard_asset_name(title) if title else None
+            if asset not in config.ASSET_CLASSES:
+                asset = None  # 无法确定是哪个资产，整个部分重新生成
+        problems.append(Problem(section, f"{'/'.join(map(str, path))}: {error.message}", asset))
+
+    # 资产覆盖检查：整个部分已无效 (需要整体重新生成) 时不必再逐个资产检查
+    broken = {p.section for p in problems if p.asset is None}
+    if expected_assets:
+        if "content_slides" in sections and "content_slides" not in broken:
+            have = {standard_asset_name(s.get("title", "")) for s in data.get("content_slides", [])}
+            for asset in expected_assets:
+                if asset not in have:
+                    problems.append(Problem("content_slides", "缺少该资产的观点页", asset, soft=True))
+        if "executive_summary" in sections and "executive_summary" not in broken:
+            summary = data.get("executive_summary", {})
+            have = {_row_asset(r, summary.get("columns", [])) for r in summary.get("rows", [])}
+            missing = [a for a in expected_assets if a not in have]
+            if missing:
+                problems.append(Problem("executive_summary", f"缺少资产: {'、'.join(missing)}", soft=True))
+    return problems
+
+
+# ================= 3. 对外接口 =================
+
+def parse_report(raw_content, expected_assets=None, sections=None):
+    """
+    解析 LLM 返回的文本
+    :return: ParseResult
+    """
+    text = strip_fences(raw_content)
+    repaired = False
+    try:
+        data = _loads(text)
+    except json.JSONDecodeError as e:
+        logging.warning(f"JSON 解析失败 ({e.msg}, 位置 {e.pos})，尝试修复...")
+        repaired = True
+        try:
+            data = _loads(repair_json_text(text))
+            logging.info("JSON 修复成功")
+        except json.JSONDecodeError:
+            data = _salvage_sections(text)
+            if data:
+                logging.warning(f"整体无法修复，已抢救部分: {list(data)}")
+            else:
+                logging.error("JSON 无法修复")
+                logging.debug(text[:500])
+                return ParseResult(None, [Problem(s, "无法解析") for s in (sections or SECTIONS)], repaired)
+
+    return ParseResult(data, validate_report(data, expected_assets, sections), repaired)
+
+
+def merge_patch(base, patch, result, assets=None):
+    """
+    把针对性重新请求得到的 patch 合并到 base
+    :param assets: 只重新请求了 content_slides 中的这些资产 (AIPromptRunner._repair_assets)：
+                   只替换/补充这些资产的页面，patch 中的其他页面忽略；None 表示各部分整体重新生成，整体替换
+    """
+    merged = dict(base or {})
+    for section in result.invalid_sections:
+        if section not in patch:
+            continue
+        if section == "content_slides" and assets and isinstance(merged.get(section), list):
+            new_slides = {}
+            for slide in patch[section]:
+                asset = standard_asset_name(slide.get("title", "")) if isinstance(slide, dict) else None
+                if asset in assets:
+                    new_slides.setdefault(asset, slide)
+            slides = []
+            for slide in merged[section]:
+                asset = standard_asset_name(slide.get("title", "")) if isinstance(slide, dict) else None
+                slides.append(new_slides.pop(asset, slide) if asset in assets else slide)
+            slides.extend(new_slides.values())
+            merged[section] = slides
+        else:
+            merged[section] = patch[section]
+    return merged
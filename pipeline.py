@@ -0,0 +1,245 @@
+import time
+import asyncio
+import logging
+import threading
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+异步流水线编排 (DAG)
+
+把生成流程拆成带依赖的阶段，依赖满足即开始，没有依赖关系的阶段并行执行：
+
+    fetch → select → images ─────────┐
+                  └→ clean → llm ────┼→ render
+    template (预加载) ───────────────┘
+
+阶段函数本身是同步代码，在线程中执行 (asyncio.to_thread)。
+- 任一阶段失败或超时：取消所有未完成的阶段 (设置各阶段的 cancel_event，轮询/下载循环据此提前退出)
+- cancel(name) 可单独取消某个阶段，依赖它的阶段随之取消
+- report() 给出每个阶段的起止时间、关键路径，以及相对串行执行节省的时间
+"""
+
+
+class StageError(Exception):
+    """阶段失败，message 直接展示给用户"""
+
+
+class PipelineError(Exception):
+    def __init__(self, stage, cause):
+        self.stage = stage
+        self.cause = cause
+        super().__init__(f"阶段 '{stage}' 失败: {cause}")
+
+
+class StageContext:
+    """传给阶段函数的上下文：依赖阶段的结果 + 本阶段的取消信号 + 进度上报"""
+    def __init__(self, pipeline, stage):
+        self.results = pipeline.results
+        self.cancel_event = stage.cancel_event
+        self._pipeline = pipeline
+        self._stage = stage
+
+    def report_progress(self, done, total):
+        """阶段内的进度 (例如已清洗的文件数)，可从阶段线程调用，可直接作为 progress_callback"""
+        self._stage.progress = (done, total)
+        self._pipeline._notify_progress(self._stage)
+
+    def __getitem__(self, name):
+        return self.results[name]
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+
+class Stage:
+    def __init__(self, name, fn, deps=(), timeout=None):
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+        self.timeout = timeout
+        self.cancel_event = threading.Event()
+        self.start = None
+        self.end = None
+        self.status = "pending"   # pending / running / done / failed / cancelled
+        self.progress = None      # (已完成, 总数)，阶段通过 ctx.report_progress 上报
+
+    @property
+    def duration(self):
+        if self.start is None or self.end is None:
+            return 0.0
+        return self.end - self.start
+
+
+class Pipeline:
+    def __init__(self, on_stage_done=None, on_stage_progress=None):
+        """
+        :param on_stage_done: on_stage_done(stage) 在事件循环线程中回调 (可直接更新界面)
+        :param on_stage_progress: on_stage_progress(stage) 阶段上报进度 (stage.progress) 时在事件循环线程中回调
+        """
+        self.stages = {}
+        self.results = {}
+        self.on_stage_done = on_stage_done
+        self.on_stage_progress = on_stage_progress
+        self._tasks = {}
+        self._loop = None
+        self._t0 = None
+        self._wall = None
+
+    def add(self, name, fn, deps=(), timeout=None):
+        """添加阶段：fn(ctx) -> 结果；依赖必须已添加"""
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"阶段 '{name}' 依赖的 '{dep}' 尚未添加")
+        self.stages[name] = Stage(name, fn, deps, timeout)
+        return self
+
+    # ================= 1. 执行 =================
+
+    async def _run_stage(self, stage):
+        try:
+            for dep in stage.deps:
+                await self._tasks[dep]
+        except BaseException:
+            stage.status = "cancelled"
+            raise
+
+        stage.status = "running"
+        stage.start = time.perf_counter() - self._t0
+        logging.info(f"[流水线] 开始: {stage.name}")
+        try:
+            work = asyncio.to_thread(stage.fn, StageContext(self, stage))
+            result = await self._await_with_timeout(stage, work) if stage.timeout else await work
+        except asyncio.CancelledError:
+            stage.cancel_event.set()
+            stage.status = "cancelled"
+            raise
+        except BaseException:
+            stage.status = "failed"
+            raise
+        finally:
+            stage.end = time.perf_counter() - self._t0
+
+        stage.status = "done"
+        self.results[stage.name] = result
+        logging.info(f"[流水线] 完成: {stage.name} ({stage.duration:.2f}s)")
+        if self.on_stage_done:
+            self.on_stage_done(stage)
+        return result
+
+    @staticmethod
+    async def _await_with_timeout(stage, work):
+        """
+        等待阶段完成，超过 stage.timeout 时抛出 StageError
+        不用 asyncio.wait_for：阶段自身抛出的 TimeoutError (socket / concurrent.futures 超时)
+        在 3.11+ 与 asyncio.TimeoutError 是同一个类型，会被误报为阶段超时
+        """
+        task = asyncio.ensure_future(work)
+        try:
+            done, _ = await asyncio.wait({task}, timeout=stage.timeout)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        if not done:
+            task.cancel()
+            stage.cancel_event.set()
+            raise StageError(f"{stage.name} 超时 ({stage.timeout}s)")
+        return task.result()
+
+    async def run_async(self):
+        self._loop = asyncio.get_running_loop()
+        self._t0 = time.perf_counter()
+        # 先创建全部任务，各阶段在第一次挂起后才会去等待依赖的任务
+        self._tasks = {name: asyncio.create_task(self._run_stage(stage), name=name)
+                       for name, stage in self.stages.items()}
+        pending = set(self._tasks.values())
+        failed = False
+        while pending and not failed:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+            failed = any(task.cancelled() or task.exception() is not None for task in done)
+
+        if failed:
+            self._cancel_all()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._wall = time.perf_counter() - self._t0
+        logging.info(self.report())
+        if failed:
+            raise self._first_failure()
+        return self.results
+
+    def _first_failure(self):
+        """最早失败的阶段 (依赖它而被取消的阶段不算)"""
+        failed = [s for s in self.stages.values() if s.status == "failed"]
+        if failed:
+            stage = min(failed, key=lambda s: s.end)
+            task = self._tasks[stage.name]
+            cause = task.exception() if not task.cancelled() else "已取消"
+            return PipelineError(stage.name, cause)
+        cancelled = [s.name for s in self.stages.values() if s.status == "cancelled"]
+        return PipelineError(cancelled[0] if cancelled else "?", "已取消")
+
+    def run(self):
+        """同步入口：执行全部阶段，返回 {阶段名: 结果}；失败时抛出 PipelineError"""
+        return asyncio.run(self.run_async())
+
+    def _notify_progress(self, stage):
+        """阶段线程上报的进度转到事件循环线程回调"""
+        if not self.on_stage_progress or self._loop is None or self._loop.is_closed():
+            return
+
+        def notify():
+            if stage.status == "running":
+                self.on_stage_progress(stage)
+
+        try:
+            self._loop.call_soon_threadsafe(notify)
+        except RuntimeError:
+            pass  # 事件循环已关闭
+
+    # ================= 2. 取消 =================
+
+    def _cancel_all(self):
+        for name, stage in self.stages.items():
+            stage.cancel_event.set()
+            task = self._tasks.get(name)
+            if task is not None and not task.done():
+                task.cancel()
+
+    def cancel(self, name=None):
+        """
+        取消某个阶段 (name=None 时取消全部)，可从其他线程调用
+        正在线程中执行的同步代码无法强制中断，需要检查 ctx.cancel_event 自行退出
+        """
+        names = [name] if name else list(self.stages)
+        for n in names:
+            self.stages[n].cancel_event.set()
+        if self._loop is not None and not self._loop.is_closed():
+            for n in names:
+                task = self._tasks.get(n)
+                if task is not None:
+                    self._loop.call_soon_threadsafe(task.cancel)
+
+    # ================= 3. 耗时报告 =================
+
+    def critical_path(self):
+        """按各阶段实际耗时计算的最长依赖链：(阶段列表, 总耗时)"""
+        best = {}
+        for name, stage in self.stages.items():   # 添加顺序即拓扑顺序
+            prev = max((best[d] for d in stage.deps), key=lambda x: x[1], default=([], 0.0))
+            best[name] = (prev[0] + [name], prev[1] + stage.duration)
+        return max(best.values(), key=lambda x: x[1], default=([], 0.0))
+
+    def report(self):
+        lines = [f"{'阶段':<10} {'开始':>7} {'结束':>7} {'耗时':>7}  状态"]
+        for stage in self.stages.values():
+            start = f"{stage.start:.2f}" if stage.start is not None else "-"
+            end = f"{stage.end:.2f}" if stage.end is not None else "-"
+            lines.append(f"{stage.name:<10} {start:>7} {end:>7} {stage.duration:>7.2f}  {stage.status}")
+        serial = sum(stage.duration for stage in self.stages.values())
+        path, path_time = self.critical_path()
+        wall = self._wall or 0.0
+        lines.append(f"串行合计 {serial:.2f}s，实际 {wall:.2f}s，节省 {serial - wall:.2f}s")
+        lines.append(f"关键路径 ({path_time:.2f}s): {' → '.join(path)}")
+        return "[流水线] 耗时报告\n" + "\n".join(lines)
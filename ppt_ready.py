@@ -1,3 +1,4 @@
+import io
 import json
 import os
 import re
@@ -6,28 +7,47 @@ from datetime import datetime
 from PIL import Image
 
 from pptx import Presentation
-from pptx.util import Pt
+from pptx.util import Pt, Emu
 from pptx.dml.color import RGBColor
 from pptx.enum.text import PP_ALIGN
-from deep_translator import GoogleTranslator
 # 引入配置文件
 import config
+import slide_cache
+import text_metrics
+import article_charts
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# config 中的颜色是 (R, G, B) 元组 (导入 config 不需要加载 python-pptx)
+COLOR_DARK_BLUE = RGBColor(*config.COLOR_DARK_BLUE)
+COLOR_BLACK = RGBColor(*config.COLOR_BLACK)
+COLOR_GRAY = RGBColor(*config.COLOR_GRAY)
+COLOR_LIGHT_BLUE = RGBColor(*config.COLOR_LIGHT_BLUE)
+
 class PPTGenerator:
-    def __init__(self, data, template_path, images_dir, location_name, language):
+    def __init__(self, data, template_path, images_dir, location_name, language, template_prs=None):
+        """
+        :param template_prs: 已预加载的模板 (preload_template)，流水线中在等待 LLM 时提前解析；只能使用一次
+        """
         self.data = data
         self.template_path = template_path
         self.images_dir = images_dir
         self.location = location_name
         self.language = language
         self.prs = None
+        self._template_prs = template_prs
+        self._pending_annotations = []  # (slide, 文字, cfg, 粗体, 颜色)，生成页面后批量排版
+        self._pending_fits = []         # (runs, 自动字号参数, 分组)，生成页面后批量计算字号
+        self._chart_manifests = {}      # 图片目录 -> 图片清单 (None 表示没有清单)
 
     def load_resources(self):
         """加载模板和JSON数据"""
         try:
+            if self._template_prs is not None:
+                self.prs, self._template_prs = self._template_prs, None
+                logging.info("使用预加载的模板")
+                return
             if not os.path.exists(self.template_path):
                 raise FileNotFoundError(f"模板文件未找到: {self.template_path}")
             self.prs = Presentation(self.template_path)
@@ -40,7 +60,13 @@ class PPTGenerator:
 
     # --- 通用工具方法 ---
 
-    def _set_text_style(self, run, font_name='华文细黑', size=12, bold=False, color=config.COLOR_BLACK):
+    @staticmethod
+    def _translate_en(text):
+        """译为英文 (deep_translator 只有英文版用到，用到时才导入)"""
+        from deep_translator import GoogleTranslator
+        return GoogleTranslator(source='auto', target='en').translate(text)
+
+    def _set_text_style(self, run, font_name='华文细黑', size=12, bold=False, color=COLOR_BLACK):
         """统一设置文本样式（修复版）"""
         try:
             # 确保 run 对象有效
@@ -139,20 +165,8 @@ class PPTGenerator:
         """
         根据文章标题中的关键词，返回该资产类别的【中文标准名称】。
         """
-        title_map = {
-            # 关键词 : 中文标准名
-            "US Equities": "美股",
-            "HK/China Equities": "中港股市",
-            "European Equities": "欧股", 
-            "Japan Equities": "日股",
-            "Fixed Income": "债券",
-            "Gold": "黄金",
-            "Crude Oil": "原油",
-            "Fund flow": "资金流",
-            "Top Picks - Bonds": "个债精选",   
-            "Top Picks - Equities": "个股精选",
-            "债市": "债券"
-        }
+        # 关键词 : 中文标准名
+        title_map = config.ASSET_KEYWORD_MAP
         
         # 统一转为小写进行匹配（不区分大小写）
         title_lower = title.lower()
@@ -167,12 +181,24 @@ class PPTGenerator:
         return title[:2]
 
     def _find_matching_image(self, title, images_dir):
+        """图片匹配：返回对应文章的第一张图表"""
+        images = self._find_matching_images(title, images_dir)
+        return images[0] if images else None
+
+    def _load_chart_manifest(self, images_dir):
+        if images_dir not in self._chart_manifests:
+            self._chart_manifests[images_dir] = article_charts.load_manifest(images_dir)
+        return self._chart_manifests[images_dir]
+
+    def _find_matching_images(self, title, images_dir):
         """
         图片匹配：先找到对应的中文标准名，再取前2个字进行匹配
+        有图片清单时返回同一篇文章的全部图表 (按文中顺序)，否则按文件名匹配一张
+        :return: 图片路径列表
         """
         if not os.path.exists(images_dir):
             logging.warning(f"图片目录不存在: {images_dir}")
-            return None
+            return []
         
         # 1. 先通过_get_standard_keys获取中文标准名
         chinese_name = self._get_standard_keys(title)
@@ -183,29 +209,39 @@ class PPTGenerator:
         else:
             key = chinese_name
         
-        # 如果没有有效的键，返回None
+        # 如果没有有效的键，返回空列表
         if not key or len(key.strip()) == 0:
-            return None
+            return []
         
         # 打印调试信息
         print(f"    查找图片，原始标题: '{title}'")
         print(f"    中文标准名: '{chinese_name}'")
         print(f"    使用键: '{key}'")
         
+        # 3. 图片清单：第一张图表的文件名以键开头的文章
+        manifest = self._load_chart_manifest(images_dir)
+        if manifest:
+            for _, entries in article_charts.group_charts(manifest):
+                if entries[0]["file"].startswith(key):
+                    files = [entry["file"] for entry in entries]
+                    print(f"    匹配成功: 键 '{key}' -> 图表 {files}")
+                    return [os.path.join(images_dir, f) for f in files]
+        
         # 支持的图片格式
         image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
         
-        # 遍历图片目录，只匹配以键开头的文件名
-        for filename in os.listdir(images_dir):
+        # 4. 没有清单 (旧的运行包) 时遍历图片目录，只匹配以键开头的文件名
+        #    按分类部分的长度排序，同一篇文章的第一张 (美股_...) 排在后续图表 (美股-2_...) 之前
+        for filename in sorted(os.listdir(images_dir), key=lambda f: (len(f.split('_')[0]), f)):
             # 检查是否为图片文件
             if any(filename.lower().endswith(ext.lower()) for ext in image_extensions):
                 # 文件名以键开头（精确匹配）
                 if filename.startswith(key):
                     print(f"    匹配成功: 键 '{key}' -> 图片 '{filename}'")
-                    return os.path.join(images_dir, filename)
+                    return [os.path.join(images_dir, filename)]
         
         print(f"    警告: 未找到以 '{key}' 开头的图片")
-        return None
+        return []
 
     def _fill_image(self, slide, image_path):
         """在幻灯片中插入图片并调整填充方式"""
@@ -234,8 +270,45 @@ class PPTGenerator:
                 logging.error(f"插入图片失败: {e}")
         return None
 
-    def _add_image_annotations(self, slide, image_path):
-        """添加图表标题和资料来源 (使用 config 中的坐标配置)"""
+    def _fill_images(self, slide, image_paths):
+        """
+        多图布局：把图片占位符横向等分为 len(image_paths) 列，每列按比例居中放入一张图
+        :return: [(图片路径, (列左边距, 列宽, 图片右边缘))]，供 _add_image_annotations 定位标题和来源
+        """
+        placeholder = None
+        for shape in slide.shapes:
+            if shape.is_placeholder and shape.placeholder_format.type == 18:
+                placeholder = shape
+                break
+        if placeholder is None:
+            return []
+
+        n = len(image_paths)
+        gap = config.MULTI_CHART_GAP
+        col_width = (placeholder.width - gap * (n - 1)) // n
+        placed = []
+        for i, image_path in enumerate(image_paths):
+            img_width, img_height = self._get_image_dimensions(image_path)
+            if img_width == 0:
+                continue
+            col_left = placeholder.left + i * (col_width + gap)
+            w, h = self._calculate_fitted_size(img_width, img_height, col_width, placeholder.height)
+            left = int(col_left + (col_width - w) // 2)
+            top = int(placeholder.top + (placeholder.height - h) // 2)
+            try:
+                slide.shapes.add_picture(image_path, left, top, int(w), int(h))
+                logging.info(f"✓ 插入图片 ({i + 1}/{n}): {os.path.basename(image_path)}")
+                placed.append((image_path, (col_left, col_width, left + int(w))))
+            except Exception as e:
+                logging.error(f"插入图片失败: {e}")
+        return placed
+
+    def _add_image_annotations(self, slide, image_path, column=None):
+        """
+        添加图表标题和资料来源 (使用 config 中的坐标配置)
+        这里只确定文字，位置在所有页面生成后由 _place_annotations 批量测量宽度后计算
+        :param column: 多图布局中该图所在的列 (左边距, 列宽, 图片右边缘)：标题居中于该列，来源右对齐到图片右边缘
+        """
         try:
             file_name = os.path.basename(image_path)
             parts = os.path.splitext(file_name)[0].split('_')
@@ -249,80 +322,128 @@ class PPTGenerator:
                 
                 if chart_title and chart_title != "NONE" and is_english_mode:
                     try:
-                        chart_title = GoogleTranslator(source='auto', target='en').translate(chart_title)
+                        chart_title = self._translate_en(chart_title)
                     except Exception as e:
                         print(f"Translation failed: {e}")
 
                 if chart_title and chart_title != "NONE":
-                    
-                    # 2. 动态调整左边距 (英文和中文长度判断标准不同)
-                    offset = Pt(0)
-                    print(f"length of chart title '{chart_title}': {len(chart_title)}")
-                    if is_english_mode:
-                        cfg = config.ANNOTATION_CONFIG['title_en']
-                        # 英文判断逻辑 (字符数较多，但 Arial Narrow 比较省空间)
-                        if len(chart_title) > 75: offset = Pt(200)
-                        elif len(chart_title) > 30: offset = Pt(90)
-                        elif len(chart_title) > 54: offset = Pt(80)
-                    else:
-                        cfg = config.ANNOTATION_CONFIG['title_cn']
-                   
-                        # 中文判断逻辑
-                        if len(chart_title) > 20: offset = Pt(110)
-                        elif len(chart_title) > 10: offset = Pt(40)
-                    
-                   
-                    t_left = cfg['left_base'] - offset
-                    
-                    textbox = slide.shapes.add_textbox(t_left, cfg['top'], cfg['width'], cfg['height'])
-                    run = textbox.text_frame.paragraphs[0].add_run()
-                    run.text = chart_title
-                    
-                    # 3. 设置字体样式：如果是英文，强制使用 Arial Narrow
-                    # 注意："Arial Narrow" 是字体名，bold=True 是加粗
-                    font_to_use = cfg['font_name']
-                    print(f"正在设置字体样式: 字体={font_to_use}, 大小={cfg['size']}, 加粗=True")
-                    self._set_text_style(run, font_name=font_to_use, size=cfg['size'], bold=True)
+                    cfg = config.ANNOTATION_CONFIG['title_en' if is_english_mode else 'title_cn']
+                    if column:
+                        cfg = dict(cfg, left_base=column[0], width=column[1], align='middle')
+                    self._pending_annotations.append((slide, chart_title, cfg, True, COLOR_BLACK))
 
             # B. 添加资料来源
-            source_text = ""
-            offset_s = Pt(0)
-            
             if len(parts) >= 2:
                 # 假设最后一部分是来源
                 raw_source = parts[-1].replace('，', ' ')
                 source_text = re.sub(r'\s+', ' ', raw_source).strip()
-                if len(source_text) > 9 and self.language == "en": offset_s = Pt(90)
-                elif len(source_text) > 13 and self.language != "cn": offset_s = Pt(40)
-                else: offset_s = Pt(20)
             else:
                 source_text = parts[0]
-                offset_s = -Pt(15)
             
             source_text = source_text.strip('_ ')
             
             if source_text:
-                cfg_s = config.ANNOTATION_CONFIG['source']
-                s_left = cfg_s['left_base'] - offset_s
-                
-                textbox = slide.shapes.add_textbox(s_left, cfg_s['top'], cfg_s['width'], cfg_s['height'])
-                # 确保每次都是新段落
-                p = textbox.text_frame.paragraphs[0]
-                if not p.runs: p.add_run()
                 if self.language == "en":
-                    source_text = GoogleTranslator(source='auto', target='en').translate(source_text)
+                    source_text = self._translate_en(source_text)
                
                     print(f"Adding source annotation in English: {source_text}")
-                    p.runs[0].text = f"Source: {source_text}"
+                    source_text = f"Source: {source_text}"
                 else:
                     source_text =self.translate_with_glossary(source_text)
-                    p.runs[0].text = f"资料来源：{source_text}"
+                    source_text = f"资料来源：{source_text}"
                 
-                self._set_text_style(p.runs[0], font_name=cfg_s['font_name'], size=cfg_s['size'], color=config.COLOR_GRAY)
+                cfg_s = config.ANNOTATION_CONFIG['source']
+                if column:
+                    cfg_s = dict(cfg_s, right_edge=column[2])
+                self._pending_annotations.append((slide, source_text, cfg_s, False, COLOR_GRAY))
 
         except Exception as e:
             logging.warning(f"添加图片注释失败: {e}")
 
+    def _annotation_left(self, cfg, width_pt):
+        """根据渲染宽度和 cfg['align'] 计算文本框左边距 (EMU)"""
+        width = Pt(width_pt)
+        align = cfg.get('align')
+        if align in ('center', 'middle'):
+            # 文字中心对齐到框的中心 (middle：多图布局中每列的标题)；比框宽时向两侧展开
+            return cfg['left_base'] + (cfg['width'] - width) // 2
+        if align == 'right':
+            return cfg['right_edge'] - width
+        return cfg['left_base']
+
+    def _place_annotations(self):
+        """一次测量所有注释的宽度，计算位置并添加文本框"""
+        if not self._pending_annotations:
+            return
+        widths = text_metrics.measure_many([
+            (text, cfg['font_name'], cfg['size'], bold)
+            for _, text, cfg, bold, _ in self._pending_annotations
+        ])
+        for (slide, text, cfg, bold, color), width_pt in zip(self._pending_annotations, widths):
+            left = self._annotation_left(cfg, width_pt)
+            print(f"注释 '{text}': 宽 {width_pt:.1f}pt，左边距 {left / 12700:.1f}pt")
+            textbox = slide.shapes.add_textbox(left, cfg['top'], cfg['width'], cfg['height'])
+            run = textbox.text_frame.paragraphs[0].add_run()
+            run.text = text
+            self._set_text_style(run, font_name=cfg['font_name'], size=cfg['size'], bold=bold, color=color)
+        self._pending_annotations = []
+
+    def _queue_fit(self, runs, paragraphs, width, height, margins, fit_cfg, max_size, bold=False, group=None):
+        """
+        登记一个需要自动字号的文本区域，由 _apply_fits 统一计算
+        :param width, height: 框的尺寸 (EMU)
+        :param margins: (左, 右, 上, 下) 内边距 (EMU)
+        :param group: 同一分组的区域取最小字号 (如摘要表格的同一列)
+        """
+        left, right, top, bottom = margins
+        # 空段落 (例如正文末尾的换行) 不占行数
+        paragraphs = [p for p in paragraphs if p.strip()]
+        job = (tuple(paragraphs), fit_cfg['font_name'],
+               Emu(width - left - right).pt, Emu(height - top - bottom).pt,
+               max_size, fit_cfg['min'], bold)
+        self._pending_fits.append((runs, job, group))
+
+    def _apply_fits(self):
+        """批量计算所有登记区域的字号并应用"""
+        if not self._pending_fits:
+            return
+        sizes = text_metrics.fit_many([job for _, job, _ in self._pending_fits])
+        group_size = {}
+        for (_, _, group), size in zip(self._pending_fits, sizes):
+            if group is not None:
+                group_size[group] = min(size, group_size.get(group, size))
+        shrunk = 0
+        for (runs, job, group), size in zip(self._pending_fits, sizes):
+            size = group_size.get(group, size)
+            if size < job[4]:
+                shrunk += 1
+            for run in runs:
+                run.font.size = Pt(size)
+        logging.info(f"自动字号: {len(sizes)} 个文本区域，其中 {shrunk} 个缩小了字号")
+        self._pending_fits = []
+
+    def _fit_summary_table(self, table_shape, row_cells, fit_cfg, max_size):
+        """
+        摘要表格的自动字号：模板的行高只是最小值，行会随内容撑高，
+        因此按整个表格在页面上可用的高度 (表格顶部到页面底部减去 bottom_margin) 计算，整个表格使用同一字号
+        :param row_cells: 行索引 -> [(run, 文字, 文本宽度, 上下内边距, 是否粗体)] (EMU)
+        """
+        table = table_shape.table
+        budget = self.prs.slide_height - table_shape.top - Pt(fit_cfg['bottom_margin'])
+        rows = []
+        for r_idx, row in enumerate(table.rows):
+            cells = [((text,) if text.strip() else (), Emu(width).pt, Emu(margins).pt, bold)
+                     for _, text, width, margins, bold in row_cells.get(r_idx, [])]
+            rows.append((Emu(row.height).pt, cells))
+        size = text_metrics.fit_table_font_size(
+            rows, fit_cfg['font_name'], Emu(budget).pt, max_size, fit_cfg['min']
+        )
+        for cells in row_cells.values():
+            for run, *_ in cells:
+                run.font.size = Pt(size)
+        if size < max_size:
+            logging.info(f"摘要表格字号缩小为 {size} 磅")
+
     # --- 页面生成方法 ---
 
     def create_cover(self):
@@ -348,7 +469,7 @@ class PPTGenerator:
                     tf_author.paragraphs[0].runs[0], 
                     size=35, 
                     bold=True,                      # 加粗
-                    color=config.COLOR_LIGHT_BLUE, 
+                    color=COLOR_LIGHT_BLUE, 
                     font_name='Microsoft YaHei'      # <--- 这里指定字体
                 )
 
@@ -367,7 +488,7 @@ class PPTGenerator:
                     tf_title.paragraphs[0].runs[0], 
                     size=44, 
                     bold=True,                       
-                    color=config.COLOR_DARK_BLUE, 
+                    color=COLOR_DARK_BLUE, 
                     font_name='Microsoft YaHei'      # <--- 这里指定字体
                 )
         except IndexError:
@@ -384,13 +505,17 @@ class PPTGenerator:
         # 标题
         if slide.shapes[0].has_text_frame:
             self._set_text_style(slide.shapes[0].text_frame.paragraphs[0].runs[0], 
-                                 size=size, bold=True, color=config.COLOR_DARK_BLUE)
+                                 size=size, bold=True, color=COLOR_DARK_BLUE)
 
         # 表格
         try:
-            table = slide.shapes[1].table
+            table_shape = slide.shapes[1]
+            table = table_shape.table
             cols = summary.get("columns", [])
             rows = summary.get("rows", [])
+            fit_cfg = config.AUTOFIT_CONFIG['summary_cell']
+            f_size = fit_cfg['en'] if self.language == "en" else fit_cfg['cn']
+            row_cells = {}   # 行索引 -> [(run, 文字, 列宽, 上下内边距, 是否粗体)]
 
             for r_idx, row_data in enumerate(rows):
                 if r_idx + 1 >= len(table.rows): break
@@ -414,8 +539,7 @@ class PPTGenerator:
                     run.text = text
                     
                     # 3. 计算样式逻辑
-                    # 逻辑A: 投资逻辑字数多则变小
-                    f_size = 10
+                    # 逻辑A: 字数多则变小 (自动字号，整个表格使用相同字号，见下方)
                     
                     # 逻辑B: 判断是否为第二列 (index=1)，如果是则加粗
                     is_second_column = (table_col_idx == 1)
@@ -427,10 +551,17 @@ class PPTGenerator:
                         bold=is_second_column,       # <--- 这里控制加粗
                         font_name='Microsoft YaHei'  # 统一字体
                     )
+                    row_cells.setdefault(r_idx + 1, []).append((
+                        run, text,
+                        table.columns[table_col_idx].width - cell.margin_left - cell.margin_right,
+                        cell.margin_top + cell.margin_bottom, is_second_column
+                    ))
                     
                     # 5. 设置居中 (仅第二列)
                     if is_second_column:
                         p.alignment = PP_ALIGN.CENTER
+
+            self._fit_summary_table(table_shape, row_cells, fit_cfg, f_size)
         
            
 
@@ -472,7 +603,7 @@ class PPTGenerator:
                         run.font.name = '华文细黑'
                         run.font.size = Pt(24.1)
                         run.font.bold = True
-                        run.font.color.rgb = config.COLOR_DARK_BLUE
+                        run.font.color.rgb = COLOR_DARK_BLUE
 
             # 正文
             if body_ph and body_ph.has_text_frame:
@@ -482,25 +613,31 @@ class PPTGenerator:
                 for bullet in bullets:
                     body_text += f"{bullet}\n"
                 body_ph.text = body_text
-                # 根据字数调整字体大小
-                total_chars = len(body_text)
-                font_size = Pt(14)
-                
-                for p in body_ph.text_frame.paragraphs:
-                    for run in p.runs:
-                        if self.language == "en":
-
-                            run.font.size = Pt(12)
-                        else:
-                            run.font.size = Pt(14)
+                # 根据字数调整字体大小：先用默认字号，放不下时由 _apply_fits 缩小
+                fit_cfg = config.AUTOFIT_CONFIG['content_body']
+                font_size = fit_cfg['en'] if self.language == "en" else fit_cfg['cn']
+                tf = body_ph.text_frame
+                runs = [run for p in tf.paragraphs for run in p.runs]
+                for run in runs:
+                    run.font.size = Pt(font_size)
+                self._queue_fit(
+                    runs, [p.text for p in tf.paragraphs], body_ph.width, body_ph.height,
+                    (tf.margin_left, tf.margin_right, tf.margin_top, tf.margin_bottom),
+                    fit_cfg, font_size
+                )
                 print(f"Slide {i+1} Body Text added")
 
-            # 图片
-            matched_image_path = self._find_matching_image(content["title"], images_dir=self.images_dir)
-            if matched_image_path:
-                self._fill_image(slide, matched_image_path)
+            # 图片 (文章有多张图表时并排放置，最多 config.MAX_CHARTS_PER_SLIDE 张)
+            image_paths = self._find_matching_images(content["title"], images_dir=self.images_dir)
+            image_paths = image_paths[:config.MAX_CHARTS_PER_SLIDE]
+            if len(image_paths) > 1:
+                # 内容页总是添加注释 (每张图各自的标题和来源)
+                for image_path, column in self._fill_images(slide, image_paths):
+                    self._add_image_annotations(slide, image_path, column=column)
+            elif image_paths:
+                self._fill_image(slide, image_paths[0])
                 # 内容页总是添加注释 
-                self._add_image_annotations(slide, matched_image_path)
+                self._add_image_annotations(slide, image_paths[0])
 
             self._remove_all_picture_placeholders(slide)
             print("-" * 50)
@@ -517,7 +654,7 @@ class PPTGenerator:
                     run.font.name = '华文细黑'
                     run.font.size = Pt(24.1)
                     run.font.bold = True
-                    run.font.color.rgb = config.COLOR_DARK_BLUE
+                    run.font.color.rgb = COLOR_DARK_BLUE
             
             # 确保至少有一个段落
             if text_frame.paragraphs and len(text_frame.paragraphs) > 0:
@@ -533,7 +670,7 @@ class PPTGenerator:
                 run.font.name = '华文细黑'
                 run.font.size = Pt(24.1)
                 run.font.bold = True
-                run.font.color.rgb = config.COLOR_DARK_BLUE
+                run.font.color.rgb = COLOR_DARK_BLUE
     def create_image_slide(self, topic):
         """生成纯图页"""
         layout = self.prs.slide_layouts[config.LAYOUT_IDX['image_only']]
@@ -551,7 +688,7 @@ class PPTGenerator:
                     run.font.name = '华文细黑'
                     run.font.size = Pt(24.1)
                     run.font.bold = True
-                    run.font.color.rgb = config.COLOR_DARK_BLUE
+                    run.font.color.rgb = COLOR_DARK_BLUE
             
             # 确保至少有一个段落
             if text_frame.paragraphs and len(text_frame.paragraphs) > 0:
@@ -567,7 +704,7 @@ class PPTGenerator:
                 run.font.name = '华文细黑'
                 run.font.size = Pt(24.1)
                 run.font.bold = True
-                run.font.color.rgb = config.COLOR_DARK_BLUE
+                run.font.color.rgb = COLOR_DARK_BLUE
         
         # 查找并添加图片
         img_path = self._find_matching_image(topic, images_dir=self.images_dir)
@@ -657,7 +794,7 @@ class PPTGenerator:
             slide = self.prs.slides.add_slide(layout)
             slide.placeholders[0].text = "免责声明"
             self._set_text_style(slide.placeholders[0].text_frame.paragraphs[0].runs[0], 
-                                 size=29.1, bold=True, color=config.COLOR_DARK_BLUE)
+                                 size=29.1, bold=True, color=COLOR_DARK_BLUE)
             
             body = slide.placeholders[12]
             body.text = "\n".join(texts["cn"])
@@ -671,7 +808,7 @@ class PPTGenerator:
             slide = self.prs.slides.add_slide(layout)
             slide.placeholders[0].text = "Disclaimer"
             self._set_text_style(slide.placeholders[0].text_frame.paragraphs[0].runs[0], 
-                                 size=29.1, bold=True, color=config.COLOR_DARK_BLUE)
+                                 size=29.1, bold=True, color=COLOR_DARK_BLUE)
             
             body = slide.placeholders[12]
             body.text = "\n".join(texts["en"])
@@ -679,56 +816,98 @@ class PPTGenerator:
                 for run in p.runs:
                     self._set_text_style(run, font_name='Arial', size=9)
 
-    def run(self,output_path):
-        """
-        执行全流程
-        :param output_path: 完整的输出文件路径 (包含目录和文件名)
-        :return: Boolean (True 表示成功, False 表示失败)
-        """
+    def _render_static_fragment(self):
+        """在一份空白模板上只渲染联系页和免责页，作为静态页片段缓存"""
+        fragment = PPTGenerator({}, self.template_path, self.images_dir, self.location, self.language)
+        fragment.load_resources()
+        while len(fragment.prs.slides) > 0:
+            rId = fragment.prs.slides._sldIdLst[0].rId
+            fragment.prs.part.drop_rel(rId)
+            del fragment.prs.slides._sldIdLst[0]
+        fragment.create_contact_page()
+        fragment.create_disclaimer_pages()
+        return fragment.prs
+
+    def create_static_pages(self):
+        """联系页 + 免责页：只取决于模板、地点和语言，优先使用片段缓存"""
+        if not config.FRAGMENT_CACHE_ENABLED:
+            self.create_contact_page()
+            self.create_disclaimer_pages()
+            return
+        fragment = slide_cache.get_fragment(self.template_path, self.location, self.language, self._render_static_fragment)
+        slide_cache.splice_slides(self.prs, fragment)
+
+    def build(self):
+        """加载模板并按顺序创建所有页面 (不保存)"""
         logging.info(f"开始生成 PPT - 地点: {self.location}")
-        # logging.info(f"开始生成 PPT - 地点: {self.location}")
         
         # --- 调试代码：查看当前 self.language 到底是什么 ---
         logging.info(f"DEBUG: 当前对象存储的语言为: '{self.language}'")
+
+        # 1. 加载数据
+        self.load_resources()
+     
+        # 2. 按顺序创建页面
+        self.create_cover()              # 封面
+        self.create_summary()            # 摘要
+        self.create_content_pages()      # 核心内容
         
+        # 图片页 (根据 key 查找图片)
+        if self.language == "en":
+            logging.info("添加英文版图片页")
+            self.create_image_slide("Top Picks - Equities")
+            self.create_image_slide("Top Picks - Bonds")
+            self.create_image_slide("Fund Flow")
+        else:
+            self.create_image_slide("个股精选")
+            self.create_image_slide("个债精选")
+            self.create_image_slide("资金流")
+
+        self._apply_fits()               # 正文 / 摘要表格自动字号 (批量)
+        self._place_annotations()        # 图表标题 / 资料来源 (批量测量宽度)
+        self.create_static_pages()       # 封底/联系 + 免责声明 (片段缓存)
+
+    def render_to_buffer(self):
+        """
+        生成 PPT 并直接保存到内存，不经过磁盘
+        :return: BytesIO (已 seek 到开头)，失败返回 None
+        """
         try:
-            # 1. 加载数据
-            self.load_resources()
-         
-            # 2. 按顺序创建页面
-            self.create_cover()              # 封面
-            self.create_summary()            # 摘要
-            self.create_content_pages()      # 核心内容
-            
-            # 图片页 (根据 key 查找图片)
-            if self.language == "en":
-                logging.info("添加英文版图片页")
-                self.create_image_slide("Top Picks - Equities")
-                self.create_image_slide("Top Picks - Bonds")
-                self.create_image_slide("Fund Flow")
-            else:
-                self.create_image_slide("个股精选")
-                self.create_image_slide("个债精选")
-                self.create_image_slide("资金流")
+            self.build()
+            buffer = io.BytesIO()
+            self.prs.save(buffer)
+            buffer.seek(0)
+            logging.info(f"PPT 生成完成 (内存, {buffer.getbuffer().nbytes / 1024:.0f} KB, 共 {len(self.prs.slides)} 页)")
+            return buffer
+        except Exception as e:
+            logging.error(f"PPT 生成过程中发生异常: {str(e)}")
+            import traceback
+            logging.error(traceback.format_exc())
+            return None
 
-            self.create_contact_page()       # 封底/联系
-            self.create_disclaimer_pages()   # 免责声明
+    def run(self,output_path):
+        """
+        执行全流程
+        :param output_path: 完整的输出文件路径 (包含目录和文件名)
+        :return: Boolean (True 表示成功, False 表示失败)
+        """
+        try:
+            self.build()
             
             # 3. 确保目标目录存在 (虽然 main.py 做了，这里再做一次保险)
             output_dir = os.path.dirname(output_path)
             if output_dir:
                 os.makedirs(output_dir, exist_ok=True)
             
-            # 4. 删除旧文件 (防止权限报错)
-            if os.path.exists(output_path):
-                try:
-                    os.remove(output_path)
-                except PermissionError:
-                    logging.error(f"文件被占用，无法覆盖: {output_path}")
-                    return False
-
-            # 5. 保存文件
-            self.prs.save(output_path)
+            # 4. 先保存到临时文件再原子替换，并发渲染时读者不会拿到写了一半的文件
+            tmp_path = f"{output_path}.{os.getpid()}.tmp"
+            self.prs.save(tmp_path)
+            try:
+                os.replace(tmp_path, output_path)
+            except PermissionError:
+                os.remove(tmp_path)
+                logging.error(f"文件被占用，无法覆盖: {output_path}")
+                return False
             logging.info(f"PPT 生成完成: {output_path} (共 {len(self.prs.slides)} 页)")
             
             # ----------------------------------------
@@ -743,6 +922,33 @@ class PPTGenerator:
             return False
 
 
+def preload_template(template_path, location_name, language):
+    """
+    提前解析模板并预热静态页片段缓存 (与 LLM 生成并行执行)
+    :return: 传给 PPTGenerator(template_prs=...) 的 Presentation
+    """
+    if not os.path.exists(template_path):
+        raise FileNotFoundError(f"模板文件未找到: {template_path}")
+    if config.FRAGMENT_CACHE_ENABLED:
+        warm = PPTGenerator({}, template_path, None, location_name, language)
+        slide_cache.get_fragment(template_path, location_name, language, warm._render_static_fragment)
+    return Presentation(template_path)
+
+
+def iter_deck_chunks(buffer, chunk_size=256 * 1024):
+    """
+    按块读取 PPT，供流式下载使用 (api_server 的 /deck 响应)
+    :param buffer: render_to_buffer 的 BytesIO，或以二进制方式打开的文件
+    """
+    buffer.seek(0)
+    while True:
+        chunk = buffer.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+    buffer.seek(0)
+
+
 # ================= 对外接口函数 =================
 
 def generate_ppt_from_json(json_path, template_path, output_filename, location_name, images_dir, language="cn"):
@@ -0,0 +1,333 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+# 引入配置文件
+import config
+from workspace import RunWorkspace, cleanup_workspaces, atomic_write_bytes, atomic_write_json
+from article_selection import select_articles, get_article_id, get_publish_time_str
+from report_pipeline import get_news_platform_token, fetch_articles, build_report_pipeline, record_run
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+开盘前预生成 (Pre-generation)
+
+每天早上 CIO 文章发布后，所有人几乎同时点击生成，LLM、图片下载和模板加载都从冷状态开始排队。
+这里的调度器按 config.PREGEN_INTERVAL_MINUTES 调用 fetch_articles 检查新文章：
+选中文章 (每个分类最新的一篇) 的 id 和发布时间组成指纹，指纹变化时为所有 地点 × 语言 组合
+(config.PREGEN_COMBOS) 提前跑完整条流水线，PPT 存到 config.PREGEN_DIR：
+
+    <PREGEN_DIR>/index.json         {"fingerprint", "latest_publish", "checked_at", "decks": {组合: 记录}}
+    <PREGEN_DIR>/<地点>_<语言>.pptx
+
+- 每种语言一个线程，同一语言的各地点依次生成；LLM 输出与地点无关，只在该语言的第一个地点调用一次
+- config.EN_TRANSLATE_FROM_CN 时中英文放在同一线程：先生成中文，英文版由中文结果翻译 (翻译失败时照常调用 LLM)
+- 某个组合失败时，下一轮 (指纹未变) 只重跑缺失的组合
+- 界面 (ai_ppt.py) 点击生成时先查 PregenCache.lookup：指纹与调度器最近一次看到的一致、
+  且调度器在 config.PREGEN_MAX_AGE_MINUTES 内确认过，就直接提供下载
+
+用法：
+    python pregenerate.py                 # 常驻，按间隔检查
+    python pregenerate.py --once          # 只检查/生成一轮
+    python pregenerate.py --once --dry-run   # 只抓取并列出将要生成的组合，不调用 LLM、不写缓存
+
+界面只用到 PregenCache，本模块导入时不加载流水线模块。
+"""
+
+
+def combo_key(location_name, language_code):
+    return f"{location_name}|{language_code}"
+
+
+def default_combos():
+    if config.PREGEN_COMBOS:
+        return [tuple(combo) for combo in config.PREGEN_COMBOS]
+    return [(location_name, language_code)
+            for location_name in config.TEMPLATE_MAP
+            for language_code in config.LANGUAGE_MAP.values()]
+
+
+def articles_fingerprint(articles):
+    """
+    选中文章的指纹：与 construct_json 使用同一选择策略，只有会进入报告的文章变化才算有新文章
+    :param articles: fetch_articles 的返回值
+    :return: (指纹, 选中的条目, 最新发布时间)
+    """
+    selected, latest_time = select_articles(articles.get("articles", []))
+    keys = sorted(
+        (item["category"], str(get_article_id(item["article"])), get_publish_time_str(item["article"]))
+        for item in selected
+    )
+    digest = hashlib.sha256(json.dumps(keys, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return digest, selected, latest_time
+
+
+# ================= 1. 预生成结果 =================
+
+class PregenCache:
+    def __init__(self, cache_dir=None):
+        self.dir = cache_dir or config.PREGEN_DIR
+        self.index_path = os.path.join(self.dir, "index.json")
+
+    def load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return {"fingerprint": None, "latest_publish": None, "checked_at": 0, "decks": {}}
+
+    def save(self, index):
+        atomic_write_json(self.index_path, index)
+
+    def deck_path(self, location_name, language_code):
+        safe = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in location_name)
+        return os.path.join(self.dir, f"{safe}_{language_code}.pptx")
+
+    def is_current(self, index, location_name, language_code):
+        """该组合已按最新文章生成"""
+        entry = index["decks"].get(combo_key(location_name, language_code))
+        return bool(entry and entry.get("status") == "done" and entry.get("fingerprint") == index["fingerprint"]
+                    and os.path.exists(entry["deck_path"]))
+
+    def lookup(self, location_name, language_code, max_age_minutes=None):
+        """
+        界面点击时调用：可以直接使用的预生成结果
+        :return: 记录 (deck_path, filename, generated_at, timings ...)，没有或已过期时返回 None
+        """
+        max_age = (config.PREGEN_MAX_AGE_MINUTES if max_age_minutes is None else max_age_minutes) * 60
+        index = self.load()
+        if time.time() - index.get("checked_at", 0) > max_age:
+            return None
+        if not self.is_current(index, location_name, language_code):
+            return None
+        return index["decks"][combo_key(location_name, language_code)]
+
+
+# ================= 2. 调度器 =================
+
+class Pregenerator:
+    def __init__(self, combos=None, cache=None):
+        self.combos = combos or default_combos()
+        self.cache = cache or PregenCache()
+        self._index_lock = threading.Lock()
+
+    def fetch(self):
+        """:return: 文章列表 (fetch_articles 的返回值)，失败返回 None"""
+        token = get_news_platform_token()
+        if not token:
+            logging.error("[预生成] 无法获取 News Token")
+            return None
+        articles = fetch_articles(token)
+        if not articles or articles == "EXPIRED":
+            logging.error("[预生成] 文章列表为空或 Token 失效")
+            return None
+        return articles
+
+    def run_once(self, dry_run=False, force=False):
+        """
+        检查一次新文章，需要时生成
+        :param dry_run: 只抓取、计算指纹并列出待生成的组合，不调用 LLM、不写缓存
+        :param force: 文章没有变化也重新生成全部组合
+        :return: 本轮报告 dict (status: failed / unchanged / planned / generated)
+        """
+        start = time.perf_counter()
+        report = {"started_at": time.time(), "dry_run": dry_run, "combos": []}
+        articles = self.fetch()
+        report["fetch_seconds"] = round(time.perf_counter() - start, 3)
+        if articles is None:
+            report["status"] = "failed"
+            return report
+
+        fingerprint, selected, latest_time = articles_fingerprint(articles)
+        report.update(fingerprint=fingerprint, latest_publish=latest_time.isoformat() if latest_time else None,
+                      selected=[item["category"] for item in selected])
+        index = self.cache.load()
+        changed = fingerprint != index["fingerprint"]
+        todo = [combo for combo in self.combos if force or changed or not self.cache.is_current(index, *combo)]
+        report["todo"] = [combo_key(*combo) for combo in todo]
+
+        if dry_run:
+            report["status"] = "planned"
+            report["changed"] = changed
+            report["templates"] = {combo_key(*combo): config.TEMPLATE_MAP.get(combo[0], {}).get(combo[1])
+                                   for combo in todo}
+            return report
+
+        with self._index_lock:
+            index = self.cache.load()
+            index.update(fingerprint=fingerprint, latest_publish=report["latest_publish"], checked_at=time.time())
+            self.cache.save(index)
+        if not todo:
+            report["status"] = "unchanged"
+            logging.info(f"[预生成] 文章没有变化，{len(self.combos)} 个组合均已是最新")
+            return report
+
+        logging.info(f"[预生成] {'检测到新文章' if changed else '补齐缺失的组合'}，"
+                     f"生成 {len(todo)} 个组合 (最新发布 {report['latest_publish']})")
+        cleanup_workspaces()
+        by_language = {}
+        for location_name, language_code in todo:
+            by_language.setdefault(language_code, []).append(location_name)
+        groups = []
+        if config.EN_TRANSLATE_FROM_CN and "cn" in by_language and "en" in by_language:
+            groups.append([("cn", by_language.pop("cn")), ("en", by_language.pop("en"))])
+        groups.extend([item] for item in by_language.items())
+        threads = [
+            threading.Thread(target=self._run_languages, name=f"pregen-{'-'.join(lang for lang, _ in group)}",
+                             args=(group, articles, fingerprint, report))
+            for group in groups
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        report["status"] = "generated"
+        report["total_seconds"] = round(time.perf_counter() - start, 3)
+        return report
+
+    def _run_languages(self, group, articles, fingerprint, report):
+        """
+        依次生成 [(语言, [地点])]：同一语言的各地点共用 LLM 结果，英文版可由之前生成的中文结果翻译
+        """
+        chinese = {}
+        for language_code, locations in group:
+            shared = {}
+            if language_code == "en" and "llm" in chinese:
+                from report_translation import translate_checked
+                translated = translate_checked(chinese["llm"][0])
+                if translated:
+                    shared["llm"], shared["source"] = (translated, None), "translated"
+            self._run_language(language_code, locations, articles, fingerprint, report, shared)
+            if language_code == "cn":
+                chinese = shared
+
+    def _run_language(self, language_code, locations, articles, fingerprint, report, shared):
+        """同一语言的各地点依次生成，LLM 结果在这些地点之间共用"""
+
+        def share_llm(fn):
+            def llm(ctx):
+                if "llm" not in shared:
+                    shared["llm"] = fn(ctx)
+                # 渲染可能修改报告内容，每个地点使用自己的副本
+                return copy.deepcopy(shared["llm"])
+            return llm
+
+        for location_name in locations:
+            llm_source = shared.get("source", "shared") if "llm" in shared else "llm"
+            entry = self._run_combo(location_name, language_code, articles, fingerprint, share_llm, llm_source)
+            report["combos"].append(entry)
+            with self._index_lock:
+                index = self.cache.load()
+                index["decks"][combo_key(location_name, language_code)] = entry
+                self.cache.save(index)
+
+    def _run_combo(self, location_name, language_code, articles, fingerprint, share_llm, llm_source):
+        from pipeline import PipelineError, StageError
+
+        start = time.perf_counter()
+        entry = {"location": location_name, "language": language_code, "fingerprint": fingerprint,
+                 "llm_source": llm_source, "status": "failed", "error": None}
+        workspace = RunWorkspace().create()
+        pipeline = build_report_pipeline(workspace, location_name, language_code, articles=articles)
+        pipeline.stages["llm"].fn = share_llm(pipeline.stages["llm"].fn)
+        try:
+            results = pipeline.run()
+            deck_bytes, filename = record_run(workspace, results, location_name, language_code,
+                                              pipeline.template_path)
+            deck_path = self.cache.deck_path(location_name, language_code)
+            atomic_write_bytes(deck_path, deck_bytes)
+            entry.update(status="done", deck_path=deck_path, filename=filename, run_id=workspace.run_id,
+                         generated_at=time.time())
+        except PipelineError as e:
+            entry["error"] = str(e.cause) if isinstance(e.cause, StageError) else str(e)
+        except Exception as e:
+            logging.exception(f"[预生成] {location_name} / {language_code} 异常")
+            entry["error"] = str(e)
+        entry["seconds"] = round(time.perf_counter() - start, 3)
+        entry["stages"] = {name: round(stage.duration, 3) for name, stage in pipeline.stages.items()}
+        if entry["error"]:
+            logging.error(f"[预生成] {location_name} / {language_code} 失败: {entry['error']}")
+        else:
+            logging.info(f"[预生成] {location_name} / {language_code} 完成 ({entry['seconds']:.1f}s)")
+        return entry
+
+    def run_forever(self, interval_minutes=None, stop_event=None, dry_run=False):
+        """按间隔检查，直到 stop_event 被设置；不在 config.PREGEN_ACTIVE_HOURS 内时跳过"""
+        interval = (interval_minutes or config.PREGEN_INTERVAL_MINUTES) * 60
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            hours = config.PREGEN_ACTIVE_HOURS
+            if hours is None or hours[0] <= datetime.now().hour < hours[1]:
+                try:
+                    print(format_report(self.run_once(dry_run=dry_run)))
+                except Exception:
+                    logging.exception("[预生成] 本轮失败")
+            stop_event.wait(interval)
+
+
+# ================= 3. 耗时报告 =================
+
+STAGE_COLUMNS = ("fetch", "select", "images", "clean", "llm", "render")
+LLM_SOURCE_NOTES = {"shared": " (共用 LLM)", "translated": " (由中文翻译)"}
+
+
+def format_report(report):
+    """把 run_once 的结果整理成表格文本"""
+    lines = [f"[预生成] {datetime.fromtimestamp(report['started_at']):%Y-%m-%d %H:%M:%S} "
+             f"状态: {report['status']}，抓取 {report['fetch_seconds']:.2f}s"]
+    if report["status"] == "failed":
+        return "\n".join(lines)
+    lines.append(f"最新发布: {report['latest_publish']}，选中分类: {'、'.join(report['selected'])}")
+    if report["status"] == "planned":
+        lines.append(f"文章{'有' if report['changed'] else '没有'}变化，将生成 {len(report['todo'])} 个组合:")
+        lines.extend(f"  {key:<24} {report['templates'][key]}" for key in report["todo"])
+        return "\n".join(lines)
+    if not report["combos"]:
+        return "\n".join(lines)
+
+    lines.append(f"{'组合':<22} {'状态':<6} {'总耗时':>7}" + "".join(f" {name:>7}" for name in STAGE_COLUMNS))
+    for entry in report["combos"]:
+        key = combo_key(entry["location"], entry["language"])
+        cells = "".join(f" {entry['stages'].get(name, 0):>7.2f}" for name in STAGE_COLUMNS)
+        note = LLM_SOURCE_NOTES.get(entry["llm_source"], "")
+        lines.append(f"{key:<22} {entry['status']:<6} {entry['seconds']:>7.2f}{cells}{note}")
+        if entry["error"]:
+            lines.append(f"    {entry['error']}")
+    lines.append(f"本轮总耗时 {report['total_seconds']:.2f}s")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="开盘前预生成 PPT")
+    parser.add_argument("--once", action="store_true", help="只执行一轮")
+    parser.add_argument("--dry-run", action="store_true", help="只抓取并列出将要生成的组合")
+    parser.add_argument("--force", action="store_true", help="文章没有变化也重新生成")
+    parser.add_argument("--interval", type=float, default=None, help="检查间隔 (分钟)")
+    args = parser.parse_args()
+
+    import render_worker
+    pregenerator = Pregenerator()
+    try:
+        if args.once:
+            report = pregenerator.run_once(dry_run=args.dry_run, force=args.force)
+            print(format_report(report))
+            return 1 if report["status"] == "failed" or any(e["status"] != "done" for e in report["combos"]) else 0
+        pregenerator.run_forever(args.interval, dry_run=args.dry_run)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        render_worker.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,174 @@
+import os
+import io
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+
+# 引入配置文件
+import config
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+常驻渲染进程 (Render Worker)
+
+以前每次渲染都在 Streamlit 的请求线程里从冷状态开始：导入 python-pptx、解析模板、生成 XML，
+CPU 密集的渲染还与 Streamlit 服务争抢同一个 GIL。这里维护一个常驻的小进程池
+(config.RENDER_WORKERS 个，spawn 启动)，每个进程在启动时 (initializer) 完成：
+- 导入 ppt_ready / python-pptx，扫描字体目录
+- 解析 config.TEMPLATE_MAP 中的所有模板，预热静态页片段缓存 (slide_cache)
+之后保持温热：字体测量表、片段缓存、图表清单都留在进程内。模板解析后只能使用一次，
+所以每次渲染完成后在后台线程 (进程空闲时) 预先解析下一份，下次渲染直接取用。
+
+主进程通过进程池 (本地管道) 提交渲染任务 (报告 JSON + 图片目录 + 地点 + 语言)，得到 PPT 字节。
+进程池异常退出时自动重建，本次渲染回退到当前进程内执行。
+"""
+
+_pool_lock = threading.Lock()
+_pool = None
+
+
+# ================= 1. 工作进程内 =================
+
+_spares = {}            # 模板绝对路径 -> (模板版本, Future[Presentation])：预先解析好的模板
+_spare_executor = None  # 工作进程内的后台解析线程
+
+
+def _template_version(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _prepare_spare(template_path, location_name=None, language=None):
+    """在后台线程预先解析一份模板 (首次还会预热该地点/语言的静态页片段)"""
+    from pptx import Presentation
+    from ppt_ready import preload_template
+
+    path = os.path.abspath(template_path)
+    if location_name and language:
+        parse = lambda: preload_template(path, location_name, language)
+    else:
+        parse = lambda: Presentation(path)
+    _spares[path] = (_template_version(path), _spare_executor.submit(parse))
+
+
+def _take_template(template_path):
+    """取出预先解析的模板；没有或模板文件已变化时返回 None (由 PPTGenerator 自行解析)"""
+    path = os.path.abspath(template_path)
+    spare = _spares.pop(path, None)
+    if spare is None or spare[0] != _template_version(path):
+        return None
+    try:
+        return spare[1].result()
+    except Exception as e:
+        logging.warning(f"[渲染进程] 预解析模板失败: {e}")
+        return None
+
+
+def _init_worker():
+    """工作进程启动：导入渲染模块，解析全部模板并预热片段缓存和字体"""
+    global _spare_executor
+    import text_metrics
+    import ppt_ready
+
+    _spare_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="template")
+    text_metrics._font_index()
+    if config.RENDER_WORKER_PRELOAD:
+        warming = []
+        for location_name, templates in config.TEMPLATE_MAP.items():
+            for language, template_path in templates.items():
+                if not os.path.exists(template_path):
+                    continue
+                if os.path.abspath(template_path) in _spares:
+                    # 同一模板用于多个地点：只预热这个地点/语言的静态页片段
+                    warming.append(_spare_executor.submit(
+                        ppt_ready.preload_template, template_path, location_name, language))
+                else:
+                    _prepare_spare(template_path, location_name, language)
+        for future in warming + [future for _, future in _spares.values()]:
+            future.exception()   # 等待预热完成，进程就绪后再接任务
+    logging.info(f"[渲染进程 {os.getpid()}] 已就绪，预解析模板 {len(_spares)} 个")
+
+
+def _ping():
+    return os.getpid()
+
+
+def _render_job(data, template_path, images_dir, location_name, language):
+    """
+    在工作进程中渲染
+    :return: PPT 字节，失败返回 None
+    """
+    from ppt_ready import PPTGenerator
+
+    generator = PPTGenerator(data, template_path, images_dir, location_name, language,
+                             template_prs=_take_template(template_path))
+    buffer = generator.render_to_buffer()
+    # 进程空闲时为下一次渲染解析模板
+    _prepare_spare(template_path)
+    return buffer.getvalue() if buffer else None
+
+
+# ================= 2. 主进程 =================
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=config.RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def enabled():
+    return config.RENDER_WORKERS > 0
+
+
+def warm_up(wait=False):
+    """
+    启动渲染进程 (流水线中与抓取/LLM 并行，进程就绪后渲染不再有冷启动)
+    :param wait: 是否等待所有进程完成预热
+    """
+    if not enabled():
+        return []
+    pool = _get_pool()
+    futures = [pool.submit(_ping) for _ in range(config.RENDER_WORKERS)]
+    if wait:
+        return sorted({f.result() for f in futures})
+    return futures
+
+
+def render_deck(data, template_path, images_dir, location_name, language, timeout=None):
+    """
+    渲染 PPT：config.RENDER_WORKERS > 0 时在常驻渲染进程中执行，否则 (或进程池异常时) 在当前进程执行
+    :return: BytesIO (已 seek 到开头)，失败返回 None
+    """
+    if enabled():
+        try:
+            future = _get_pool().submit(_render_job, data, template_path, images_dir, location_name, language)
+            deck_bytes = future.result(timeout=timeout)
+            return io.BytesIO(deck_bytes) if deck_bytes else None
+        except BrokenProcessPool as e:
+            logging.error(f"渲染进程异常退出，重建进程池并在当前进程渲染: {e}")
+            _reset_pool()
+
+    from ppt_ready import PPTGenerator
+    return PPTGenerator(data, template_path, images_dir, location_name, language).render_to_buffer()
+
+
+def shutdown():
+    _reset_pool()
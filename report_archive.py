@@ -0,0 +1,373 @@
+import os
+import re
+import json
+import shutil
+import sqlite3
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from contextlib import contextmanager
+from datetime import datetime
+
+# 引入配置文件
+import config
+from workspace import atomic_write_bytes
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+历史报告归档 (SQLite + FTS5)
+
+每次生成的报告、各资产观点、来源文章 id 以及 PPT 路径都会写入 config.ARCHIVE_DB，
+PPT 本身复制到 config.ARCHIVE_DECK_DIR/<run_id>.pptx，不会再被下一次生成覆盖。
+支持按日期范围、资产类别、关键词查询，例如“上周对黄金的观点”。
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id      TEXT UNIQUE NOT NULL,
+    created_at  TEXT NOT NULL,
+    report_date TEXT NOT NULL,
+    location    TEXT,
+    language    TEXT,
+    model_name  TEXT,
+    deck_path   TEXT,
+    report_json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reports_date ON reports(report_date);
+
+CREATE TABLE IF NOT EXISTS asset_views (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    report_id INTEGER NOT NULL REFERENCES reports(id) ON DELETE CASCADE,
+    asset     TEXT NOT NULL,
+    title     TEXT,
+    bullets   TEXT,
+    summary   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_views_asset ON asset_views(asset, report_id);
+
+CREATE TABLE IF NOT EXISTS sources (
+    report_id    INTEGER NOT NULL REFERENCES reports(id) ON DELETE CASCADE,
+    article_id   TEXT,
+    category     TEXT,
+    title        TEXT,
+    publish_time TEXT,
+    content_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sources_report ON sources(report_id);
+"""
+
+# trigram 分词支持中文子串匹配 (SQLite >= 3.34)，关键词至少 3 个字符
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS asset_views_fts USING fts5(
+    title, bullets, summary, tokenize='trigram'
+);
+"""
+FTS_MIN_KEYWORD_LEN = 3
+
+# 后台写入 (write-behind)：单线程按提交顺序归档，不阻塞下载
+_write_behind = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive")
+
+
+# ================= 1. 工具函数 =================
+
+def standard_asset_name(title):
+    """
+    从观点标题 (“黄金：xxx” / “Gold: xxx”) 得到资产的中文标准名
+    与 PPTGenerator._get_standard_keys 使用同一张 config.ASSET_KEYWORD_MAP
+    """
+    prefix = re.split(r'[：:]', title or "", maxsplit=1)[0].strip()
+    prefix_lower = prefix.lower()
+    for keyword, chinese_name in config.ASSET_KEYWORD_MAP.items():
+        if keyword.lower() in prefix_lower:
+            return chinese_name
+    return prefix
+
+
+def article_fingerprint(article):
+    """文章内容指纹：只对标题和正文做哈希 (local_image_path 等运行时字段不影响)"""
+    payload = json.dumps(
+        {"titles": article.get("titles", {}), "contents": article.get("contents", {})},
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def read_source_articles(articles_dir):
+    """读取 json_main 输出目录中的文章，返回来源记录列表"""
+    records = []
+    if not articles_dir or not os.path.isdir(articles_dir):
+        return records
+    for filename in sorted(os.listdir(articles_dir)):
+        if not filename.lower().endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(articles_dir, filename), "r", encoding="utf-8") as f:
+                article = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"读取来源文章失败 {filename}: {e}")
+            continue
+        records.append({
+            "article_id": str(article.get("id") or article.get("uuid") or ""),
+            # 文件名格式：类别_发布时间.json
+            "category": filename.rsplit("_", 1)[0],
+            "title": article.get("titles", {}).get("zh_CN", ""),
+            "publish_time": article.get("metadata", {}).get("audit", {}).get("publishTime", ""),
+            "content_hash": article_fingerprint(article),
+        })
+    return records
+
+
+# ================= 2. 归档 =================
+
+class ReportArchive:
+    def __init__(self, db_path=None, deck_dir=None):
+        self.db_path = db_path or config.ARCHIVE_DB
+        self.deck_dir = deck_dir or config.ARCHIVE_DECK_DIR
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        os.makedirs(self.deck_dir, exist_ok=True)
+        self.has_fts = False
+        self._init_schema()
+
+    @contextmanager
+    def _connect(self):
+        """每次操作单独连接 (Streamlit 每个会话在不同线程里运行)，正常退出时提交，异常时回滚"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _init_schema(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode = WAL")  # 读写并发
+            conn.executescript(SCHEMA)
+            try:
+                conn.executescript(FTS_SCHEMA)
+                self.has_fts = True
+            except sqlite3.OperationalError as e:
+                logging.warning(f"FTS5 不可用，关键词查询退化为 LIKE: {e}")
+
+    def archive_report(self, report, run_id, location=None, language=None, deck_path=None,
+                       articles_dir=None, report_date=None, model_name=None, deck_bytes=None):
+        """
+        归档一次生成结果
+        :param report: LLM 输出的报告 JSON
+        :param deck_path: 生成的 PPT，会被复制到归档目录
+        :param deck_bytes: 内存中的 PPT (render_to_buffer 的结果)，优先于 deck_path
+        :param articles_dir: json_main 输出的文章目录，用于记录来源文章 id
+        :return: 报告 id，失败返回 None
+        """
+        try:
+            archived_deck = None
+            if deck_bytes is not None:
+                archived_deck = os.path.join(self.deck_dir, f"{run_id}.pptx")
+                atomic_write_bytes(archived_deck, deck_bytes)
+            elif deck_path and os.path.exists(deck_path):
+                archived_deck = os.path.join(self.deck_dir, f"{run_id}.pptx")
+                shutil.copyfile(deck_path, archived_deck)
+
+            now = datetime.now()
+            report_date = report_date or now.strftime("%Y-%m-%d")
+            views = self._extract_views(report)
+            sources = read_source_articles(articles_dir)
+
+            with self._connect() as conn:
+                cur = conn.execute(
+                    "INSERT INTO reports (run_id, created_at, report_date, location, language, model_name, deck_path, report_json)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (run_id, now.isoformat(timespec="seconds"), report_date, location, language,
+                     model_name or config.AI_MODEL_NAME, archived_deck, json.dumps(report, ensure_ascii=False))
+                )
+                report_id = cur.lastrowid
+
+                for view in views:
+                    cur = conn.execute(
+                        "INSERT INTO asset_views (report_id, asset, title, bullets, summary) VALUES (?, ?, ?, ?, ?)",
+                        (report_id, view["asset"], view["title"], json.dumps(view["bullets"], ensure_ascii=False), view["summary"])
+                    )
+                    if self.has_fts:
+                        conn.execute(
+                            "INSERT INTO asset_views_fts (rowid, title, bullets, summary) VALUES (?, ?, ?, ?)",
+                            (cur.lastrowid, view["title"], "\n".join(view["bullets"]), view["summary"])
+                        )
+
+                conn.executemany(
+                    "INSERT INTO sources (report_id, article_id, category, title, publish_time, content_hash)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    [(report_id, s["article_id"], s["category"], s["title"], s["publish_time"], s["content_hash"]) for s in sources]
+                )
+
+            logging.info(f"报告已归档: run_id={run_id}, 资产 {len(views)} 个, 来源文章 {len(sources)} 篇")
+            return report_id
+        except Exception as e:
+            logging.error(f"报告归档失败: {e}")
+            return None
+
+    def archive_report_async(self, *args, **kwargs):
+        """在后台线程中调用 archive_report，返回 Future"""
+        return _write_behind.submit(self.archive_report, *args, **kwargs)
+
+    @staticmethod
+    def flush(timeout=None):
+        """
+        等待本进程已提交的后台归档全部写完 (单线程按提交顺序执行，排在最后的空任务完成即全部完成)
+        :return: 是否在 timeout 秒内写完
+        """
+        try:
+            _write_behind.submit(lambda: None).result(timeout)
+            return True
+        except FuturesTimeoutError:
+            logging.warning(f"后台归档 {timeout} 秒内未写完")
+            return False
+
+    def _extract_views(self, report):
+        """把 content_slides 和 executive_summary 按资产合并成一行一条"""
+        summary_by_asset = {}
+        summary = report.get("executive_summary", {})
+        cols = summary.get("columns", [])
+        if len(cols) >= 2:
+            for row in summary.get("rows", []):
+                summary_by_asset[standard_asset_name(row.get(cols[0], ""))] = row.get(cols[1], "")
+
+        views = []
+        for slide in report.get("content_slides", []):
+            asset = standard_asset_name(slide.get("title", ""))
+            views.append({
+                "asset": asset,
+                "title": slide.get("title", ""),
+                "bullets": slide.get("bullets", []),
+                "summary": summary_by_asset.get(asset, ""),
+            })
+        return views
+
+    # ================= 3. 查询 =================
+
+    def query_views(self, start_date=None, end_date=None, asset=None, keyword=None,
+                    location=None, language=None, limit=50):
+        """
+        按日期范围 / 资产 / 关键词查询各资产观点，最新的在前
+        :param start_date: "YYYY-MM-DD"，包含
+        :param end_date: "YYYY-MM-DD"，包含
+        :param asset: 中文标准名 (如 "黄金")
+        :return: list of dict (report_id, run_id, report_date, location, language, deck_path, asset, title, bullets, summary)
+        """
+        sql = (
+            "SELECT r.id AS report_id, r.run_id, r.report_date, r.location, r.language, r.deck_path,"
+            " v.asset, v.title, v.bullets, v.summary"
+            " FROM asset_views v JOIN reports r ON r.id = v.report_id"
+        )
+        where, params = [], []
+
+        if keyword:
+            if self.has_fts and len(keyword) >= FTS_MIN_KEYWORD_LEN:
+                where.append("v.id IN (SELECT rowid FROM asset_views_fts WHERE asset_views_fts MATCH ?)")
+                params.append('"' + keyword.replace('"', '""') + '"')
+            else:
+                where.append("(v.title LIKE ? OR v.bullets LIKE ? OR v.summary LIKE ?)")
+                params.extend([f"%{keyword}%"] * 3)
+        if start_date:
+            where.append("r.report_date >= ?")
+            params.append(start_date)
+        if end_date:
+            where.append("r.report_date <= ?")
+            params.append(end_date)
+        if asset:
+            where.append("v.asset = ?")
+            params.append(asset)
+        if location:
+            where.append("r.location = ?")
+            params.append(location)
+        if language:
+            where.append("r.language = ?")
+            params.append(language)
+
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY r.report_date DESC, r.id DESC LIMIT ?"
+        params.append(limit)
+
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        results = []
+        for row in rows:
+            item = dict(row)
+            item["bullets"] = json.loads(item["bullets"] or "[]")
+            results.append(item)
+        return results
+
+    def query_reports(self, start_date=None, end_date=None, location=None, language=None, limit=50):
+        """按日期范围查询整份报告 (不含 report_json)"""
+        sql = "SELECT id, run_id, created_at, report_date, location, language, model_name, deck_path FROM reports"
+        where, params = [], []
+        if start_date:
+            where.append("report_date >= ?")
+            params.append(start_date)
+        if end_date:
+            where.append("report_date <= ?")
+            params.append(end_date)
+        if location:
+            where.append("location = ?")
+            params.append(location)
+        if language:
+            where.append("language = ?")
+            params.append(language)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY report_date DESC, id DESC LIMIT ?"
+        params.append(limit)
+
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+    def latest_report(self, language=None, location=None):
+        """最近一次归档的完整报告 (含来源文章)，没有时返回 None"""
+        reports = self.query_reports(location=location, language=language, limit=1)
+        return self.get_report(reports[0]["id"]) if reports else None
+
+    def find_report_by_sources(self, content_hashes, language=None, limit=20):
+        """
+        来源文章与给定的完全相同 (各分类的内容指纹一致) 的最近一份报告
+        :param content_hashes: {分类: 内容指纹}
+        :return: get_report 的结果，没有时返回 None
+        """
+        if not content_hashes:
+            return None
+        hashes = sorted(set(content_hashes.values()))
+        sql = ("SELECT r.id FROM reports r JOIN sources s ON s.report_id = r.id"
+               f" WHERE s.content_hash IN ({','.join('?' * len(hashes))})")
+        params = list(hashes)
+        if language:
+            sql += " AND r.language = ?"
+            params.append(language)
+        sql += " GROUP BY r.id HAVING COUNT(DISTINCT s.content_hash) = ? ORDER BY r.id DESC LIMIT ?"
+        params += [len(hashes), limit]
+
+        with self._connect() as conn:
+            report_ids = [row["id"] for row in conn.execute(sql, params).fetchall()]
+        for report_id in report_ids:
+            # 还要求没有多出的来源文章
+            item = self.get_report(report_id)
+            if item and {s["category"]: s["content_hash"] for s in item["sources"]} == content_hashes:
+                return item
+        return None
+
+    def get_report(self, report_id):
+        """读取整份报告及其来源文章"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM reports WHERE id = ?", (report_id,)).fetchone()
+            if not row:
+                return None
+            sources = conn.execute("SELECT * FROM sources WHERE report_id = ?", (report_id,)).fetchall()
+        item = dict(row)
+        item["report"] = json.loads(item.pop("report_json"))
+        item["sources"] = [dict(s) for s in sources]
+        return item
@@ -0,0 +1,231 @@
+import os
+import logging
+
+# 引入配置文件
+import config
+from workspace import atomic_write_json
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+报告生成流水线的组装 (Streamlit 界面 ai_ppt.py 与 HTTP 服务 api_server.py 共用)
+
+本模块只依赖标准库和 config：流水线各阶段用到的模块 (construct_json, AI_prompt_ready,
+ppt_ready, http_client 等) 在阶段内才导入。
+"""
+
+# ================= 1. 抓取与模板选择 =================
+
+def get_news_platform_token():
+    """获取 News Platform Token (使用 config.py 配置)"""
+    import http_client
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    data = {
+        'client_id': config.NEWS_CLIENT_ID,
+        'client_secret': config.NEWS_CLIENT_SECRET,
+        'grant_type': 'client_credentials'
+    }
+    try:
+        response = http_client.post(config.NEWS_AUTH_URL, headers=headers, data=data, timeout=(config.HTTP_CONNECT_TIMEOUT, 10),
+                                    retry=http_client.RetryPolicy(retry_unsafe=True))
+        response.raise_for_status()
+        return response.json().get('access_token')
+    except Exception as e:
+        logging.error(f"获取 News Token 失败: {e}")
+        return None
+
+def fetch_articles(token):
+    """抓取文章列表"""
+    import http_client
+    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+    try:
+        response = http_client.get(config.NEWS_ARTICLE_URL, headers=headers, timeout=(config.HTTP_CONNECT_TIMEOUT, 30))
+        if response.status_code == 200:
+            return response.json()
+        elif response.status_code == 401:
+            return "EXPIRED"
+        return None
+    except Exception as e:
+        logging.error(f"文章抓取失败: {e}")
+        return None
+
+def save_temp_json(data, filename='articles.json'):
+    """保存临时 JSON 数据"""
+    try:
+        atomic_write_json(filename, data)
+        return True
+    except Exception as e:
+        logging.error(f"保存 {filename} 失败: {e}")
+        return False
+
+def choose_template(location_name, language="cn"):
+    """根据地点和语言选择模板"""
+    # 获取地点对应的模板映射
+    location_templates = config.TEMPLATE_MAP.get(location_name, config.TEMPLATE_MAP["香港/Hong Kong"])
+    
+    # 根据语言选择模板
+    template_path = location_templates.get(language, location_templates["cn"])
+    
+    # 检查文件是否存在，如果不存在则使用默认语言
+    if not os.path.exists(template_path):
+        template_path = location_templates["cn"]
+    
+    return template_path
+
+def get_language(language):
+    """根据 config 映射获取模板路径"""
+    # 默认为香港模板
+    rel_language = config.LANGUAGE_MAP.get(language, config.LANGUAGE_MAP["中文/Chinese"])
+    # Streamlit 中直接使用相对路径通常没问题
+    return rel_language
+
+# ================= 2. 流水线 =================
+
+def build_report_pipeline(workspace, location_name, language_code, incremental=False, on_stage_done=None,
+                          articles=None, translate_en=None, on_stage_progress=None):
+    """
+    把生成流程组装成 DAG：
+    fetch → select → {images, clean → llm} → render，template 预加载与之并行
+    各阶段失败时抛出 StageError，信息直接展示给用户
+    :param articles: 已抓取的文章列表 (fetch_articles 的返回值)，给出时 fetch 阶段不再请求 News Platform
+    :param translate_en: 英文版优先由同一批文章的中文报告翻译 (非增量时)，默认 config.EN_TRANSLATE_FROM_CN
+    :param on_stage_progress: 阶段内进度回调 (见 Pipeline)，clean 阶段上报 (已清洗文件数, 总数)
+    """
+    from pipeline import Pipeline, StageError
+
+    template_path = choose_template(location_name, language_code)
+    timeouts = config.PIPELINE_STAGE_TIMEOUTS
+    if translate_en is None:
+        translate_en = config.EN_TRANSLATE_FROM_CN
+    from_chinese = translate_en and language_code == "en" and not incremental
+
+    def fetch(ctx):
+        data = articles
+        if data is None:
+            token = get_news_platform_token()
+            if not token:
+                raise StageError("无法获取 News Token")
+            data = fetch_articles(token)
+        if not data or data == "EXPIRED":
+            raise StageError("文章列表为空或 Token 失效")
+        if not save_temp_json(data, workspace.articles_json):
+            raise StageError("文章保存失败")
+        return workspace.articles_json
+
+    def template(ctx):
+        # 模板解析和静态页片段与抓取/LLM 并行，渲染时直接使用
+        # 使用常驻渲染进程时，这里只确保进程已启动并完成预热
+        import render_worker
+        if render_worker.enabled():
+            render_worker.warm_up(wait=True)
+            return None
+        from ppt_ready import preload_template
+        return preload_template(template_path, location_name, language_code)
+
+    def select(ctx):
+        from construct_json import prepare_articles
+        prepared = prepare_articles(ctx["fetch"], output_root=workspace.input_dir)
+        if not prepared or not os.path.exists(prepared["articles_dir"]):
+            raise StageError("文件处理失败")
+        return prepared
+
+    def images(ctx):
+        from construct_json import download_article_images
+        prepared = ctx["select"]
+        return download_article_images(prepared["image_tasks"], prepared["output_dir"], cancel_event=ctx.cancel_event)
+
+    def clean(ctx):
+        from construct_json import batch_process
+        return batch_process(ctx["select"]["articles_dir"], workspace.cleaned_dir,
+                             progress_callback=ctx.report_progress)
+
+    def llm(ctx):
+        if from_chinese:
+            from report_translation import translate_archived_report
+            translated = translate_archived_report(ctx["select"]["articles_dir"])
+            if translated:
+                atomic_write_json(workspace.report_path, translated)
+                return translated, None
+        from AI_prompt_ready import AIPromptRunner
+        from incremental import run_incremental
+        runner = AIPromptRunner(language=language_code)
+        runner.cancel_event = ctx.cancel_event
+        plan = None
+        if incremental:
+            final_json_data, plan = run_incremental(
+                runner, workspace.cleaned_dir, ctx["select"]["articles_dir"], workspace.report_path
+            )
+        else:
+            final_json_data = runner.run(specific_folder=workspace.cleaned_dir, report_path=workspace.report_path)
+        if not final_json_data:
+            raise StageError("AI 生成失败")
+        return final_json_data, plan
+
+    def render(ctx):
+        import render_worker
+        final_json_data, _ = ctx["llm"]
+        images_dir = ctx["select"]["images_dir"]
+        if render_worker.enabled():
+            # 在常驻渲染进程中执行 (模板、片段缓存、字体测量都已预热，不占用 Streamlit 进程的 GIL)
+            deck_buffer = render_worker.render_deck(final_json_data, template_path, images_dir,
+                                                    location_name, language_code)
+        else:
+            from ppt_ready import PPTGenerator
+            generator = PPTGenerator(final_json_data, template_path, images_dir, location_name,
+                                     language=language_code, template_prs=ctx["template"])
+            deck_buffer = generator.render_to_buffer()
+        if not deck_buffer:
+            raise StageError("PPT 生成过程中发生错误")
+        return deck_buffer
+
+    pipeline = Pipeline(on_stage_done=on_stage_done, on_stage_progress=on_stage_progress)
+    pipeline.add("fetch", fetch, timeout=timeouts.get("fetch"))
+    pipeline.add("template", template, timeout=timeouts.get("template"))
+    pipeline.add("select", select, ["fetch"], timeout=timeouts.get("select"))
+    pipeline.add("images", images, ["select"], timeout=timeouts.get("images"))
+    pipeline.add("clean", clean, ["select"], timeout=timeouts.get("clean"))
+    pipeline.add("llm", llm, ["clean"], timeout=timeouts.get("llm"))
+    pipeline.add("render", render, ["images", "llm", "template"], timeout=timeouts.get("render"))
+    pipeline.template_path = template_path
+    return pipeline
+
+
+# ================= 3. 结果保存 =================
+
+def output_filename(location_name, language_code):
+    return f"AI_PPT_generated_{location_name}_{language_code}.pptx"
+
+
+def record_run(workspace, results, location_name, language_code, template_path):
+    """
+    流水线完成后：录制运行包 (之后可以离线回放)，归档报告和 PPT (「历史报告」面板可直接取回)
+    :param results: pipeline.run() 的结果
+    :return: (PPT 字节, 下载文件名)
+    """
+    from run_bundle import save_run_bundle
+    from report_archive import ReportArchive
+
+    final_json_data, _ = results["llm"]
+    articles_dir = results["select"]["articles_dir"]
+    images_dir = results["select"]["images_dir"]
+    filename = output_filename(location_name, language_code)
+
+    save_run_bundle(final_json_data, articles_dir, images_dir, {
+        "location": location_name,
+        "language": language_code,
+        "template_path": template_path,
+        "model_name": config.AI_MODEL_NAME,
+        "output_filename": filename,
+    }, run_id=workspace.run_id)
+    deck_bytes = results["render"].getvalue()
+    archive = ReportArchive()
+    archive_args = dict(
+        location=location_name, language=language_code,
+        articles_dir=articles_dir, deck_bytes=deck_bytes
+    )
+    if config.ARCHIVE_WRITE_BEHIND:
+        archive.archive_report_async(final_json_data, workspace.run_id, **archive_args)
+    else:
+        archive.archive_report(final_json_data, workspace.run_id, **archive_args)
+    return deck_bytes, filename
@@ -0,0 +1,224 @@
+import re
+import copy
+import time
+import logging
+
+# 引入配置文件
+import config
+from report_archive import ReportArchive, read_source_articles, standard_asset_name
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+由中文报告生成英文版 (批量翻译)
+
+英文版原本要用 AI_SYSTEM_PROMPT_en 对同样的中文文章再提交一次 LLM 任务，多等几分钟。
+这里直接翻译已完成的中文报告 (document / executive_summary / content_slides)：
+
+- 资产名称不交给翻译：标题 “黄金：xxx” 的前缀和执行摘要的资产类别列通过 standard_asset_name
+  (与 PPTGenerator._get_standard_keys 同一张 config.ASSET_KEYWORD_MAP) 得到中文标准名，
+  再换成 config.ASSET_PROMPT_NAMES["en"] 中的英文名，保证与英文 Prompt 的输出一致
+- 术语表 (资产名称 + config.TRANSLATION_GLOSSARY) 在翻译前先替换为固定译法
+- 所有待翻译的文本按行拼接，每 config.TRANSLATION_MAX_CHARS 个字符一次请求 (通常一份报告只需一次)；
+  返回的行数对不上时，该批退回逐条翻译
+- 报告结构 (键、顺序、条数) 保持不变
+
+流水线中 (config.EN_TRANSLATE_FROM_CN 或界面勾选) 英文版先找同一批文章 (内容指纹相同) 最近归档的中文报告，
+有则翻译，没有或翻译结果校验不通过时照常提交英文 LLM 任务；预生成时直接翻译本轮的中文结果。
+"""
+
+SUMMARY_COLUMNS = {"资产类别": "Asset Class", "投资逻辑": "Investment Logic"}
+DOCUMENT_TITLES = {"环球市场投资观点": "Global Investment Outlook"}
+
+
+def glossary():
+    """中文术语 -> 固定译法 (资产名称与英文 Prompt 一致)"""
+    terms = dict(config.ASSET_PROMPT_NAMES["en"])
+    terms.update({cn: terms[std] for cn, std in config.ASSET_KEYWORD_MAP.items()
+                  if std in terms and not cn.isascii()})
+    terms.update(config.TRANSLATION_GLOSSARY)
+    return terms
+
+
+def split_title(title):
+    """“黄金：xxx” -> ("黄金", "：", "xxx")，没有冒号时 ("黄金", "", "")"""
+    match = re.match(r"([^：:]*)([：:])(.*)", title, re.DOTALL)
+    return match.groups() if match else (title, "", "")
+
+
+def google_translate(text):
+    """默认的翻译函数 (deep_translator 用到时才导入)"""
+    from deep_translator import GoogleTranslator
+    return GoogleTranslator(source="zh-CN", target="en").translate(text)
+
+
+class ReportTranslator:
+    """
+    :param translate: translate(text) -> 译文，默认 Google 翻译 (测试/压测时可替换)
+    """
+
+    def __init__(self, translate=None, max_chars=None, terms=None):
+        self.translate = translate or google_translate
+        self.max_chars = max_chars or config.TRANSLATION_MAX_CHARS
+        self.terms = terms or glossary()
+        # 长词优先 (例如 “中港股市” 先于 “港股”)
+        self._term_re = re.compile("|".join(re.escape(t) for t in sorted(self.terms, key=len, reverse=True)))
+        self.requests = 0
+
+    # ================= 1. 批量翻译 =================
+
+    def _prepare(self, text):
+        """术语替换为固定译法，全角冒号换成英文冒号，去掉换行 (按行拼接)"""
+        text = self._term_re.sub(lambda m: f" {self.terms[m.group(0)]} ", text)
+        text = text.replace("：", ": ")
+        return re.sub(r"\s+", " ", text).strip()
+
+    def _batches(self, texts):
+        batch, size = [], 0
+        for text in texts:
+            if batch and size + len(text) + 1 > self.max_chars:
+                yield batch
+                batch, size = [], 0
+            batch.append(text)
+            size += len(text) + 1
+        if batch:
+            yield batch
+
+    def _translate_batch(self, batch):
+        self.requests += 1
+        translated = (self.translate("\n".join(batch)) or "").split("\n")
+        if len(translated) == len(batch):
+            return [line.strip() for line in translated]
+        logging.warning(f"批量翻译返回 {len(translated)} 行 (应为 {len(batch)} 行)，改为逐条翻译")
+        result = []
+        for text in batch:
+            self.requests += 1
+            result.append((self.translate(text) or text).strip())
+        return result
+
+    def translate_texts(self, texts):
+        """:return: 与 texts 一一对应的译文 (空字符串和纯英文不翻译)"""
+        prepared = [self._prepare(t) for t in texts]
+        todo = [t for t in dict.fromkeys(prepared) if t and not t.isascii()]
+        translated = {}
+        for batch in self._batches(todo):
+            translated.update(zip(batch, self._translate_batch(batch)))
+        return [translated.get(t, t) for t in prepared]
+
+    # ================= 2. 报告 =================
+
+    def _asset_name_en(self, text):
+        """资产名称 -> 英文标准名，无法识别时返回 None"""
+        return config.ASSET_PROMPT_NAMES["en"].get(standard_asset_name(text))
+
+    def translate_report(self, report):
+        """
+        :param report: 中文报告 (AIPromptRunner.run 的输出)
+        :return: 结构相同的英文报告
+        """
+        result = copy.deepcopy(report)
+        texts, setters = [], []
+
+        def queue(text, setter):
+            texts.append(text or "")
+            setters.append(setter)
+
+        # document：标题优先使用固定译法，作者、日期不变
+        document = result.get("document", {})
+        title = document.get("title", "")
+        if title in DOCUMENT_TITLES:
+            document["title"] = DOCUMENT_TITLES[title]
+        elif title:
+            queue(title, lambda v: document.__setitem__("title", v))
+
+        # executive_summary：列名固定译法 (行的键随之改名)，资产类别列换成英文标准名，其余列翻译
+        summary = result.get("executive_summary", {})
+        columns = summary.get("columns", [])
+        rows = []
+        for row in summary.get("rows", []):
+            new_row = {}
+            # 第一列是资产类别 (与 llm_output 的资产覆盖检查一致)
+            asset_key = columns[0] if columns else next(iter(row), None)
+            for key, value in row.items():
+                new_key = SUMMARY_COLUMNS.get(key, key)
+                asset_en = self._asset_name_en(str(value)) if key == asset_key else None
+                if asset_en:
+                    new_row[new_key] = asset_en
+                else:
+                    new_row[new_key] = value
+                    if isinstance(value, str):
+                        queue(value, lambda v, r=new_row, k=new_key: r.__setitem__(k, v))
+            rows.append(new_row)
+        if summary:
+            summary["columns"] = [SUMMARY_COLUMNS.get(c, c) for c in columns]
+            summary["rows"] = rows
+
+        # content_slides：标题的资产前缀换成英文标准名，其余部分和每条观点翻译
+        for slide in result.get("content_slides", []):
+            prefix, sep, rest = split_title(slide.get("title", ""))
+            asset_en = self._asset_name_en(prefix)
+            if asset_en and sep:
+                queue(rest, lambda v, s=slide, a=asset_en: s.__setitem__("title", f"{a}: {v}"))
+            elif asset_en:
+                slide["title"] = asset_en
+            else:
+                queue(slide.get("title", ""), lambda v, s=slide: s.__setitem__("title", v))
+            bullets = slide.get("bullets", [])
+            for i, bullet in enumerate(bullets):
+                queue(bullet, lambda v, b=bullets, i=i: b.__setitem__(i, v))
+
+        for setter, value in zip(setters, self.translate_texts(texts)):
+            setter(value)
+        return result
+
+
+def translate_report(report, translate=None):
+    """把中文报告翻译为英文版 (见 ReportTranslator)"""
+    return ReportTranslator(translate).translate_report(report)
+
+
+def find_chinese_report(articles_dir, archive=None, flush_timeout=10):
+    """
+    同一批文章 (各分类文章的内容指纹都相同) 最近归档的中文报告
+    按内容指纹查找所有归档的中文报告，而不只是最近一份；查找前先等本进程的后台归档
+    (config.ARCHIVE_WRITE_BEHIND) 写完，刚完成的中文版也能找到
+    :return: ReportArchive.get_report 的结果，没有时返回 None
+    """
+    current = {s["category"]: s["content_hash"] for s in read_source_articles(articles_dir)}
+    if not current:
+        return None
+    archive = archive or ReportArchive()
+    archive.flush(flush_timeout)
+    return archive.find_report_by_sources(current, language="cn")
+
+
+def translate_checked(report, translate=None):
+    """
+    翻译并校验 (结构和资产覆盖与 LLM 输出使用同一套检查)
+    :return: 英文报告，失败或校验不通过时返回 None
+    """
+    from llm_output import validate_report
+
+    start = time.perf_counter()
+    try:
+        translator = ReportTranslator(translate)
+        result = translator.translate_report(report)
+    except Exception as e:
+        logging.warning(f"翻译中文报告失败: {e}")
+        return None
+    problems = [p for p in validate_report(result, expected_assets=config.ASSET_CLASSES) if not p.soft]
+    if problems:
+        logging.warning(f"翻译结果校验未通过: {problems}")
+        return None
+    logging.info(f"英文版由中文报告翻译完成: {translator.requests} 次请求, {time.perf_counter() - start:.2f}s")
+    return result
+
+
+def translate_archived_report(articles_dir, archive=None, translate=None):
+    """:return: 由同一批文章的中文报告翻译的英文报告，没有可用的中文报告或翻译失败时返回 None"""
+    previous = find_chinese_report(articles_dir, archive)
+    if previous is None:
+        logging.info("没有同一批文章的中文报告，提交英文 LLM 任务")
+        return None
+    return translate_checked(previous["report"], translate)
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import shutil
+import logging
+import zipfile
+import tempfile
+from datetime import datetime
+
+# 引入配置文件
+import config
+from workspace import new_run_id
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+运行包 (Run Bundle)：把一次生成所用到的文章、图片、LLM 输出 JSON 和用户设置打包成一个 zip，
+之后可以只用 PPTGenerator 离线重新渲染，不需要再抓取文章或等待 LLM。
+
+包结构：
+- manifest.json  版本号、创建时间、设置 (地点/语言/模板/模型)
+- report.json    LLM 返回并清洗后的报告 JSON
+- articles/      json_main 保存的原始文章
+- images/        json_main 下载的图片
+
+命令行用法：
+    python run_bundle.py <bundle.zip> [输出.pptx] [--template 模板路径]
+    python run_bundle.py --list
+"""
+
+BUNDLE_VERSION = 1
+BUNDLE_MANIFEST = "manifest.json"
+BUNDLE_REPORT = "report.json"
+BUNDLE_ARTICLES = "articles"
+BUNDLE_IMAGES = "images"
+
+
+# ================= 1. 录制 =================
+
+def _add_folder(zf, folder, arc_prefix):
+    """把文件夹下的文件 (不含子目录) 写入 zip 的指定前缀下"""
+    if not folder or not os.path.isdir(folder):
+        return 0
+    count = 0
+    for filename in sorted(os.listdir(folder)):
+        path = os.path.join(folder, filename)
+        if os.path.isfile(path):
+            zf.write(path, f"{arc_prefix}/{filename}")
+            count += 1
+    return count
+
+
+def save_run_bundle(report_data, articles_dir, images_dir, settings, bundle_path=None, run_id=None):
+    """
+    录制一次生成的全部素材
+    :param report_data: LLM 输出的报告 JSON (dict)
+    :param articles_dir: 文章目录 (json_main 的输出)
+    :param images_dir: 图片目录 (json_main 的输出)
+    :param settings: 地点、语言、模板路径等设置 (dict)
+    :param bundle_path: zip 路径，默认放在 config.BUNDLE_DIR 下，按 run_id 命名
+    :param run_id: 本次运行的 run_id (workspace.new_run_id，时间戳 + 随机后缀)，
+                   并发运行同一秒完成时也不会重名；未给出时新生成一个
+    :return: bundle 路径，失败返回 None
+    """
+    if not bundle_path:
+        os.makedirs(config.BUNDLE_DIR, exist_ok=True)
+        run_id = run_id or new_run_id()
+        bundle_path = os.path.join(
+            config.BUNDLE_DIR,
+            f"bundle_{run_id}_{settings.get('language', 'cn')}.zip"
+        )
+
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "settings": settings,
+    }
+
+    tmp_path = None
+    try:
+        # 先写同目录下的临时文件再改名，避免录制中途失败留下半个 zip (临时文件名唯一，并发录制互不覆盖)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp_bundle_", suffix=".zip.tmp",
+                                        dir=os.path.dirname(bundle_path) or ".")
+        with os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(BUNDLE_MANIFEST, json.dumps(manifest, ensure_ascii=False, indent=2))
+            zf.writestr(BUNDLE_REPORT, json.dumps(report_data, ensure_ascii=False, indent=2))
+            n_articles = _add_folder(zf, articles_dir, BUNDLE_ARTICLES)
+            n_images = _add_folder(zf, images_dir, BUNDLE_IMAGES)
+        os.replace(tmp_path, bundle_path)
+        logging.info(f"运行包已保存: {bundle_path} (文章 {n_articles} 篇, 图片 {n_images} 张)")
+        return bundle_path
+    except Exception as e:
+        logging.error(f"运行包保存失败: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+
+# ================= 2. 读取与回放 =================
+
+def load_run_bundle(bundle_path, extract_dir):
+    """
+    解压运行包
+    :return: dict(manifest, settings, report, articles_dir, images_dir)
+    """
+    with zipfile.ZipFile(bundle_path, "r") as zf:
+        manifest = json.loads(zf.read(BUNDLE_MANIFEST).decode("utf-8"))
+        if manifest.get("version") != BUNDLE_VERSION:
+            raise ValueError(f"不支持的运行包版本: {manifest.get('version')}")
+        report = json.loads(zf.read(BUNDLE_REPORT).decode("utf-8"))
+        zf.extractall(extract_dir)
+
+    return {
+        "manifest": manifest,
+        "settings": manifest.get("settings", {}),
+        "report": report,
+        "articles_dir": os.path.join(extract_dir, BUNDLE_ARTICLES),
+        "images_dir": os.path.join(extract_dir, BUNDLE_IMAGES),
+    }
+
+
+def replay_bundle(bundle_path, output_path=None, template_path=None, location_name=None, language=None):
+    """
+    只用 PPTGenerator 重新渲染运行包
+    模板 / 地点 / 语言可以覆盖包内记录的设置，便于调整模板布局
+    :return: (是否成功, 输出路径, 渲染耗时秒数)
+    """
+    # 延迟导入：回放只需要渲染模块
+    from ppt_ready import PPTGenerator
+
+    extract_dir = tempfile.mkdtemp(prefix="bundle_", dir=config.BASE_DIR)
+    try:
+        bundle = load_run_bundle(bundle_path, extract_dir)
+        settings = bundle["settings"]
+
+        location_name = location_name or settings.get("location")
+        language = language or settings.get("language", "cn")
+        template_path = template_path or settings.get("template_path")
+
+        if not output_path:
+            base = os.path.splitext(os.path.basename(bundle_path))[0]
+            output_path = os.path.join(config.OUTPUT_DIR, f"replay_{base}.pptx")
+
+        start = time.perf_counter()
+        generator = PPTGenerator(bundle["report"], template_path, bundle["images_dir"], location_name, language=language)
+        success = generator.run(output_path)
+        elapsed = time.perf_counter() - start
+
+        logging.info(f"回放完成: {bundle_path} -> {output_path} (耗时 {elapsed:.2f}s)")
+        return success, output_path, elapsed
+    finally:
+        shutil.rmtree(extract_dir, ignore_errors=True)
+
+
+def list_bundles(bundle_dir=None):
+    """按时间倒序列出已录制的运行包"""
+    bundle_dir = bundle_dir or config.BUNDLE_DIR
+    if not os.path.isdir(bundle_dir):
+        return []
+    bundles = [
+        os.path.join(bundle_dir, f) for f in os.listdir(bundle_dir)
+        if f.lower().endswith(".zip")
+    ]
+    bundles.sort(key=os.path.getmtime, reverse=True)
+    return bundles
+
+
+def read_bundle_settings(bundle_path):
+    """只读取包内的设置，不解压图片"""
+    with zipfile.ZipFile(bundle_path, "r") as zf:
+        manifest = json.loads(zf.read(BUNDLE_MANIFEST).decode("utf-8"))
+    return manifest.get("settings", {})
+
+
+# ================= 命令行入口 =================
+
+if __name__ == "__main__":
+    import sys
+
+    args = sys.argv[1:]
+    if not args or args[0] in ("-h", "--help"):
+        print("用法: python run_bundle.py <bundle.zip> [输出.pptx] [--template 模板路径]")
+        print("      python run_bundle.py --list")
+        sys.exit(0)
+
+    if args[0] == "--list":
+        for path in list_bundles():
+            print(f"{path}  {read_bundle_settings(path)}")
+        sys.exit(0)
+
+    override_template = None
+    if "--template" in args:
+        i = args.index("--template")
+        override_template = args[i + 1]
+        args = args[:i] + args[i + 2:]
+
+    ok, out_path, _ = replay_bundle(args[0], args[1] if len(args) > 1 else None, template_path=override_template)
+    sys.exit(0 if ok else 1)
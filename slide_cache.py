@@ -0,0 +1,117 @@
+import os
+import io
+import copy
+import json
+import hashlib
+import logging
+import threading
+
+from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+
+# 引入配置文件
+import config
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+静态页片段缓存 (联系页 / 免责声明页)
+
+这些页面只取决于 (模板, 地点, 语言) 和相关配置，与报告内容无关。第一次渲染后保存为
+config.FRAGMENT_CACHE_DIR 下的小 pptx，并在进程内保留解析结果；之后每次生成
+只把缓存的幻灯片 XML 和关系 (图片 / 超链接) 拼接到新 PPT 中，不再逐个设置样式。
+"""
+
+_lock = threading.Lock()
+_fragments = {}  # 缓存键 -> 已解析的片段 Presentation
+
+# 拼接时需要重新映射的关系属性
+_R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_REL_ATTRS = [f"{{{_R_NS}}}embed", f"{{{_R_NS}}}link", f"{{{_R_NS}}}id"]
+
+
+# 静态页用到的配置 (config 中的名称)，内容变化时缓存自动失效
+FRAGMENT_CONFIG_NAMES = ("CONTACT_ADDRESSES", "CONTACT_ADDRESSES_en", "DISCLAIMER_TEXTS", "LAYOUT_IDX")
+
+
+def _config_digest():
+    """静态页相关配置的指纹"""
+    values = {name: getattr(config, name, None) for name in FRAGMENT_CONFIG_NAMES}
+    values["ANNOTATION_CONFIG.contact_info"] = config.ANNOTATION_CONFIG.get("contact_info")
+    raw = json.dumps(values, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def fragment_key(template_path, location, language):
+    """缓存键：模板内容 (mtime/大小) 或静态页相关配置变化时自动失效"""
+    stat = os.stat(template_path)
+    raw = (f"{os.path.abspath(template_path)}|{stat.st_mtime_ns}|{stat.st_size}|{location}|{language}"
+           f"|{_config_digest()}|v{config.FRAGMENT_CACHE_VERSION}")
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def get_fragment(template_path, location, language, render_fn):
+    """
+    取得静态页片段，缓存未命中时调用 render_fn() 渲染
+    :param render_fn: 无参函数，返回只包含静态页的 Presentation
+    """
+    key = fragment_key(template_path, location, language)
+    with _lock:
+        fragment = _fragments.get(key)
+        if fragment is not None:
+            return fragment
+
+        cache_path = os.path.join(config.FRAGMENT_CACHE_DIR, f"{key}.pptx")
+        if os.path.exists(cache_path):
+            fragment = Presentation(cache_path)
+            logging.info(f"静态页片段已从磁盘缓存加载: {cache_path}")
+        else:
+            fragment = render_fn()
+            os.makedirs(config.FRAGMENT_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            fragment.save(tmp_path)
+            os.replace(tmp_path, cache_path)
+            logging.info(f"静态页片段已渲染并缓存: {cache_path} (共 {len(fragment.slides)} 页)")
+
+        _fragments[key] = fragment
+        return fragment
+
+
+def splice_slides(prs, fragment):
+    """把片段中的每一页按相同版式追加到 prs 末尾，并复制其关系"""
+    for src in fragment.slides:
+        layout_idx = list(fragment.slide_layouts).index(src.slide_layout)
+        # 不用 prs.slides.add_slide：它会先克隆版式占位符，而这些占位符马上会被片段的形状替换
+        rId, dst = prs.part.add_slide(prs.slide_layouts[layout_idx])
+        prs.slides._sldIdLst.add_sldId(rId)
+
+        # 1. 复制关系 (版式关系由 add_slide 建立，这里跳过)
+        rid_map = {}
+        for rid, rel in src.part.rels.items():
+            if rel.reltype == RT.SLIDE_LAYOUT:
+                continue
+            if rel.is_external:
+                rid_map[rid] = dst.part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+            elif rel.reltype == RT.IMAGE:
+                _, rid_map[rid] = dst.part.get_or_add_image_part(io.BytesIO(rel.target_part.blob))
+            else:
+                logging.warning(f"静态页片段中存在不支持拼接的关系类型: {rel.reltype}")
+
+        # 2. 整棵形状树替换为片段的副本
+        new_tree = copy.deepcopy(src.shapes._spTree)
+        if rid_map:
+            for el in new_tree.iter():
+                for attr in _REL_ATTRS:
+                    old = el.get(attr)
+                    if old in rid_map:
+                        el.set(attr, rid_map[old])
+        # 直接操作 XML，不经过 dst.shapes (它会缓存旧的形状树)
+        old_tree = dst._element.cSld.spTree
+        old_tree.getparent().replace(old_tree, new_tree)
+
+
+def clear_memory_cache():
+    """清空进程内缓存 (磁盘缓存保留)"""
+    with _lock:
+        _fragments.clear()
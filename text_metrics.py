@@ -0,0 +1,253 @@
+import os
+import re
+import logging
+import math
+import unicodedata
+from bisect import bisect_right
+from functools import lru_cache
+
+from PIL import ImageFont
+
+# 引入配置文件
+import config
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+文字宽度测量 (单位：磅)
+
+图表标题 / 资料来源的位置原来按 len() 分档估算偏移，中英文字宽不同，分档也容易写错。
+这里用 Pillow 读取字体文件的真实字形宽度 (华文细黑 / Microsoft YaHei / Arial Narrow)：
+- 字体文件在 config.FONT_DIRS 中按 config.FONT_FILES 查找，只扫描一次
+- 字体对象和测量结果都有缓存，一份 PPT 的所有注释一次批量测量 (measure_many)
+- 找不到字体文件时 (如 Linux 服务器) 按字符类别估算宽度
+
+自动字号 (fit_font_size)：在占位符/单元格的文本区域内，二分查找放得下的最大字号。
+字形宽度与字号成正比，每个字符只在参考字号下测量一次；段落预先算好累计宽度，
+每个候选字号的换行只需每行一次二分查找。
+"""
+
+# 测量时按 磅 x SCALE 像素加载字体，减少取整误差
+SCALE = 10
+# 粗体没有单独字体文件时，PowerPoint 合成粗体的大致加宽比例
+SYNTHETIC_BOLD_FACTOR = 1.03
+# 测量单字宽度 (em) 用的参考字号
+REF_SIZE = 100
+# 换行单位：连续的拉丁字母/数字等作为一个词 (只在空格处断行)，中文等全角字符逐字断行
+_TOKEN_RE = re.compile(r"[^\s\u2e80-\u9fff\u3000-\u303f\uff00-\uffef]+|\s|.")
+
+
+@lru_cache(maxsize=1)
+def _font_index():
+    """扫描字体目录：小写文件名 -> 路径"""
+    index = {}
+    for font_dir in config.FONT_DIRS:
+        font_dir = os.path.expanduser(font_dir)
+        if not os.path.isdir(font_dir):
+            continue
+        for root, _, files in os.walk(font_dir):
+            for name in files:
+                index.setdefault(name.lower(), os.path.join(root, name))
+    return index
+
+
+def find_font_file(font_name, bold=False):
+    """按 config.FONT_FILES 查找字体文件，找不到返回 None"""
+    candidates = config.FONT_FILES.get((font_name, "bold") if bold else font_name, [])
+    index = _font_index()
+    for file_name in candidates:
+        path = index.get(file_name.lower())
+        if path:
+            return path
+    return None
+
+
+@lru_cache(maxsize=64)
+def get_font(font_name, size, bold=False):
+    """
+    :return: (ImageFont, 是否为真实粗体)，字体文件不存在时返回 (None, False)
+    """
+    path = find_font_file(font_name, bold=True) if bold else None
+    real_bold = path is not None
+    path = path or find_font_file(font_name)
+    if not path:
+        return None, False
+    try:
+        return ImageFont.truetype(path, size=int(round(size * SCALE))), real_bold
+    except OSError as e:
+        logging.warning(f"字体加载失败 {path}: {e}")
+        return None, False
+
+
+def _char_em(ch):
+    """字符宽度 (em) 的估算值"""
+    if unicodedata.east_asian_width(ch) in ("W", "F"):
+        return 1.0
+    if ch == " ":
+        return 0.28
+    if ch in "il.,:;'|!":
+        return 0.28
+    if ch in "MW":
+        return 0.83
+    if ch.isupper():
+        return 0.65
+    if ch.isdigit():
+        return 0.55
+    return 0.5
+
+
+def estimate_width(text, size, font_name=""):
+    """没有字体文件时的估算宽度 (磅)；窄体 (Narrow) 按 0.82 倍"""
+    factor = 0.82 if "narrow" in font_name.lower() else 1.0
+    return sum(_char_em(ch) for ch in text) * size * factor
+
+
+def _measure(text, font_name, size, bold=False):
+    font, real_bold = get_font(font_name, size, bold)
+    if font is None:
+        width = estimate_width(text, size, font_name)
+    else:
+        width = font.getlength(text) / SCALE
+    if bold and not real_bold:
+        width *= SYNTHETIC_BOLD_FACTOR
+    return width
+
+
+@lru_cache(maxsize=4096)
+def text_width(text, font_name, size, bold=False):
+    """单行文字的渲染宽度 (磅)"""
+    return _measure(text, font_name, size, bold)
+
+
+def measure_many(items):
+    """
+    批量测量：items 为 [(文字, 字体名, 字号, 是否粗体)]，返回对应的宽度列表 (磅)
+    同一字体只解析一次，重复的文字直接命中缓存
+    """
+    return [text_width(text, font_name, size, bold) for text, font_name, size, bold in items]
+
+
+# ================= 自动字号 =================
+
+_em_tables = {}   # (字体名, 粗体) -> {字符: 宽度 em}
+
+
+def char_em(ch, font_name, bold=False):
+    """单个字符的宽度 (em)"""
+    table = _em_tables.setdefault((font_name, bold), {})
+    em = table.get(ch)
+    if em is None:
+        em = table[ch] = _measure(ch, font_name, REF_SIZE, bold) / REF_SIZE
+    return em
+
+
+@lru_cache(maxsize=2048)
+def _paragraph_layout(text, font_name, bold=False):
+    """
+    段落拆成换行单位
+    :return: (各单位起点的累计宽度 em，末尾附总宽度；各单位是否为空白)
+    """
+    table = _em_tables.setdefault((font_name, bold), {})
+    cum, spaces = [0.0], []
+    total = 0.0
+    for token in _TOKEN_RE.findall(text):
+        for ch in token:
+            em = table.get(ch)
+            total += em if em is not None else char_em(ch, font_name, bold)
+        cum.append(total)
+        spaces.append(token.isspace())
+    return cum, spaces
+
+
+def _count_lines(layout, max_em):
+    """
+    按宽度 max_em 贪心换行后的行数：每行用二分查找定位最后一个放得下的单位
+    行首空白不占宽度，比一行还宽的词按字符断开
+    """
+    cum, spaces = layout
+    n = len(spaces)
+    lines, i = 0, 0
+    while i < n:
+        if spaces[i]:
+            i += 1
+            continue
+        j = bisect_right(cum, cum[i] + max_em, i + 1) - 1
+        if j == i:
+            lines += math.ceil((cum[i + 1] - cum[i]) / max_em)
+            i += 1
+        else:
+            lines += 1
+            i = j
+    return max(lines, 1)
+
+
+def count_lines(paragraphs, font_name, size, width_pt, bold=False):
+    """多个段落在宽度 width_pt 内的总行数"""
+    max_em = width_pt / size
+    return sum(_count_lines(_paragraph_layout(p, font_name, bold), max_em) for p in paragraphs)
+
+
+@lru_cache(maxsize=1024)
+def fit_font_size(paragraphs, font_name, width_pt, height_pt, max_size, min_size,
+                  bold=False, step=0.5, line_spacing=None):
+    """
+    二分查找能放进 width_pt x height_pt (文本区域，已扣除内边距) 的最大字号
+    :param paragraphs: 段落文字的 tuple
+    :return: 字号 (磅)，min_size 也放不下时返回 min_size
+    """
+    line_spacing = line_spacing or config.FIT_LINE_SPACING
+    n_steps = int(round((max_size - min_size) / step))
+
+    def fits(k):
+        size = min_size + k * step
+        return count_lines(paragraphs, font_name, size, width_pt, bold) * size * line_spacing <= height_pt
+
+    lo, hi = 0, n_steps          # 找满足 fits 的最大 k
+    if fits(hi):
+        return max_size
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if fits(mid):
+            lo = mid
+        else:
+            hi = mid - 1
+    return min_size + lo * step
+
+
+def fit_table_font_size(rows, font_name, height_pt, max_size, min_size, step=0.5, line_spacing=None):
+    """
+    表格整体的自动字号：每行按内容撑高 (不低于模板的行高)，所有行的总高度不超过 height_pt
+    :param rows: [(模板行高, [(段落 tuple, 文本宽度, 上下内边距之和, 是否粗体), ...])]，单位磅
+    :return: 字号 (磅)，min_size 也放不下时返回 min_size
+    """
+    line_spacing = line_spacing or config.FIT_LINE_SPACING
+    n_steps = int(round((max_size - min_size) / step))
+
+    def fits(k):
+        size = min_size + k * step
+        total = 0.0
+        for min_height, cells in rows:
+            needed = [count_lines(paragraphs, font_name, size, width_pt, bold) * size * line_spacing + margins
+                      for paragraphs, width_pt, margins, bold in cells if paragraphs]
+            total += max([min_height] + needed)
+        return total <= height_pt
+
+    lo, hi = 0, n_steps
+    if fits(hi):
+        return max_size
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if fits(mid):
+            lo = mid
+        else:
+            hi = mid - 1
+    return min_size + lo * step
+
+
+def fit_many(jobs):
+    """
+    批量自动字号：jobs 为 [(段落 tuple, 字体名, 宽, 高, 最大字号, 最小字号, 是否粗体)]
+    :return: 对应的字号列表
+    """
+    return [fit_font_size(*job) for job in jobs]
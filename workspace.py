@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import tempfile
+from datetime import datetime
+
+# 引入配置文件
+import config
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+"""
+每次运行独立的工作目录 (Run Workspace)
+
+以前 json_main / ai_ppt / batch_process / save_report 都写入共享的相对路径
+(input_articles、articles.json、CLEANED_DIR、final_investment_report.json)，
+两个 Streamlit 用户同时运行会互相覆盖输入。现在每次运行在 config.RUNS_DIR 下
+拥有自己的 run_id 目录：
+
+    <RUNS_DIR>/<run_id>/
+        articles.json                  抓取到的原始文章
+        input_articles/<日期>/...       json_main 的输出
+        cleaned_files/                 batch_process 清洗后的文章
+        final_investment_report.json   AI 报告
+        output/                        生成的 PPT
+"""
+
+
+# ================= 1. 原子写入 =================
+
+def atomic_write_bytes(path, data):
+    """先写同目录下的临时文件再 os.replace，读者永远不会看到写了一半的文件"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(path, data, indent=4):
+    """原子写入 JSON 文件"""
+    text = json.dumps(data, ensure_ascii=False, indent=indent)
+    atomic_write_bytes(path, text.encode("utf-8"))
+
+
+# ================= 2. 工作目录 =================
+
+def new_run_id():
+    """时间戳 + 随机后缀，既能按时间排序又不会冲突"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+
+class RunWorkspace:
+    def __init__(self, run_id=None, runs_dir=None):
+        self.run_id = run_id or new_run_id()
+        self.root = os.path.join(runs_dir or config.RUNS_DIR, self.run_id)
+
+        self.articles_json = os.path.join(self.root, "articles.json")
+        self.input_dir = os.path.join(self.root, "input_articles")
+        self.cleaned_dir = os.path.join(self.root, "cleaned_files")
+        self.report_path = os.path.join(self.root, "final_investment_report.json")
+        self.output_dir = os.path.join(self.root, "output")
+
+    def create(self):
+        """创建目录结构"""
+        for d in (self.root, self.cleaned_dir, self.output_dir):
+            os.makedirs(d, exist_ok=True)
+        logging.info(f"工作目录已创建: {self.root}")
+        return self
+
+    def remove(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def _dir_stats(path):
+    """:return: (总大小, 目录树中最近的修改时间)"""
+    total, latest = 0, os.path.getmtime(path)
+    for dirpath, _, filenames in os.walk(path):
+        try:
+            latest = max(latest, os.path.getmtime(dirpath))
+        except OSError:
+            pass
+        for name in filenames:
+            try:
+                stat = os.stat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            total += stat.st_size
+            latest = max(latest, stat.st_mtime)
+    return total, latest
+
+
+def _active_seconds():
+    """最长的阶段超时：这段时间内有写入的目录可能属于仍在运行的流水线 (LLM 阶段期间不写文件)"""
+    timeouts = [t for t in config.PIPELINE_STAGE_TIMEOUTS.values() if t]
+    return max(timeouts) if timeouts else 3600
+
+
+def cleanup_workspaces(max_age_hours=None, max_total_mb=None, keep=(), runs_dir=None, active_seconds=None):
+    """
+    按时间和总大小清理旧的工作目录 (按目录树中最近一次写入的时间判断新旧)
+    1. 删除超过 max_age_hours 没有写入的目录
+    2. 总大小仍超过 max_total_mb 时，从最旧的开始删除
+    keep 中的 run_id (例如正在运行的会话)，以及 active_seconds (默认最长的阶段超时) 内有写入的目录
+    永远不会被删除：其他会话、HTTP 服务或预生成调度器正在运行的流水线不知道调用方是谁
+    :return: 被删除的 run_id 列表
+    """
+    runs_dir = runs_dir or config.RUNS_DIR
+    max_age_hours = config.RUN_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+    max_total_mb = config.RUNS_MAX_TOTAL_MB if max_total_mb is None else max_total_mb
+    active_seconds = _active_seconds() if active_seconds is None else active_seconds
+
+    if not os.path.isdir(runs_dir):
+        return []
+
+    now = time.time()
+    entries = []
+    for run_id in os.listdir(runs_dir):
+        path = os.path.join(runs_dir, run_id)
+        if os.path.isdir(path) and run_id not in keep:
+            try:
+                size, latest = _dir_stats(path)
+            except OSError:
+                continue  # 刚被其他进程删除
+            entries.append((latest, run_id, path, size))
+    entries.sort()  # 最旧的在前
+
+    removed = []
+    remaining = []
+    for latest, run_id, path, size in entries:
+        if now - latest > max_age_hours * 3600:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(run_id)
+        else:
+            remaining.append((latest, run_id, path, size))
+
+    total = sum(size for _, _, _, size in remaining)
+    limit = max_total_mb * 1024 * 1024
+    for latest, run_id, path, size in remaining:
+        if total <= limit:
+            break
+        if now - latest < active_seconds:
+            # 之后的目录更新，都可能正在使用
+            logging.warning(f"工作目录总大小超过 {max_total_mb} MB，但剩余的目录都可能正在使用，暂不清理")
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(run_id)
+        total -= size
+
+    if removed:
+        logging.info(f"已清理 {len(removed)} 个旧工作目录")
+    return removed